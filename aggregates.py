@@ -0,0 +1,214 @@
+"""Running EDA aggregates that update in O(new rows).
+
+    python aggregates.py update PRSA_Data_Dongsi_20130301-20170228.csv --store aggregates.npz
+    python aggregates.py show --store aggregates.npz
+
+For every station and calendar month the store keeps, per pollutant, a running
+sum, a count and a log-binned histogram used as a mergeable quantile sketch.
+It also keeps PM2.5 level counts. Appending readings only touches the new rows,
+and every EDA chart (monthly medians, seasonal and area-type means, level mix)
+is derived from these small arrays.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from features import station_to_area_type
+
+pollutants = ['PM2.5', 'PM10', 'SO2', 'NO2', 'CO', 'O3']
+levels = ['Low', 'Moderate', 'High']
+# PM2.5 (μg/m³) upper bounds for Low and Moderate: the 24h Grade I/II limits of GB 3095-2012
+pm25_level_bounds = (35.0, 75.0)
+
+seasons = {
+    'Winter': (12, 1, 2),
+    'Spring': (3, 4, 5),
+    'Summer': (6, 7, 8),
+    'Autumn': (9, 10, 11),
+}
+
+# Quantile sketch: bin 0 holds values <= sketch_min, then log-spaced bins up to sketch_max
+sketch_min, sketch_max, sketch_bins = 0.1, 1e5, 240
+_edges = np.geomspace(sketch_min, sketch_max, sketch_bins)
+_bin_lower = np.concatenate([[0.0], _edges])
+_bin_upper = np.concatenate([_edges, [sketch_max]])
+
+
+class PollutionAggregates:
+    """Per-station, per-month sums, counts, sketches and PM2.5 level counts."""
+
+    def __init__(self):
+        self.stations = []
+        n_pol = len(pollutants)
+        self.sums = np.zeros((0, 12, n_pol))
+        self.counts = np.zeros((0, 12, n_pol), dtype=np.int64)
+        self.sketches = np.zeros((0, 12, n_pol, sketch_bins + 1), dtype=np.int64)
+        self.level_counts = np.zeros((0, 12, len(levels)), dtype=np.int64)
+        self.rows = 0
+
+    def _station_index(self, names):
+        new = [name for name in pd.unique(names) if name not in self.stations]
+        if new:
+            self.stations.extend(new)
+            grow = len(new)
+            self.sums = np.concatenate([self.sums, np.zeros((grow,) + self.sums.shape[1:])])
+            self.counts = np.concatenate([self.counts, np.zeros((grow,) + self.counts.shape[1:], dtype=np.int64)])
+            self.sketches = np.concatenate([self.sketches, np.zeros((grow,) + self.sketches.shape[1:], dtype=np.int64)])
+            self.level_counts = np.concatenate(
+                [self.level_counts, np.zeros((grow,) + self.level_counts.shape[1:], dtype=np.int64)])
+        return pd.Index(self.stations).get_indexer(names)
+
+    def append(self, readings):
+        """Fold new rows (needs ``station``, ``month`` and any of the pollutant columns) into the totals."""
+        missing = [col for col in ('station', 'month') if col not in readings.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+        if readings.empty:
+            return self
+
+        station_idx = self._station_index(readings['station'].astype(str).to_numpy())
+        month_idx = readings['month'].to_numpy(dtype=np.int64) - 1
+        if (month_idx < 0).any() or (month_idx > 11).any():
+            raise ValueError("month must be between 1 and 12")
+
+        for p, pollutant in enumerate(pollutants):
+            if pollutant not in readings.columns:
+                continue
+            values = pd.to_numeric(readings[pollutant], errors='coerce').to_numpy(dtype=np.float64)
+            valid = ~np.isnan(values)
+            s, m, v = station_idx[valid], month_idx[valid], values[valid]
+            np.add.at(self.sums[:, :, p], (s, m), v)
+            np.add.at(self.counts[:, :, p], (s, m), 1)
+            bins = np.searchsorted(_edges, v, side='left')
+            np.add.at(self.sketches[:, :, p, :], (s, m, bins), 1)
+
+            if pollutant == 'PM2.5':
+                level = np.searchsorted(pm25_level_bounds, v, side='left')
+                np.add.at(self.level_counts, (s, m, level), 1)
+
+        self.rows += len(readings)
+        return self
+
+    # --- Persistence ---
+    def save(self, path):
+        np.savez_compressed(
+            path, stations=np.array(self.stations, dtype=str), sums=self.sums, counts=self.counts,
+            sketches=self.sketches, level_counts=self.level_counts, rows=self.rows,
+        )
+
+    @classmethod
+    def load(cls, path):
+        agg = cls()
+        with np.load(path) as data:
+            agg.stations = data['stations'].tolist()
+            agg.sums = data['sums']
+            agg.counts = data['counts']
+            agg.sketches = data['sketches']
+            agg.level_counts = data['level_counts']
+            agg.rows = int(data['rows'])
+        return agg
+
+    # --- Derived views ---
+    def area_types(self):
+        return [station_to_area_type.get(station, 'Unknown') for station in self.stations]
+
+    def _group_mask(self, by):
+        """Boolean masks (group -> station mask) for 'station' or 'area_type'."""
+        names = self.stations if by == 'station' else self.area_types()
+        return {name: np.array([n == name for n in names]) for name in dict.fromkeys(names)}
+
+    @staticmethod
+    def _quantile(sketch, q):
+        """Approximate quantile from a (..., bins) histogram, interpolated inside the bin."""
+        def at(values, idx):
+            return np.take_along_axis(values, idx[..., None], axis=-1)[..., 0]
+
+        total = sketch.sum(axis=-1)
+        cumulative = np.cumsum(sketch, axis=-1)
+        rank = q * total
+        bin_idx = np.minimum((cumulative < rank[..., None]).sum(axis=-1), sketch_bins)
+        in_bin = at(sketch, bin_idx)
+        before = at(cumulative, bin_idx) - in_bin
+        lower = _bin_lower[bin_idx]
+        upper = _bin_upper[bin_idx]
+        fraction = np.divide(rank - before, in_bin, out=np.zeros(np.shape(rank)), where=in_bin > 0)
+        return np.where(total > 0, lower + np.clip(fraction, 0, 1) * (upper - lower), np.nan)
+
+    def monthly_quantile(self, q=0.5):
+        """Month x pollutant quantile across all stations."""
+        values = self._quantile(self.sketches.sum(axis=0), q)
+        return pd.DataFrame(values, index=pd.Index(range(1, 13), name='month'), columns=pollutants)
+
+    def group_means(self, by='area_type', pollutant_subset=('PM2.5', 'PM10')):
+        cols = [pollutants.index(p) for p in pollutant_subset]
+        rows = {}
+        for name, mask in self._group_mask(by).items():
+            total = self.sums[mask][:, :, cols].sum(axis=(0, 1))
+            count = self.counts[mask][:, :, cols].sum(axis=(0, 1))
+            rows[name] = np.divide(total, count, out=np.full(len(cols), np.nan), where=count > 0)
+        return pd.DataFrame.from_dict(rows, orient='index', columns=list(pollutant_subset)).rename_axis(by)
+
+    def seasonal_means(self, by='area_type', pollutant='PM2.5'):
+        p = pollutants.index(pollutant)
+        records = []
+        for name, mask in self._group_mask(by).items():
+            for season, months in seasons.items():
+                month_idx = [m - 1 for m in months]
+                total = self.sums[mask][:, month_idx, p].sum()
+                count = self.counts[mask][:, month_idx, p].sum()
+                records.append({by: name, 'season': season, pollutant: total / count if count else np.nan})
+        return pd.DataFrame.from_records(records)
+
+    def group_quantiles(self, by='area_type', pollutant='PM2.5', qs=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        p = pollutants.index(pollutant)
+        records = {}
+        for name, mask in self._group_mask(by).items():
+            sketch = self.sketches[mask][:, :, p, :].sum(axis=(0, 1))
+            records[name] = [float(self._quantile(sketch, q)) for q in qs]
+        return pd.DataFrame.from_dict(records, orient='index', columns=[f'q{int(q * 100)}' for q in qs]).rename_axis(by)
+
+    def level_distribution(self, by=None):
+        """PM2.5 level counts overall, or per station / area type."""
+        if by is None:
+            return pd.Series(self.level_counts.sum(axis=(0, 1)), index=levels, name='count')
+        rows = {name: self.level_counts[mask].sum(axis=(0, 1)) for name, mask in self._group_mask(by).items()}
+        return pd.DataFrame.from_dict(rows, orient='index', columns=levels).rename_axis(by)
+
+
+def load_or_create(path):
+    try:
+        return PollutionAggregates.load(path)
+    except FileNotFoundError:
+        return PollutionAggregates()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the incremental EDA aggregate store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Append readings from CSV/Parquet files")
+    update.add_argument("files", nargs="+")
+    show = sub.add_parser("show", help="Print the derived summaries")
+    for command in (update, show):
+        command.add_argument("--store", default="aggregates.npz")
+    args = parser.parse_args()
+
+    agg = load_or_create(args.store)
+    if args.command == "update":
+        from features import read_readings
+        for path in args.files:
+            readings = read_readings(path)
+            agg.append(readings)
+            print(f"{path}: +{len(readings):,} rows")
+        agg.save(args.store)
+        print(f"{args.store}: {agg.rows:,} rows from {len(agg.stations)} stations")
+        return
+
+    print(f"{agg.rows:,} rows from {len(agg.stations)} stations\n")
+    print(agg.monthly_quantile(0.5).round(1), "\n")
+    print(agg.group_means().round(1), "\n")
+    print(agg.level_distribution(by='area_type'))
+
+
+if __name__ == "__main__":
+    main()
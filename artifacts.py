@@ -0,0 +1,248 @@
+"""Versioned, memory-mappable model artifact: no pickle, no sklearn at load time.
+
+    python artifacts.py export --model LightGBM.pkl --scaler StandardScalar.pkl -o air_pollution.apm
+    python artifacts.py inspect air_pollution.apm
+
+Layout (little-endian)::
+
+    magic b"APMODEL\\0" | format version (u4) | header length (u4) | JSON header | sections
+
+The JSON header records the feature ordering, classes, library versions, the
+tree-engine metadata and the offset, dtype and shape of every section. Each
+section starts on a 64-byte boundary, so the arrays are used straight from an
+``np.memmap`` of the file: loading copies nothing, and every process mapping
+the same file shares its pages. Sections are the scaler mean/scale, the
+``TreeEnsemble`` node arrays, the booster in LightGBM's own text format and,
+optionally, the drift reference histograms (see validation.py). Reduced
+variants (see model_variants.py) have no booster section and always load
+into the native engine.
+"""
+import argparse
+import hashlib
+import json
+import struct
+import time
+
+import numpy as np
+
+from features import final_feature_names, numeric_features
+from tree_engine import TreeEnsemble, array_names
+
+MAGIC = b"APMODEL\0"
+FORMAT_VERSION = 1
+_prefix = struct.Struct("<8sII")
+_alignment = 64
+
+
+class ScalerParams:
+    """The fitted ``StandardScaler`` state the feature pipeline needs, without sklearn."""
+
+    with_mean = True
+    with_std = True
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(mean)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class BoosterClassifier:
+    """``predict_proba``/``predict`` over a ``lightgbm.Booster``, shaped like ``LGBMClassifier``."""
+
+    def __init__(self, booster, classes):
+        self.booster_ = booster
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = booster.num_feature()
+        self._predict_params = {}
+
+    def set_params(self, n_jobs=None, **params):
+        if n_jobs is not None:
+            self._predict_params['num_threads'] = n_jobs
+        return self
+
+    def predict_proba(self, X):
+        proba = self.booster_.predict(np.asarray(X), **self._predict_params)
+        if proba.ndim == 1:
+            return np.column_stack([1.0 - proba, proba])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# --- Writing ---
+def _lightgbm_version():
+    import lightgbm
+    return lightgbm.__version__
+
+
+def _align(offset):
+    return -(-offset // _alignment) * _alignment
+
+
+def export_artifact(model, scaler, path, reference=None):
+    """Write ``model`` (LGBMClassifier, Booster or ``TreeEnsemble``) and ``scaler`` to ``path``; returns the header.
+
+    ``reference`` is an optional ``validation.DriftReference`` stored alongside.
+    """
+    if isinstance(model, TreeEnsemble):
+        engine, booster = model, None
+        model_feature_names = engine.feature_names or final_feature_names
+    else:
+        booster = getattr(model, 'booster_', model)
+        engine = TreeEnsemble.from_booster(model)
+        model_feature_names = booster.feature_name()
+    if len(model_feature_names) != len(final_feature_names):
+        raise ValueError(f"Model expects {len(model_feature_names)} features, "
+                         f"the feature pipeline builds {len(final_feature_names)}")
+    arrays = {f"tree/{name}": np.ascontiguousarray(values) for name, values in engine.to_arrays().items()}
+    arrays["scaler/mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays["scaler/scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+    if arrays["scaler/mean"].shape != (len(numeric_features),):
+        raise ValueError(f"Scaler has {arrays['scaler/mean'].size} features, expected {len(numeric_features)}")
+    if booster is not None:
+        arrays["booster/model_text"] = np.frombuffer(booster.model_to_string().encode("utf-8"), dtype=np.uint8)
+    if reference is not None:
+        arrays.update({f"reference/{name}": np.ascontiguousarray(values)
+                       for name, values in reference.to_arrays().items()})
+
+    sections, offset = {}, 0
+    for name, values in arrays.items():
+        sections[name] = {"offset": offset, "dtype": values.dtype.str, "shape": list(values.shape)}
+        offset = _align(offset + values.nbytes)
+
+    payload = bytearray(offset)
+    for name, values in arrays.items():
+        start = sections[name]["offset"]
+        payload[start:start + values.nbytes] = values.tobytes()
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "lightgbm_version": _lightgbm_version() if booster is not None else None,
+        "feature_names": final_feature_names,
+        "model_feature_names": model_feature_names,
+        "numeric_features": numeric_features,
+        "classes": np.asarray(getattr(model, 'classes_', np.arange(engine.num_class))).tolist(),
+        "tree_engine": engine.metadata(),
+        "sections": sections,
+        "payload_bytes": len(payload),
+        "payload_sha256": hashlib.sha256(payload).hexdigest(),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(_prefix.size + len(header_bytes))
+    header_bytes = header_bytes.ljust(data_start - _prefix.size, b" ")
+
+    with open(path, "wb") as f:
+        f.write(_prefix.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+    return header
+
+
+# --- Reading ---
+class ModelArtifact:
+    """A mapped artifact file; sections are read-only views into the mapping."""
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self._map) < _prefix.size:
+            raise ValueError(f"'{path}' is not a model artifact (file too short)")
+        magic, version, header_length = _prefix.unpack(self._map[:_prefix.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a model artifact")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"'{path}' uses artifact format {version}; this build reads up to {FORMAT_VERSION}")
+        header_end = _prefix.size + header_length
+        self.header = json.loads(self._map[_prefix.size:header_end].tobytes())
+        self._payload = self._map[header_end:header_end + self.header["payload_bytes"]]
+        if len(self._payload) != self.header["payload_bytes"]:
+            raise ValueError(f"'{path}' is truncated")
+        if self.header["feature_names"] != final_feature_names:
+            raise ValueError(f"'{path}' was built for a different feature layout")
+        if verify and hashlib.sha256(self._payload).hexdigest() != self.header["payload_sha256"]:
+            raise ValueError(f"'{path}' failed its checksum")
+
+    def section(self, name):
+        spec = self.header["sections"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        start = spec["offset"]
+        return self._payload[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+
+    def scaler(self):
+        return ScalerParams(self.section("scaler/mean"), self.section("scaler/scale"))
+
+    def tree_ensemble(self):
+        arrays = {name: self.section(f"tree/{name}") for name in array_names}
+        return TreeEnsemble.from_arrays(arrays, self.header["tree_engine"])
+
+    def reference(self):
+        """The stored ``DriftReference``, or None if the artifact was exported without one."""
+        if "reference/counts" not in self.header["sections"]:
+            return None
+        from validation import DriftReference
+        names = ["edges", "counts", "station_counts", "wd_counts"]
+        return DriftReference.from_arrays({name: self.section(f"reference/{name}") for name in names})
+
+    @property
+    def has_booster(self):
+        return "booster/model_text" in self.header["sections"]
+
+    def booster_classifier(self):
+        if not self.has_booster:
+            raise ValueError(f"'{self.path}' holds a native-only model variant; load it with engine='native'")
+        import lightgbm
+        booster = lightgbm.Booster(model_str=self.section("booster/model_text").tobytes().decode("utf-8"))
+        return BoosterClassifier(booster, self.header["classes"])
+
+
+def load_artifact(path, engine="lightgbm", verify=False):
+    """``(model, scaler)`` from an artifact; ``engine="native"`` never imports LightGBM.
+
+    Native-only variants load into the tree engine whichever engine is asked for.
+    """
+    artifact = ModelArtifact(path, verify=verify)
+    native = engine == "native" or not artifact.has_booster
+    model = artifact.tree_ensemble() if native else artifact.booster_classifier()
+    return model, artifact.scaler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or inspect a model artifact.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Convert the pickled model and scaler")
+    export.add_argument("--model", default="LightGBM.pkl")
+    export.add_argument("--scaler", default="StandardScalar.pkl")
+    export.add_argument("--reference", default=None,
+                        help="Drift reference (.npz from validation.py build-reference) to store alongside")
+    export.add_argument("-o", "--output", default="air_pollution.apm")
+    inspect = sub.add_parser("inspect", help="Print an artifact's header")
+    inspect.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from model_registry import load_model_and_scaler
+        model, scaler = load_model_and_scaler(args.model, args.scaler)
+        reference = None
+        if args.reference:
+            from validation import DriftReference
+            reference = DriftReference.load(args.reference)
+        header = export_artifact(model, scaler, args.output, reference)
+        print(f"Wrote {args.output}: {header['tree_engine']['num_class']} classes, "
+              f"{len(header['sections'])} sections, {header['payload_bytes'] / 2**20:.2f} MB payload")
+        return
+
+    header = ModelArtifact(args.path, verify=True).header
+    sections = header.pop("sections")
+    print(json.dumps(header, indent=2))
+    for name, spec in sections.items():
+        print(f"{name:<24} {spec['dtype']:<6} {spec['shape']}")
+
+
+if __name__ == "__main__":
+    main()
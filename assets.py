@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class AssetCache:
+    """Display-sized images held in memory and served as encoded bytes.
+
+    ``manifest`` maps each image path to the width it is displayed at (None for
+    container width). Images wider than ``width * pixel_ratio`` are downscaled
+    once and re-encoded as PNG; the rest are kept as the file's own bytes. Later
+    requests hand Streamlit ready-made bytes instead of reading the file again.
+    The cache is bounded by ``max_bytes``; the least recently used images are
+    dropped first and reloaded on demand.
+    With ``enabled=False`` every request opens the file from disk, as before.
+    """
+
+    def __init__(self, manifest, max_bytes=64 * 2**20, pixel_ratio=2, enabled=True):
+        self.manifest = dict(manifest)
+        self.max_bytes = max_bytes
+        self.pixel_ratio = pixel_ratio
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.load_seconds = {}
+
+    def exists(self, path):
+        return path in self._entries or os.path.exists(path)
+
+    def _encode(self, path):
+        # Imported on first use, so processes that never show an image skip PIL
+        from PIL import Image
+
+        start = time.perf_counter()
+        # Opening reads only the header; pixels are decoded just for images that need downscaling
+        with Image.open(path) as image:
+            width = self.manifest.get(path)
+            target = width * self.pixel_ratio if width else None
+            if target and image.width > target:
+                height = round(image.height * target / image.width)
+                buffer = io.BytesIO()
+                image.resize((target, height), Image.LANCZOS).save(buffer, format="PNG")
+                data = buffer.getvalue()
+            else:
+                data = None
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.load_seconds[path] = time.perf_counter() - start
+        return data
+
+    def get(self, path):
+        """Image bytes for ``path`` (a PIL image when the cache is disabled)."""
+        if not self.enabled:
+            from PIL import Image
+            return Image.open(path)
+        with self._lock:
+            data = self._entries.get(path)
+            if data is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = self._encode(path)
+        with self._lock:
+            if path not in self._entries:
+                self._entries[path] = data
+                self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= len(dropped)
+                self.evictions += 1
+        return data
+
+    def preload(self, background=False):
+        """Decode every image in the manifest that exists on disk."""
+        if not background:
+            for path in self.manifest:
+                if os.path.exists(path) and path not in self._entries:
+                    self.get(path)
+            return None
+        thread = threading.Thread(target=self.preload, name="asset-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,346 @@
+"""Asyncio-native scoring: await predictions without blocking the event loop.
+
+    python async_scoring.py --port 8001 --workers 4 --max-in-flight 64
+
+    async with AsyncScorer.from_registry(default_registry) as scorer:
+        result = await scorer.predict(reading)
+        async for result in scorer.stream(feed):
+            ...
+
+Features are built on the event loop with the same ``features`` helpers as
+the app (they take microseconds); ``predict_proba`` runs on a bounded thread
+or process pool. Single readings awaited at the same time are coalesced by a
+``MicroBatcher`` into one model call. A semaphore caps the requests in
+flight, so a burst of callers queues on the loop instead of piling work onto
+the pool. Cancelling an awaiting task releases its slot at once; a call that
+has not been scored yet is dropped. Readings the model cannot score (missing
+values, unknown stations or wind directions) raise ``InvalidReadings``, as in
+inference_server.py; the rest are range-checked and added to the drift window
+first (validation.py), and flagged readings get ``warnings``.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+
+import pandas as pd
+
+import metrics
+from batcher import MicroBatcher
+from features import (
+    InvalidReadings, build_feature_matrix, build_feature_row, class_labels, format_predictions, predict_in_chunks,
+    require_valid
+)
+from model_registry import ModelRegistry
+from validation import ValidationStage, load_reference
+
+_process_model = {}
+
+
+def _init_process(model_path, scaler_path, artifact_path, engine):
+    model, _ = ModelRegistry(model_path, scaler_path, engine=engine, artifact_path=artifact_path).get()
+    if hasattr(model, 'set_params'):
+        model.set_params(n_jobs=1)
+    _process_model['model'] = model
+
+
+def _score_in_process(X, chunk_size):
+    return predict_in_chunks(_process_model['model'], X, chunk_size=chunk_size)
+
+
+class _ExecutorModel:
+    """``predict_proba`` that runs on an executor, for the batcher's worker thread."""
+
+    def __init__(self, executor, score_fn, *args):
+        self.executor, self.score_fn, self.args = executor, score_fn, args
+
+    def predict_proba(self, X):
+        return self.executor.submit(self.score_fn, X, *self.args).result()
+
+
+class AsyncScorer:
+    """Non-blocking ``predict``/``predict_batch``/``stream`` over a fitted model and scaler.
+
+    ``executor="process"`` scores in worker processes that each load the model
+    from ``registry``; only feature matrices and probabilities cross over.
+    ``batch_wait_ms=0`` turns off coalescing of single predictions. ``validation``
+    defaults to a ``ValidationStage`` against the scaler's training distribution,
+    published on ``metrics.registry``.
+    """
+
+    def __init__(self, model, scaler, workers=4, max_in_flight=64, executor="thread", registry=None,
+                 chunk_size=50_000, batch_wait_ms=2.0, validation=None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        self.model = model
+        self.scaler = scaler
+        if validation is None:
+            validation = ValidationStage(scaler, metrics_registry=metrics.registry, source="async")
+        self.validation = validation
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        if executor == "process":
+            if registry is None:
+                raise ValueError("A process executor needs the registry to load the model from")
+            self._executor = ProcessPoolExecutor(
+                workers, initializer=_init_process,
+                initargs=(registry.model_path, registry.scaler_path, registry.artifact_path, registry.engine),
+            )
+            self._score_fn, self._score_args = _score_in_process, (chunk_size,)
+        else:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="async-scorer")
+            self._score_fn, self._score_args = self._score_matrix, ()
+        self._batcher = None
+        if batch_wait_ms > 0:
+            self._batcher = MicroBatcher(
+                _ExecutorModel(self._executor, self._score_fn, *self._score_args),
+                max_batch_size=max_in_flight, max_wait=batch_wait_ms / 1e3, max_pending=max_in_flight * 2,
+            )
+        self._semaphore = None
+        self.in_flight = 0
+        self.completed = self.cancelled = self.failed = 0
+
+    @classmethod
+    def from_registry(cls, registry, **kwargs):
+        model, scaler = registry.get()
+        return cls(model, scaler, registry=registry, **kwargs)
+
+    def _score_matrix(self, X):
+        return predict_in_chunks(self.model, X, chunk_size=self.chunk_size)
+
+    async def _run(self, X, coalesce=False):
+        if self._semaphore is None:
+            # Created on first use so it binds to the loop the scorer is used from
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                if coalesce and self._batcher is not None:
+                    proba = await asyncio.wrap_future(self._batcher.submit(X))
+                else:
+                    proba = await asyncio.get_running_loop().run_in_executor(
+                        self._executor, self._score_fn, X, *self._score_args)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+        self.completed += 1
+        return proba
+
+    # --- Public API ---
+    async def predict_proba(self, X):
+        return await self._run(X)
+
+    async def predict(self, reading):
+        """``{"level", "probabilities"}`` for one reading given as a mapping of raw values."""
+        frame = pd.DataFrame([reading])
+        require_valid(frame)
+        X = build_feature_row(reading, self.scaler)
+        flagged = self.validation.check(frame, X).flagged_messages()
+        result = format_predictions(await self._run(X, coalesce=True))[0]
+        if flagged:
+            result["warnings"] = flagged[0]
+        return result
+
+    async def predict_batch(self, readings):
+        """Predictions for a list of readings (or a DataFrame), in order."""
+        frame = readings if isinstance(readings, pd.DataFrame) else pd.DataFrame.from_records(readings)
+        if frame.empty:
+            return []
+        require_valid(frame)
+        X = build_feature_matrix(frame, self.scaler)
+        flagged = self.validation.check(frame, X).flagged_messages()
+        results = format_predictions(await self._run(X))
+        for i, messages in flagged.items():
+            results[i]["warnings"] = messages
+        return results
+
+    async def stream(self, readings, batch_size=256, max_wait=0.05, prefetch=4):
+        """Yield one prediction per reading, in order, from a sync or async iterable.
+
+        Readings are grouped into batches of ``batch_size`` (or whatever arrived
+        within ``max_wait`` seconds); up to ``prefetch`` batches are scored
+        concurrently while earlier results are being consumed. A batch holding a
+        reading that cannot be scored raises ``InvalidReadings``.
+        """
+        pending = deque()
+        batch, deadline = [], None
+
+        async def drain(limit):
+            while len(pending) > limit:
+                for result in await pending.popleft():
+                    yield result
+
+        try:
+            async for reading in _aiter(readings):
+                batch.append(reading)
+                deadline = deadline or time.monotonic() + max_wait
+                if len(batch) >= batch_size or time.monotonic() >= deadline:
+                    pending.append(asyncio.ensure_future(self.predict_batch(batch)))
+                    batch, deadline = [], None
+                    async for result in drain(prefetch - 1):
+                        yield result
+            if batch:
+                pending.append(asyncio.ensure_future(self.predict_batch(batch)))
+            async for result in drain(0):
+                yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        stats = {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "validation": self.validation.stats(),
+        }
+        if self._batcher is not None:
+            stats["batcher"] = self._batcher.stats()
+        return stats
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+async def _aiter(iterable):
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+# --- Local HTTP server ---
+async def _respond(writer, status, body, keep_alive):
+    if isinstance(body, str):
+        payload, content_type = body.encode("utf-8"), metrics.CONTENT_TYPE
+    else:
+        payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+    status = HTTPStatus(status)
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+    )
+    await writer.drain()
+
+
+async def _route(scorer, method, path, body):
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok", "classes": class_labels, "scorer": scorer.stats()}
+    if method == "GET" and path == "/metrics":
+        return 200, metrics.registry.render()
+    if method != "POST" or path not in ("/predict", "/predict/batch"):
+        return 404, {"error": f"No route for {method} {path}"}
+    try:
+        data = json.loads(body or b"null")
+    except json.JSONDecodeError:
+        return 400, {"error": "Request body is not valid JSON"}
+    try:
+        if path == "/predict":
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object with one reading")
+            return 200, await scorer.predict(data)
+        readings = data.get("readings") if isinstance(data, dict) else data
+        if not isinstance(readings, list) or not all(isinstance(r, dict) for r in readings):
+            raise ValueError("Expected a JSON list of readings or an object with a 'readings' list")
+        return 200, {"predictions": await scorer.predict_batch(readings)}
+    except InvalidReadings as e:
+        return 400, e.body(single=path == "/predict")
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+
+def make_handler(scorer):
+    """A keep-alive HTTP/1.1 connection handler with the same routes and input checks as inference_server.py."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                status, payload = await _route(scorer, method, path, body)
+                await _respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def start_server(scorer, host="127.0.0.1", port=8001):
+    return await asyncio.start_server(make_handler(scorer), host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio JSON scoring server for the air pollution classifier.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0,
+                        help="Coalesce single predictions arriving within this window (0 disables)")
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm")
+    parser.add_argument("--model", default="LightGBM.pkl")
+    parser.add_argument("--scaler", default="StandardScalar.pkl")
+    parser.add_argument("--artifact", default=None)
+    parser.add_argument("--reference", default=None,
+                        help="Drift reference .npz (validation.py build-reference); default: the artifact's or the scaler's")
+    parser.add_argument("--drift-window", type=int, default=5_000, help="Rows per drift window")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model, args.scaler, engine=args.engine, artifact_path=args.artifact)
+    _, scaler = registry.get()
+    validation = ValidationStage(scaler, load_reference(scaler, args.reference, args.artifact),
+                                 window_rows=args.drift_window, metrics_registry=metrics.registry, source="async")
+    scorer = AsyncScorer.from_registry(registry, workers=args.workers, max_in_flight=args.max_in_flight,
+                                       executor=args.executor, batch_wait_ms=args.batch_wait_ms, validation=validation)
+
+    async def run():
+        server = await start_server(scorer, args.host, args.port)
+        print(f"Serving on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    finally:
+        scorer.close()
+
+
+if __name__ == "__main__":
+    main()
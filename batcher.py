@@ -0,0 +1,157 @@
+"""Coalesce concurrent small ``predict_proba`` calls into one vectorized call.
+
+A single-row LightGBM call costs about as much as scoring a few dozen rows at
+once, so under concurrent load most of the time goes to per-call overhead.
+``MicroBatcher`` queues each caller's rows, and a background thread scores
+everything that arrives within ``max_wait`` seconds of the first pending
+request (or until ``max_batch_size`` rows are collected) in one call, then
+hands each caller back its own rows.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from latency import LatencyHistogram
+
+_stop = object()
+
+
+class BatcherOverloaded(RuntimeError):
+    """The pending queue stayed full for longer than the submit timeout."""
+
+
+class MicroBatcher:
+    """Thread-safe ``predict_proba`` front for a model, batching across callers.
+
+    ``max_pending`` bounds the queued requests: when it is full, callers wait
+    up to ``submit_timeout`` seconds and then get ``BatcherOverloaded``.
+    ``result_timeout`` bounds how long a caller waits for its result; a request
+    that times out is cancelled and skipped if it has not been scored yet.
+    With ``adaptive`` the wait window is skipped while traffic is sequential
+    (the last batch held a single request and nothing else is queued), so a
+    lone caller does not pay ``max_wait`` on every request.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait=0.002, max_pending=1024,
+                 submit_timeout=1.0, result_timeout=10.0, adaptive=True):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.model = model
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait)
+        self.submit_timeout = submit_timeout
+        self.result_timeout = result_timeout
+        self.adaptive = adaptive
+        self._last_batch_requests = 0
+        self.classes_ = getattr(model, 'classes_', None)
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self.batches = self.rows = self.rejected = self.timeouts = 0
+        self.queue_latency = LatencyHistogram()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    # --- Callers ---
+    def submit(self, X):
+        """Queue rows for scoring; returns a ``Future`` resolving to their probabilities."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        future = Future()
+        try:
+            self._pending.put((X, future, time.perf_counter()), timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise BatcherOverloaded(f"More than {self._pending.maxsize} requests pending") from None
+        return future
+
+    def predict_proba(self, X):
+        future = self.submit(X)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def predict(self, X):
+        classes = self.classes_ if self.classes_ is not None else np.arange(3)
+        return np.asarray(classes)[np.argmax(self.predict_proba(X), axis=1)]
+
+    # --- Worker ---
+    def _collect(self, first):
+        """The first request plus whatever else arrives within the wait window.
+
+        Returns the batch and whether the stop marker was seen.
+        """
+        batch, n_rows = [first], len(first[0])
+        wait = self.max_wait
+        if self.adaptive and self._last_batch_requests <= 1 and self._pending.empty():
+            wait = 0.0
+        deadline = time.perf_counter() + wait
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is _stop:
+                return batch, True
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._pending.get()
+            if first is _stop:
+                return
+            batch, stopping = self._collect(first)
+            self._last_batch_requests = len(batch)
+            # Requests that timed out and were cancelled are dropped before scoring
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._score(batch)
+            if stopping:
+                return
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            self.queue_latency.add(started - queued_at)
+        try:
+            X = batch[0][0] if len(batch) == 1 else np.concatenate([item[0] for item in batch])
+            proba = self.model.predict_proba(X)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for rows, future, _ in batch:
+            future.set_result(proba[offset:offset + len(rows)])
+            offset += len(rows)
+        with self._lock:
+            self.batches += 1
+            self.rows += offset
+
+    def close(self, timeout=5.0):
+        """Score what is already queued, then stop the worker thread."""
+        self._pending.put(_stop)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+                "pending": self._pending.qsize(),
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "queue_wait": self.queue_latency.summary(),
+            }
@@ -0,0 +1,97 @@
+"""Cold-start load time and memory of the pickles against the mapped artifact.
+
+    python -m benchmarks.bench_artifacts --repeat 5
+
+Every load runs in a fresh interpreter, so import costs, load time and the
+resident memory it adds are measured the way a new server process sees them.
+Exits non-zero if predictions from any artifact loader differ from the pickled
+model's.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from artifacts import export_artifact, load_artifact
+from benchmarks.common import synthetic_readings
+from features import build_feature_matrix
+from model_registry import load_model_and_scaler
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a child process: prints {"import_s", "load_s", "rss_mb"} for one loader
+_child = r"""
+import json, sys, time
+start = time.perf_counter()
+import numpy
+from model_registry import resident_memory_mb
+rss_before = resident_memory_mb()
+source, engine, path = sys.argv[1:4]
+if source == "pickle":
+    import pickle
+    imported = time.perf_counter()
+    with open("LightGBM.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open("StandardScalar.pkl", "rb") as f:
+        scaler = pickle.load(f)
+    if engine == "native":
+        from tree_engine import TreeEnsemble
+        model = TreeEnsemble.from_booster(model)
+else:
+    from artifacts import load_artifact
+    imported = time.perf_counter()
+    model, scaler = load_artifact(path, engine=engine)
+done = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "load_s": done - imported, "total_s": done - start,
+                  "rss_mb": resident_memory_mb() - rss_before}))
+"""
+
+
+def cold_load(source, engine, path):
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _child, source, engine, path],
+        cwd=repo_root, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    os.chdir(repo_root)
+    model, scaler = load_model_and_scaler()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.apm")
+        export_artifact(model, scaler, path)
+        print(f"Artifact {os.path.getsize(path) / 2**20:.2f} MB; pickles "
+              f"{(os.path.getsize('LightGBM.pkl') + os.path.getsize('StandardScalar.pkl')) / 2**20:.2f} MB")
+
+        X = build_feature_matrix(synthetic_readings(args.rows), scaler)
+        expected = model.predict_proba(X)
+        failed = False
+        for engine in ("lightgbm", "native"):
+            artifact_model, artifact_scaler = load_artifact(path, engine=engine, verify=True)
+            diff = np.abs(artifact_model.predict_proba(build_feature_matrix(
+                synthetic_readings(args.rows), artifact_scaler)) - expected).max()
+            failed |= diff > 1e-9
+            print(f"Parity ({engine} from artifact): max |dp| {diff:.1e}")
+
+        print(f"\n{'loader':<22} {'imports s':>10} {'load s':>8} {'total s':>8} {'+RSS MB':>8}")
+        for source, engine in (("pickle", "lightgbm"), ("artifact", "lightgbm"),
+                               ("pickle", "native"), ("artifact", "native")):
+            runs = [cold_load(source, engine, path) for _ in range(args.repeat)]
+            median = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+            print(f"{source + ' / ' + engine:<22} {median['import_s']:>10.3f} {median['load_s']:>8.3f} "
+                  f"{median['total_s']:>8.3f} {median['rss_mb']:>8.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""High-concurrency check of the asyncio scorer, as a library and over HTTP.
+
+    python -m benchmarks.bench_async --concurrency 1 100 1000 --requests 2000
+
+For each concurrency level, that many coroutines share ``--requests`` single
+predictions through ``AsyncScorer.predict``; then the same load goes through
+the local HTTP server from a stand-in keep-alive client built on asyncio
+streams. Also checks that results match the synchronous path, that streaming
+preserves order, and that cancelled requests release their slots. Exits
+non-zero on any mismatch or leaked in-flight slot.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from async_scoring import AsyncScorer, start_server
+from benchmarks.common import synthetic_readings
+from features import format_predictions, score_readings
+from model_registry import load_model_and_scaler
+
+
+async def run_library(scorer, readings, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for i, reading in enumerate(readings):
+        queue.put_nowait((i, reading))
+    results = [None] * len(readings)
+
+    async def client():
+        while not queue.empty():
+            i, reading = queue.get_nowait()
+            start = time.perf_counter()
+            results[i] = await scorer.predict(reading)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results, time.perf_counter() - start, np.array(latencies)
+
+
+async def http_request(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_http(port, readings, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for i, reading in enumerate(readings):
+        queue.put_nowait((i, reading))
+    results = [None] * len(readings)
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while not queue.empty():
+                i, reading = queue.get_nowait()
+                start = time.perf_counter()
+                status, results[i] = await http_request(reader, writer, "POST", "/predict", reading)
+                latencies.append(time.perf_counter() - start)
+                assert status == 200, results[i]
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results, time.perf_counter() - start, np.array(latencies)
+
+
+def matches(results, expected):
+    return all(
+        r["level"] == e["level"]
+        and max(abs(r["probabilities"][k] - e["probabilities"][k]) for k in e["probabilities"]) < 1e-12
+        for r, e in zip(results, expected)
+    )
+
+
+def report(label, concurrency, n_requests, elapsed, latencies):
+    print(f"{label:<8} {concurrency:>6} {n_requests / elapsed:>10,.0f} "
+          f"{np.percentile(latencies, 50) * 1e3:>9.2f} {np.percentile(latencies, 99) * 1e3:>9.2f}")
+
+
+async def main_async(args):
+    model, scaler = load_model_and_scaler()
+    frame = synthetic_readings(args.requests)
+    readings = frame.to_dict("records")
+    expected = format_predictions(score_readings(frame, model, scaler)[[
+        f"P({label})" for label in ("High", "Low", "Moderate")]].to_numpy())
+    failed = False
+
+    async with AsyncScorer(model, scaler, workers=args.workers, max_in_flight=args.max_in_flight) as scorer:
+        server = await start_server(scorer, port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        print(f"{'mode':<8} {'conc.':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for concurrency in args.concurrency:
+            for label, runner in (("library", lambda c: run_library(scorer, readings, c)),
+                                  ("http", lambda c: run_http(port, readings, c))):
+                results, elapsed, latencies = await runner(concurrency)
+                ok = matches(results, expected)
+                failed |= not ok
+                report(label, concurrency, len(readings), elapsed, latencies)
+                if not ok:
+                    print(f"  {label} results differ from the synchronous path")
+
+        streamed = [result async for result in scorer.stream(iter(readings), batch_size=128)]
+        ok = len(streamed) == len(expected) and matches(streamed, expected)
+        failed |= not ok
+        print(f"stream: {len(streamed):,} results in input order: {'OK' if ok else 'FAILED'}")
+
+        tasks = [asyncio.ensure_future(scorer.predict(reading)) for reading in readings[:500]]
+        await asyncio.sleep(0.005)
+        for task in tasks[::2]:
+            task.cancel()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        cancelled = sum(isinstance(o, asyncio.CancelledError) for o in outcomes)
+        finished = [(o, e) for o, e in zip(outcomes, expected[:500]) if isinstance(o, dict)]
+        ok = scorer.in_flight == 0 and matches([o for o, _ in finished], [e for _, e in finished])
+        failed |= not ok
+        print(f"cancellation: {cancelled} cancelled, {len(finished)} completed, "
+              f"{scorer.in_flight} still in flight: {'OK' if ok else 'FAILED'}")
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, body = await http_request(reader, writer, "POST", "/predict", {"PM10": 1})
+        writer.close()
+        await writer.wait_closed()
+        failed |= status != 400
+        print(f"invalid reading over HTTP: {status} {body}")
+
+        server.close()
+        await server.wait_closed()
+        await asyncio.sleep(0.01)  # let connection handlers see EOF and finish
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
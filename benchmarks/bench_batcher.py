@@ -0,0 +1,90 @@
+"""Load test: single-row requests from concurrent clients, direct vs micro-batched.
+
+    python -m benchmarks.bench_batcher --clients 1 10 100 --duration 5
+
+Each client thread sends single-row ``predict_proba`` requests back to back
+for ``--duration`` seconds. Reports request throughput, p50/p99 latency and,
+for the batcher, the mean coalesced batch size. Exits non-zero if any batched
+result differs from the direct call on the same row.
+"""
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from batcher import MicroBatcher
+from benchmarks.common import synthetic_readings
+from features import build_feature_matrix
+from model_registry import load_model_and_scaler
+
+
+def run_clients(predictor, rows, n_clients, duration):
+    latencies = [[] for _ in range(n_clients)]
+    start_line = threading.Barrier(n_clients + 1)
+    stop_at = [0.0]
+
+    def client(index):
+        own = latencies[index]
+        i = index
+        start_line.wait()
+        while time.perf_counter() < stop_at[0]:
+            row = rows[i % len(rows)][None, :]
+            start = time.perf_counter()
+            predictor.predict_proba(row)
+            own.append(time.perf_counter() - start)
+            i += n_clients
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(n_clients)]
+    for thread in threads:
+        thread.start()
+    stop_at[0] = time.perf_counter() + duration
+    start_line.wait()
+    for thread in threads:
+        thread.join()
+    times = np.concatenate([np.asarray(own) for own in latencies])
+    return {
+        'requests_per_sec': len(times) / duration,
+        'p50_ms': float(np.percentile(times, 50) * 1e3),
+        'p99_ms': float(np.percentile(times, 99) * 1e3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    rows = build_feature_matrix(synthetic_readings(1_000), scaler)
+
+    batcher = MicroBatcher(model, max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1e3)
+    sample = rows[:50]
+    mismatched = sum(
+        not np.allclose(batcher.predict_proba(row[None, :]), model.predict_proba(row[None, :]), rtol=0, atol=1e-12)
+        for row in sample
+    )
+    print(f"Parity on {len(sample)} rows: {'OK' if not mismatched else f'{mismatched} mismatched'}")
+
+    print(f"{'clients':>8} {'mode':<8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'batch':>7}")
+    for n_clients in args.clients:
+        direct = run_clients(model, rows, n_clients, args.duration)
+        before = batcher.stats()
+        batched = run_clients(batcher, rows, n_clients, args.duration)
+        after = batcher.stats()
+        mean_batch = (after['rows'] - before['rows']) / max(after['batches'] - before['batches'], 1)
+        for mode, result, batch in (("direct", direct, 1.0), ("batched", batched, mean_batch)):
+            print(f"{n_clients:>8} {mode:<8} {result['requests_per_sec']:>10,.0f} {result['p50_ms']:>9.2f} "
+                  f"{result['p99_ms']:>9.2f} {batch:>7.1f}")
+        print(f"{'':>8} batched/direct: throughput {batched['requests_per_sec'] / direct['requests_per_sec']:.2f}x, "
+              f"p99 latency {batched['p99_ms'] / direct['p99_ms']:.2f}x")
+    batcher.close()
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
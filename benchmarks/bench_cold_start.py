@@ -0,0 +1,100 @@
+"""Cold start to first render, per view, each in a fresh interpreter.
+
+    python -m benchmarks.bench_cold_start --repeat 3
+    python -m benchmarks.bench_cold_start --views Introduction --importtime 15
+
+Every run starts a new Python process that imports Streamlit's test runner
+and renders one view of the app (opened with ``?view=<name>``) headlessly.
+Reports the Streamlit import, the first script run and the whole process
+wall time, plus which heavy modules the view pulled in. Model prefetching and
+the metrics endpoint are turned off so only the view's own work is counted.
+``--importtime`` profiles the imports with ``python -X importtime`` and lists
+the slowest top-level ones; ``--app`` measures another copy of the app (e.g.
+an older revision) for comparison.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+views = ["Introduction", "EDA", "Metrics Comparison", "Modelling & Prediction", "Feature Importance", "SHAP",
+         "Confusion Matrix", "HeatMap", "Backtest", "Citywide Map"]
+heavy_modules = ["numpy", "pandas", "plotly.express", "PIL.Image", "sklearn", "lightgbm"]
+
+_child = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.query_params["view"] = sys.argv[2]
+at.run()
+rendered = time.perf_counter()
+failed = [str(e.value) for e in at.exception]
+print(json.dumps({
+    "streamlit_s": imported - start, "render_s": rendered - imported,
+    "heavy": [m for m in sys.argv[3].split(",") if m in sys.modules], "exceptions": failed,
+}))
+"""
+
+
+def run_view(app, view, importtime=False):
+    env = dict(os.environ, AIR_POLLUTION_PREFETCH_MODEL="0", AIR_POLLUTION_METRICS_PORT="0",
+               PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [
+        "-c", _child, app, view, ",".join(heavy_modules)]
+    start = time.perf_counter()
+    proc = subprocess.run(command, capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - start
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_s"] = wall
+    result["importtime"] = proc.stderr if importtime else ""
+    return result
+
+
+def slowest_imports(stderr, top):
+    """Top-level entries of ``-X importtime`` output, by cumulative microseconds."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith(" ") or name.startswith("  "):
+            continue
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--views", nargs="+", default=views)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--app", default="weather_app.py")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Also list the N slowest top-level imports of each view")
+    args = parser.parse_args()
+
+    print(f"{'view':<24} {'streamlit s':>12} {'render s':>9} {'process s':>10}  heavy modules loaded")
+    failed = False
+    for view in args.views:
+        runs = [run_view(args.app, view) for _ in range(args.repeat)]
+        failed |= any(run["exceptions"] for run in runs)
+        median = {key: float(np.median([run[key] for run in runs])) for key in ("streamlit_s", "render_s", "process_s")}
+        print(f"{view:<24} {median['streamlit_s']:>12.2f} {median['render_s']:>9.2f} {median['process_s']:>10.2f}  "
+              f"{', '.join(runs[-1]['heavy']) or '-'}")
+        for run in runs:
+            for message in run["exceptions"]:
+                print(f"  exception: {message}")
+        if args.importtime:
+            for cumulative, name in slowest_imports(run_view(args.app, view, importtime=True)["importtime"],
+                                                    args.importtime):
+                print(f"    {cumulative / 1e6:>6.3f}s  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Cost of per-prediction explanations relative to plain prediction.
+
+    python -m benchmarks.bench_explain --rows 100000
+
+Times ``predict_proba`` against batch explanations on the same rows, checks
+that contributions add up to the raw scores and compares the path-based
+attributions with exact TreeSHAP on a sample. Exits non-zero if the batch
+explanation takes more than ``--max-ratio`` times the prediction, or if either
+method breaks additivity.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from explain import APPROXIMATE, EXACT, Explainer
+from features import build_feature_matrix
+from model_registry import load_model_and_scaler
+
+
+def additivity_error(values, raw):
+    return float(np.abs(values.sum(axis=2) - raw).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=1_000, help="Rows compared against exact TreeSHAP")
+    parser.add_argument("--max-ratio", type=float, default=5.0)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    X = build_feature_matrix(synthetic_readings(args.rows), scaler)
+    explainer = Explainer(model)
+    explainer.engine  # compile outside the timed region, as the app's cached explainer does
+
+    start = time.perf_counter()
+    model.predict_proba(X)
+    predict_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values = explainer.contributions(X)
+    explain_s = time.perf_counter() - start
+    method = explainer.method_for(len(X))
+
+    start = time.perf_counter()
+    explainer.contributions(X)
+    cached_s = time.perf_counter() - start
+
+    ratio = explain_s / predict_s
+    print(f"{args.rows:,} rows: predict {predict_s:.2f}s, explain ({method}) {explain_s:.2f}s "
+          f"= {ratio:.1f}x prediction; cached repeat {cached_s * 1e3:.1f} ms")
+
+    raw = model.booster_.predict(X, raw_score=True)
+    failed = ratio > args.max_ratio
+    error = additivity_error(values, raw)
+    failed |= error > args.tolerance
+    print(f"Additivity ({method}): max |sum - raw score| {error:.1e}")
+
+    sample = X[:args.sample]
+    start = time.perf_counter()
+    exact = explainer.contributions(sample, method=EXACT)
+    exact_s = time.perf_counter() - start
+    approximate = explainer.contributions(sample, method=APPROXIMATE)
+    error = additivity_error(exact, raw[:args.sample])
+    failed |= error > args.tolerance
+    print(f"Additivity (exact): max |sum - raw score| {error:.1e}; "
+          f"exact TreeSHAP {exact_s / len(sample) * 1e3:.2f} ms/row "
+          f"(~{exact_s / len(sample) * args.rows / predict_s:.0f}x prediction at {args.rows:,} rows)")
+
+    exact_features, approximate_features = exact[:, :, :-1], approximate[:, :, :-1]
+    top_agree = (exact_features.argmax(axis=2) == approximate_features.argmax(axis=2)).mean()
+    correlation = np.corrcoef(exact_features.ravel(), approximate_features.ravel())[0, 1]
+    print(f"Approximate vs exact on {len(sample):,} rows: top feature agrees {top_agree:.0%}, "
+          f"correlation {correlation:.3f}")
+
+    single = describe(time_call(lambda: Explainer(model).contributions(X[:1]), 50))
+    print(f"Single reading (exact, uncached): p50 {single['p50_ms']:.2f} ms, p99 {single['p99_ms']:.2f} ms")
+
+    if ratio > args.max_ratio:
+        print(f"FAILED: explanation took {ratio:.1f}x prediction (limit {args.max_ratio}x)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
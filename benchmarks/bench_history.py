@@ -0,0 +1,114 @@
+"""Range queries and backtests from the partitioned history store vs reloading the station CSVs.
+
+    python -m benchmarks.bench_history --stations 12
+
+Writes four years of synthetic hourly readings per station in the PRSA CSV
+layout, ingests them into a ``HistoryStore`` and times, for both paths:
+a narrow query (one station, one month, nights only), a wide query (all
+stations, one year) and a full backtest (confusion matrix of the model
+against PM2.5 levels). The CSV path reads and converts every file and scores
+all rows each time; the store reads only the matching partitions and reuses
+predictions cached by one ``score`` pass. Exits non-zero if the two paths
+return different rows or confusion matrices.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import synthetic_prsa
+from features import build_feature_matrix, class_labels, predict_in_chunks, prsa_to_readings
+from history_store import HistoryStore, accuracy, level_codes
+from aggregates import levels
+from model_registry import load_model_and_scaler
+
+prsa_stations = ["Aotizhongxin", "Changping", "Dingling", "Dongsi", "Guanyuan", "Gucheng", "Huairou",
+                 "Nongzhanguan", "Shunyi", "Tiantan", "Wanliu", "Wanshouxigong"]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def load_csvs(paths):
+    return prsa_to_readings(pd.concat([pd.read_csv(path) for path in paths], ignore_index=True))
+
+
+def csv_query(paths, stations=None, start=None, end=None, night=None):
+    readings = load_csvs(paths)
+    mask = np.ones(len(readings), dtype=bool)
+    if stations is not None:
+        mask &= readings['station'].isin(stations).to_numpy()
+    if start is not None:
+        mask &= (readings['time'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (readings['time'] < pd.Timestamp(end)).to_numpy()
+    if night is not None:
+        mask &= readings['is_night'].to_numpy() == int(night)
+    return readings[mask].sort_values(['station', 'time'], ignore_index=True)
+
+
+def csv_backtest(paths, model, scaler):
+    readings = load_csvs(paths)
+    proba = predict_in_chunks(model, build_feature_matrix(readings, scaler))
+    to_level = np.array([levels.index(label) for label in class_labels])
+    actual, predicted = level_codes(readings['PM2.5']), to_level[proba.argmax(axis=1)]
+    known = actual >= 0
+    counts = np.bincount(actual[known] * len(levels) + predicted[known], minlength=len(levels) ** 2)
+    return counts.reshape(len(levels), len(levels))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=12, help="Number of synthetic stations (up to 12)")
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    stations = prsa_stations[:args.stations]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, station in enumerate(stations):
+            paths.append(os.path.join(tmp, f"PRSA_Data_{station}_20130301-20170228.csv"))
+            synthetic_prsa(station, seed=i).to_csv(paths[-1], index=False)
+        csv_mb = sum(os.path.getsize(path) for path in paths) / 2**20
+
+        store = HistoryStore(os.path.join(tmp, "history"))
+        _, ingest = timed(lambda: [store.ingest(pd.read_csv(path)) for path in paths])
+        _, score = timed(lambda: store.score(model, scaler, "bench"))
+        print(f"{len(stations)} stations, {store.rows:,} rows ({csv_mb:.0f} MB of CSV) in "
+              f"{len(store.partitions)} partitions; ingest {ingest:.2f}s, one-off scoring {score:.2f}s\n")
+
+        print(f"{'operation':<40} {'rows':>9} {'CSV s':>8} {'store s':>8} {'speedup':>8}")
+        queries = [
+            ("Dongsi, Jan 2016, nights only", dict(stations=["Dongsi"], start="2016-01-01", end="2016-02-01", night=True)),
+            ("all stations, 2016", dict(start="2016-01-01", end="2017-01-01")),
+        ]
+        for name, filters in queries:
+            expected, csv_seconds = timed(lambda: csv_query(paths, **filters))
+            found, store_seconds = timed(lambda: store.query(**filters))
+            found = found.sort_values(['station', 'time'], ignore_index=True)
+            same = len(found) == len(expected) and np.allclose(
+                found['PM10'].to_numpy(), expected['PM10'].to_numpy(), equal_nan=True)
+            failed |= not same
+            print(f"{name:<40} {len(found):>9,} {csv_seconds:>8.2f} {store_seconds:>8.3f} "
+                  f"{csv_seconds / store_seconds:>7.0f}x{'' if same else '  MISMATCH'}")
+
+        expected, csv_seconds = timed(lambda: csv_backtest(paths, model, scaler))
+        (confusion, outcomes), store_seconds = timed(lambda: store.backtest("bench"))
+        same = np.array_equal(confusion.to_numpy(), expected)
+        failed |= not same
+        print(f"{'backtest, all readings':<40} {len(outcomes):>9,} {csv_seconds:>8.2f} {store_seconds:>8.3f} "
+              f"{csv_seconds / store_seconds:>7.0f}x{'' if same else '  MISMATCH'}")
+        print(f"\naccuracy {accuracy(confusion):.2%} on synthetic readings")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Cost of the metrics instrumentation next to the work it measures.
+
+    python -m benchmarks.bench_metrics
+
+Reports the per-call cost of counter increments, histogram observations and
+the ``time()`` context manager, the scrape (render) time, and the overhead of
+timing a single-row prediction as a share of that prediction.
+"""
+import argparse
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import build_feature_matrix
+from metrics import MetricsRegistry
+from model_registry import load_model_and_scaler
+
+
+def per_call_us(func, calls):
+    def loop():
+        for _ in range(calls):
+            func()
+    return time_call(loop, 5).min() / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Counter", ["level"])
+    histogram = registry.histogram("bench_seconds", "Histogram", ["stage"])
+
+    def timed_block():
+        with histogram.time(stage="predict"):
+            pass
+
+    costs = {
+        "counter.inc": per_call_us(lambda: counter.inc(level="High"), args.calls),
+        "histogram.observe": per_call_us(lambda: histogram.observe(0.003, stage="predict"), args.calls),
+        "histogram.time()": per_call_us(timed_block, args.calls),
+    }
+    for name, cost in costs.items():
+        print(f"{name:<18} {cost:.2f} µs/call")
+
+    for stage in range(20):
+        histogram.observe(0.01, stage=f"stage_{stage}")
+    render = describe(time_call(registry.render, 200))
+    print(f"render (21 histogram series) p50 {render['p50_ms']:.3f} ms")
+
+    model, scaler = load_model_and_scaler()
+    X = build_feature_matrix(synthetic_readings(1), scaler)
+    plain = describe(time_call(lambda: model.predict_proba(X), 500))['p50_ms']
+
+    def instrumented():
+        with histogram.time(stage="predict"):
+            model.predict_proba(X)
+        counter.inc(level="High")
+
+    timed = describe(time_call(instrumented, 500))['p50_ms']
+    overhead_us = costs["histogram.time()"] + costs["counter.inc"]
+    print(f"single-row predict_proba p50 {plain:.3f} ms, instrumented {timed:.3f} ms; "
+          f"instrumentation {overhead_us:.1f} µs = {overhead_us / (plain * 1e3):.2%} of the call")
+
+
+if __name__ == "__main__":
+    main()
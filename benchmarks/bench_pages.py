@@ -0,0 +1,52 @@
+"""Render time of each sidebar view, with the image asset cache off (before) and on (after).
+
+    python -m benchmarks.bench_pages --repeat 5
+
+Views are rendered headlessly with Streamlit's AppTest; the first render of
+each configuration is a warm-up and is not timed.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+app_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "weather_app.py")
+views = ["Introduction", "EDA", "Metrics Comparison", "Modelling & Prediction",
+         "Feature Importance", "SHAP", "Confusion Matrix", "HeatMap"]
+
+
+def render_times(view, repeat):
+    times = []
+    app = AppTest.from_file(app_path, default_timeout=120).run()
+    app.sidebar.radio[0].set_value(view).run()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(f"{view} failed: {app.exception[0].message}")
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--views", nargs="+", default=views)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(app_path))
+    results = {}
+    for label, flag in (("before", "0"), ("after", "1")):
+        os.environ["AIR_POLLUTION_ASSET_CACHE"] = flag
+        results[label] = {view: np.median(render_times(view, args.repeat)) for view in args.views}
+
+    print(f"{'view':<24} {'before ms':>10} {'after ms':>10} {'speed-up':>9}")
+    for view in args.views:
+        before, after = results["before"][view], results["after"][view]
+        print(f"{view:<24} {before * 1e3:>10.1f} {after * 1e3:>10.1f} {before / after:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Throughput of parallel_scorer from 1 to N worker processes.
+
+    python -m benchmarks.bench_parallel --rows 2000000 --max-workers 8
+"""
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.common import synthetic_readings
+from model_registry import load_model_and_scaler
+from parallel_scorer import score_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm")
+    args = parser.parse_args()
+
+    _, scaler = load_model_and_scaler()
+    readings = synthetic_readings(args.rows)
+
+    worker_counts = sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i < args.max_workers], args.max_workers})
+    baseline = reference = None
+    print(f"{'workers':>8} {'start-up s':>11} {'scoring s':>10} {'rows/s':>12} {'speed-up':>9}")
+    for workers in worker_counts:
+        proba, timings = score_parallel(readings, scaler, workers=workers,
+                                        chunk_size=args.chunk_size, engine=args.engine)
+        if reference is None:
+            reference = proba
+        elif not np.array_equal(reference, proba):
+            raise SystemExit(f"Output with {workers} workers differs from the 1-worker run")
+        rate = args.rows / timings['scoring_s']
+        baseline = baseline or rate
+        print(f"{workers:>8} {timings['startup_s']:>11.2f} {timings['scoring_s']:>10.2f} "
+              f"{rate:>12,.0f} {rate / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Preprocessing benchmark: the original per-row dict path vs the compiled FeatureTransform.
+
+    python -m benchmarks.bench_preprocessing --sizes 1 1000 1000000
+
+The per-row path is only timed up to --legacy-max-rows since it runs in Python per row.
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import synthetic_readings, time_call
+from features import (
+    build_feature_matrix, compiled_transform, encode_categories, final_feature_names,
+    numeric_features, numeric_sources, raw_numeric_columns, station_options,
+    station_wd_features, wind_options
+)
+from model_registry import load_model_and_scaler
+
+
+def legacy_features(readings, scaler):
+    """The feature construction the app used before, applied row by row."""
+    rows = []
+    for reading in readings.to_dict('records'):
+        user_input = {feat: 0 for feat in final_feature_names}
+        user_input[f"station_{reading['station']}"] = 1
+        if reading['wd'] != 'N':
+            user_input[f"wd_{reading['wd']}"] = 1
+        for feat, (column, use_log) in numeric_sources.items():
+            user_input[feat] = np.log1p(reading[column]) if use_log else reading[column]
+
+        X_cat = np.array([[user_input[feat] for feat in station_wd_features]])
+        X_num = np.array([[user_input[feat] for feat in numeric_features]])
+        X_num_scaled = scaler.transform(X_num)
+        rows.append(np.concatenate([X_cat, X_num_scaled], axis=1))
+    return np.vstack(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1_000, 1_000_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    _, scaler = load_model_and_scaler()
+    transform = compiled_transform(scaler)
+
+    print(f"{'rows':>9} {'path':<28} {'best ms':>10} {'rows/s':>14}")
+    for n_rows in args.sizes:
+        readings = synthetic_readings(n_rows)
+        raw = readings[raw_numeric_columns].to_numpy(dtype=np.float64)
+        station_codes = encode_categories(readings['station'], station_options)
+        wd_codes = encode_categories(readings['wd'], wind_options[1:])
+        out64 = transform.allocate(n_rows)
+        out32 = transform.allocate(n_rows, np.float32)
+        repeat = max(3, min(200, 200_000 // n_rows))
+
+        paths = {
+            "DataFrame -> matrix": lambda: build_feature_matrix(readings, scaler),
+            "compiled, reused f64 buffer": lambda: transform.transform(raw, station_codes, wd_codes, out=out64),
+            "compiled, reused f32 buffer": lambda: transform.transform(raw, station_codes, wd_codes, out=out32),
+        }
+        if n_rows <= args.legacy_max_rows:
+            paths = {"per-row dict (original)": lambda: legacy_features(readings, scaler), **paths}
+            expected = legacy_features(readings, scaler)
+            assert np.array_equal(expected, transform.transform(raw, station_codes, wd_codes, out=out64))
+
+        for name, func in paths.items():
+            best = time_call(func, repeat if "per-row" not in name else 3).min()
+            print(f"{n_rows:>9} {name:<28} {best * 1e3:>10.3f} {n_rows / best:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Latency seen by callers with candidate models scored in shadow, and the candidates' agreement.
+
+    python -m benchmarks.bench_shadow --requests 2000 --interval-ms 0 5 --rounds 3
+
+Single-reading requests are sent one after another, either back to back or
+paced ``--interval-ms`` apart like live traffic, through a ``ShadowScorer``
+with no candidates, then with one, then with three: the booster compiled into
+the native engine (agrees by construction), a 50-iteration float32 variant
+(model_variants.py) and a second copy of the full LightGBM model. For each
+setup it reports the served latency percentiles, the rows shadow-scored and
+the rows skipped because the shadow queue was full, and each candidate's
+agreement with the primary. Setups take turns for ``--rounds`` rounds and the
+median of each figure is shown, since tail latency on a busy machine varies
+from run to run. Exits non-zero if the native candidate ever disagrees.
+"""
+import argparse
+import copy
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import synthetic_readings
+from features import build_feature_matrix
+from latency import LatencyHistogram
+from model_registry import load_model_and_scaler
+from model_variants import derive_variant
+from shadow_scoring import ShadowScorer
+from tree_engine import TreeEnsemble
+
+
+def replay(scorer, X, interval):
+    """Send each row as its own call, ``interval`` seconds apart (0: back to back); served latency histogram."""
+    latency = LatencyHistogram()
+    start = time.perf_counter()
+    for i in range(len(X)):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        scorer.predict_proba(X[i:i + 1])
+        latency.add(time.perf_counter() - t0)
+    scorer.drain()
+    return latency.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--interval-ms", type=float, nargs="+", default=[0.0, 5.0])
+    parser.add_argument("--max-pending-rows", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    native = TreeEnsemble.from_booster(model)
+    candidates = {"native": native, "50 iter float32": derive_variant(native, iterations=50, dtype=np.float32),
+                  "lightgbm copy": copy.deepcopy(model)}
+    setups = [("no shadow", []), ("1 shadow", ["native"]), ("3 shadows", list(candidates))]
+    X = build_feature_matrix(synthetic_readings(args.requests), scaler)
+    X_warm = X[:50]
+
+    failed = False
+    print(f"{args.requests:,} single-reading requests; shadow queue bound {args.max_pending_rows} rows\n")
+    print(f"{'interval':>9} {'setup':<10} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'shadowed':>9} {'skipped':>8}  agreement")
+    for interval_ms in args.interval_ms:
+        runs = {setup: [] for setup, _ in setups}
+        for _ in range(args.rounds):
+            for setup, names in setups:
+                models = {"primary": model, **{name: candidates[name] for name in names}}
+                scorer = ShadowScorer(models, {name: scaler for name in models}, "primary",
+                                      max_pending_rows=args.max_pending_rows)
+                replay(scorer, X_warm, 0.0)
+                scorer = ShadowScorer(models, {name: scaler for name in models}, "primary",
+                                      max_pending_rows=args.max_pending_rows)
+                served = replay(scorer, X, interval_ms / 1e3)
+                stats = scorer.stats()
+                scorer.close()
+                native_stats = stats["models"].get("native")
+                failed |= native_stats is not None and native_stats["agreement"] is not None and native_stats["agreement"] < 1.0
+                runs[setup].append((served, stats))
+        for setup, results in runs.items():
+            served = {key: np.median([r[0][key] for r in results]) for key in ("p50_ms", "p95_ms", "p99_ms")}
+            shadowed = np.median([r[1]["models"]["primary"]["shadow_rows"] for r in results])
+            skipped = np.median([r[1]["dropped_rows"] for r in results])
+            stats = results[-1][1]
+            agreement = ", ".join(f"{name} {s['agreement']:.1%}" for name, s in stats["models"].items()
+                                  if s["agreement"] is not None)
+            print(f"{interval_ms:>7.1f}ms {setup:<10} {served['p50_ms']:>7.2f} {served['p95_ms']:>7.2f} "
+                  f"{served['p99_ms']:>7.2f} {shadowed:>9,.0f} {skipped:>8,.0f}  {agreement}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
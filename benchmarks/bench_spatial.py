@@ -0,0 +1,87 @@
+"""Citywide map updates: scoring every station at once and interpolating over the grid, with parity checks.
+
+    python -m benchmarks.bench_spatial --stations 12 100 500 --rows 60 200 400 --neighbors 8
+
+Stations are scattered at random over the Beijing bounds with synthetic
+readings. For each station count and grid size the report gives:
+- the one-off cost of building ``IDWInterpolator``'s neighbour index;
+- the p50 of one map update: one model call for all stations, then the grid
+  interpolation;
+- a plain per-cell Python loop (distances to every station, nearest ``k``,
+  weights) timed on a sample of cells and given per cell.
+Exits non-zero if the loop and the interpolator disagree on any sampled cell.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import build_feature_matrix
+from model_registry import load_model_and_scaler
+from spatial import IDWInterpolator, beijing_bounds, make_grid, to_km
+
+
+def per_cell_loop(station_latlon, lats, lons, values, cells, k, power):
+    """Reference: IDW of ``values`` at the given flat cell indices, one cell at a time."""
+    origin = float(np.mean(lats))
+    stations = to_km(station_latlon, origin)
+    out = np.empty((len(cells), values.shape[1]))
+    for i, cell in enumerate(cells):
+        here = to_km(np.array([[lats[cell // len(lons)], lons[cell % len(lons)]]]), origin)[0]
+        distances = np.sqrt(((stations - here) ** 2).sum(axis=1))
+        nearest = np.argsort(distances, kind="stable")[:k]
+        if distances[nearest[0]] <= 1e-3:
+            out[i] = values[nearest[0]]
+            continue
+        weights = distances[nearest] ** -power
+        out[i] = weights @ values[nearest] / weights.sum()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, nargs="+", default=[12, 100, 500])
+    parser.add_argument("--rows", type=int, nargs="+", default=[60, 200, 400], help="Grid rows (north-south cells)")
+    parser.add_argument("--neighbors", type=int, default=8)
+    parser.add_argument("--power", type=float, default=2.0)
+    parser.add_argument("--sample-cells", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    rng = np.random.default_rng(0)
+    south, north, west, east = beijing_bounds
+    failed = False
+
+    print(f"k={args.neighbors}, power={args.power}; update = one model call for all stations + interpolation\n")
+    print(f"{'stations':>8} {'cells':>8} {'index ms':>9} {'score ms':>9} {'interp ms':>10} {'update ms':>10} "
+          f"{'loop µs/cell':>13} {'vector µs/cell':>15} {'max diff':>9}")
+    for n_stations in args.stations:
+        readings = synthetic_readings(n_stations, seed=n_stations)
+        station_latlon = np.column_stack([rng.uniform(south, north, n_stations), rng.uniform(west, east, n_stations)])
+        X = build_feature_matrix(readings, scaler)
+        score = describe(time_call(lambda: model.predict_proba(X), args.repeat))['p50_ms']
+        proba = model.predict_proba(X)
+        for rows in args.rows:
+            lats, lons = make_grid(beijing_bounds, rows)
+            n_cells = len(lats) * len(lons)
+            index = describe(time_call(
+                lambda: IDWInterpolator(station_latlon, lats, lons, k=args.neighbors, power=args.power), 3))['p50_ms']
+            interpolator = IDWInterpolator(station_latlon, lats, lons, k=args.neighbors, power=args.power)
+            interp = describe(time_call(lambda: interpolator(proba), args.repeat))['p50_ms']
+            update = describe(time_call(lambda: interpolator(model.predict_proba(X)), args.repeat))['p50_ms']
+
+            sample = rng.choice(n_cells, size=min(args.sample_cells, n_cells), replace=False)
+            loop = time_call(lambda: per_cell_loop(station_latlon, lats, lons, proba, sample, interpolator.k,
+                                                   args.power), 1)[0]
+            expected = per_cell_loop(station_latlon, lats, lons, proba, sample, interpolator.k, args.power)
+            diff = float(np.abs(interpolator(proba).reshape(n_cells, -1)[sample] - expected).max())
+            failed |= diff > 1e-9
+            print(f"{n_stations:>8,} {n_cells:>8,} {index:>9.2f} {score:>9.2f} {interp:>10.2f} {update:>10.2f} "
+                  f"{loop / len(sample) * 1e6:>13.1f} {interp / n_cells * 1e3:>15.3f} {diff:>9.1e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
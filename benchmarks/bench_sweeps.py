@@ -0,0 +1,55 @@
+"""What-if sweep cost: grid construction and scoring, against the per-row dict path.
+
+    python -m benchmarks.bench_sweeps --points 50 100 200
+
+For an n x n PM10 x inverse-wind sweep, times ``sweep_matrix`` against
+building each row with ``build_feature_row`` from a dict, then the single
+vectorized ``predict_proba`` call. Exits non-zero if the grid rows differ
+from the per-row path or from ``build_feature_matrix`` on the same readings.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import build_feature_matrix, build_feature_row
+from model_registry import load_model_and_scaler
+from sweeps import axis_values, run_sweep, sweep_matrix, sweep_readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    base = synthetic_readings(1).to_dict("records")[0]
+    failed = False
+
+    # Parity on every kind of axis: continuous, discrete numeric and categorical
+    for axes in ([('PM10', axis_values('PM10', 7)), ('inverse_wind', axis_values('inverse_wind', 5))],
+                 [('month', axis_values('month')), ('station', axis_values('station'))],
+                 [('wd', axis_values('wd'))]):
+        X = sweep_matrix(base, axes, scaler)
+        readings = sweep_readings(base, axes)
+        per_row = np.vstack([build_feature_row(reading, scaler) for reading in readings.to_dict("records")])
+        ok = np.array_equal(X, per_row) and np.array_equal(X, build_feature_matrix(readings, scaler))
+        failed |= not ok
+        print(f"parity {' x '.join(p for p, _ in axes):<20} {len(X):>5} rows: {'OK' if ok else 'MISMATCH'}")
+
+    print(f"\n{'grid':>9} {'rows':>8} {'grid ms':>9} {'dict ms':>10} {'speedup':>8} {'score ms':>9}")
+    for n in args.points:
+        axes = [('PM10', axis_values('PM10', n)), ('inverse_wind', axis_values('inverse_wind', n))]
+        grid = describe(time_call(lambda: sweep_matrix(base, axes, scaler), args.repeat))['p50_ms']
+        records = sweep_readings(base, axes).to_dict("records")
+        per_row = describe(time_call(
+            lambda: np.vstack([build_feature_row(reading, scaler) for reading in records]), 1))['p50_ms']
+        score = describe(time_call(lambda: run_sweep(model, scaler, base, axes), max(args.repeat // 2, 1)))['p50_ms']
+        print(f"{f'{n}x{n}':>9} {n * n:>8,} {grid:>9.2f} {per_row:>10.1f} {per_row / grid:>7.0f}x {score:>9.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
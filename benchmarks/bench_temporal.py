@@ -0,0 +1,100 @@
+"""Cost of the incremental temporal features next to streaming throughput, with parity checks.
+
+    python -m benchmarks.bench_temporal --stations 12 --hours 2000 --batch-sizes 1 64 512
+
+A feed of hourly readings from several stations (interleaved by time, 5% of
+readings missing) is pushed through ``TemporalFeatureEngine.update`` in
+micro-batches and through ``StreamScorer.score_batch`` with the shipped model.
+The report gives the engine's cost per reading, that cost as a share of
+scoring the same batches, and the history kept per station. Exits non-zero if
+incremental features differ from one replay of the whole feed, or from pandas
+time-based rolling windows.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import synthetic_prsa
+from benchmarks.bench_history import prsa_stations
+from features import prsa_to_readings
+from model_registry import load_model_and_scaler
+from stream_scorer import StreamScorer
+from temporal_features import TemporalFeatureEngine
+
+
+def feed(n_stations, hours):
+    frames = [prsa_to_readings(synthetic_prsa(station, "2016-01-01", pd.Timestamp("2016-01-01") + pd.Timedelta(hours=hours),
+                                              seed=i))
+              for i, station in enumerate(prsa_stations[:n_stations])]
+    readings = pd.concat(frames, ignore_index=True).sort_values("time", kind="stable", ignore_index=True)
+    return readings.sample(frac=0.95, random_state=0).sort_index(ignore_index=True)
+
+
+def pandas_reference(readings, engine):
+    """The same features from pandas rolling windows over each station's time index."""
+    columns = {}
+    for station, group in readings.groupby("station"):
+        group = group.set_index("time")
+        for source in engine.sources:
+            series = group[source]
+            stats = {}
+            for w in engine.windows:
+                stats[f"mean_{w}h"] = series.rolling(f"{w}h").mean()
+            for w in engine.windows:
+                stats[f"max_{w}h"] = series.rolling(f"{w}h").max()
+            for k in engine.lags:
+                lagged = series.reindex(series.index - pd.Timedelta(hours=k)).to_numpy()
+                stats[f"lag_{k}h"] = pd.Series(lagged, index=series.index)
+                stats[f"delta_{k}h"] = pd.Series(series.to_numpy() - lagged, index=series.index)
+            for stat, values in stats.items():
+                columns.setdefault(f"{source}_{stat}", []).append(
+                    pd.Series(values.to_numpy(), index=group["row"].to_numpy()))
+    return pd.DataFrame({name: pd.concat(parts) for name, parts in columns.items()}).sort_index()[engine.feature_names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=12)
+    parser.add_argument("--hours", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 512])
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    readings = feed(args.stations, args.hours)
+    records = readings.assign(time=readings["time"].astype(str)).to_dict("records")
+    replay = TemporalFeatureEngine().update(readings)
+    reference = pandas_reference(readings.assign(row=np.arange(len(readings))), TemporalFeatureEngine())
+    failed = not np.allclose(replay, reference.to_numpy(), equal_nan=True)
+    print(f"{len(readings):,} readings from {args.stations} stations; "
+          f"replay vs pandas rolling: {'OK' if not failed else 'MISMATCH'}\n")
+
+    print(f"{'batch':>6} {'engine µs/row':>14} {'scoring µs/row':>15} {'engine share':>13} {'parity':>7}")
+    for batch_size in args.batch_sizes:
+        # Single-reading batches are timed on a prefix of the feed
+        n_rows = len(readings) if batch_size > 1 else min(len(readings), 5_000)
+        engine = TemporalFeatureEngine()
+        bounds = range(0, n_rows, batch_size)
+        start = time.perf_counter()
+        incremental = np.vstack([engine.update(readings.iloc[i:min(i + batch_size, n_rows)]) for i in bounds])
+        engine_seconds = time.perf_counter() - start
+        scorer = StreamScorer(model, scaler, batch_size=batch_size)
+        batches = [records[i:min(i + batch_size, n_rows)] for i in bounds]
+        start = time.perf_counter()
+        for batch in batches:
+            scorer.score_batch(batch)
+        scoring_seconds = time.perf_counter() - start
+        same = np.allclose(incremental, replay[:n_rows], equal_nan=True)
+        failed |= not same
+        print(f"{batch_size:>6} {engine_seconds / n_rows * 1e6:>14.1f} {scoring_seconds / n_rows * 1e6:>15.1f} "
+              f"{engine_seconds / scoring_seconds:>12.1%} {'OK' if same else 'FAIL':>7}")
+
+    print(f"\n{len(engine.feature_names)} features; history per station: {engine.capacity} hours x "
+          f"{len(engine.sources)} sources = {engine.state_bytes() // args.stations:,} bytes, whatever the feed length")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Parity and latency of the native tree evaluator against LightGBM's predict_proba.
+
+    python -m benchmarks.bench_tree_engine
+
+Exits non-zero if any probability differs by more than the tolerance or any
+predicted class disagrees, for batch and single-row inputs, with and without NaNs.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import build_feature_matrix, class_labels
+from model_registry import load_model_and_scaler
+from tree_engine import TreeEnsemble
+
+
+def check_parity(model, engine, X, tolerance):
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    max_diff = np.abs(expected - actual).max(axis=0)
+    agree = np.array_equal(expected.argmax(axis=1), actual.argmax(axis=1))
+
+    single_diff = max(
+        np.abs(model.predict_proba(X[i:i + 1]) - engine.predict_proba(X[i:i + 1])).max()
+        for i in range(min(len(X), 200))
+    )
+    ok = agree and max_diff.max() <= tolerance and single_diff <= tolerance
+    return ok, max_diff, single_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    start = time.perf_counter()
+    engine = TreeEnsemble.from_booster(model)
+    print(f"Compiled {engine.n_trees} trees / {engine.n_nodes} nodes (depth {engine.max_depth}) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    X = build_feature_matrix(synthetic_readings(args.rows), scaler)
+    X_missing = X.copy()
+    X_missing[::5, -4] = np.nan
+
+    failed = False
+    for name, data in (("dense", X), ("with NaN", X_missing)):
+        ok, max_diff, single_diff = check_parity(model, engine, data, args.tolerance)
+        failed |= not ok
+        per_class = ", ".join(f"{label} {diff:.1e}" for label, diff in zip(class_labels, max_diff))
+        print(f"Parity ({name}): {'OK' if ok else 'FAILED'} - max |dp| {per_class}; single-row {single_diff:.1e}")
+
+    row = X[:1]
+    for name, predictor in (("lightgbm", model), ("native", engine)):
+        single = describe(time_call(lambda: predictor.predict_proba(row), args.repeat))
+        batch = time_call(lambda: predictor.predict_proba(X), 3)
+        print(f"{name:>9}: single-row p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms; "
+              f"batch {args.rows / batch.min():,.0f} rows/s")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
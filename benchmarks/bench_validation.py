@@ -0,0 +1,65 @@
+"""Cost of validating and drift-tracking every batch, relative to scoring it.
+
+    python -m benchmarks.bench_validation --rows 100000 1000000
+
+For each size, times ``InputValidator.check``, the drift histograms of one
+batch (``DriftReference.histograms``) and the full PSI/KS table against the
+feature matrix build and ``predict_proba`` on the same rows. Then checks
+that a reference built from one half of the readings sees no drift in the
+other half, and that scaled-up PM10 and a missing station are reported as
+major shifts. Exits non-zero if either check fails.
+"""
+import argparse
+import sys
+
+from benchmarks.common import synthetic_readings, time_call
+from features import build_feature_matrix, station_options
+from model_registry import load_model_and_scaler
+from validation import DriftReference, InputValidator, drift_status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    validator = InputValidator(scaler)
+    reference = DriftReference.from_scaler(scaler)
+
+    print(f"{'rows':>10} {'features ms':>12} {'check ms':>9} {'hist ms':>8} {'drift ms':>9} {'predict ms':>11} "
+          f"{'overhead':>9}")
+    for n_rows in args.rows:
+        readings = synthetic_readings(n_rows)
+        X = build_feature_matrix(readings, scaler)
+        features = time_call(lambda: build_feature_matrix(readings, scaler), args.repeat).min() * 1e3
+        check = time_call(lambda: validator.check(readings, X), args.repeat).min() * 1e3
+        hist = time_call(lambda: reference.histograms(X), args.repeat).min() * 1e3
+        drift = time_call(lambda: reference.drift(X), args.repeat).min() * 1e3
+        predict = time_call(lambda: model.predict_proba(X), 1).min() * 1e3
+        print(f"{n_rows:>10,} {features:>12.1f} {check:>9.1f} {hist:>8.1f} {drift:>9.1f} {predict:>11.1f} "
+              f"{(check + hist) / (features + predict):>9.1%}")
+
+    readings = synthetic_readings(max(args.rows), seed=1)
+    X = build_feature_matrix(readings, scaler)
+    half = len(X) // 2
+    self_reference = DriftReference.from_matrix(X[:half])
+    same = self_reference.drift(X[half:])
+    shifted_readings = readings[half:].assign(PM10=readings['PM10'][half:] * 3)
+    shifted_readings = shifted_readings[shifted_readings['station'] != station_options[0]]
+    shifted = self_reference.drift(build_feature_matrix(shifted_readings, scaler))
+
+    print(f"\nself-drift, two halves of {len(X):,} rows: max PSI {same['psi'].max():.4f}, "
+          f"max KS {same['ks'].max():.4f}")
+    print("PM10 x3 and no readings from " + station_options[0] + ":")
+    for feature in ('PM10_log', 'station', 'NO2_log'):
+        psi = shifted.loc[feature, 'psi']
+        print(f"  {feature:<10} PSI {psi:8.4f}  {drift_status(psi)}")
+    failed = same['psi'].max() >= 0.1 or any(
+        drift_status(shifted.loc[feature, 'psi']) != "major" for feature in ('PM10_log', 'station'))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Size, latency and agreement of reduced model variants, to pick an edge operating point.
+
+    python -m benchmarks.bench_variants --iterations 200 100 50 25 --dtypes float64 float32 float16
+    python -m benchmarks.bench_variants --readings archive.parquet --drop-share 0.01
+
+Every combination of kept iterations, storage dtype and with/without the
+negligible features is derived from the full model and compared with the
+original LightGBM predictions on the same readings: label agreement and the
+largest probability difference. Size is the node arrays in memory and the
+exported artifact on disk; latency is single-row p50 and per-row cost in a
+batch. Exits non-zero if the unreduced native variant disagrees with LightGBM.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from artifacts import export_artifact
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import build_feature_matrix, read_readings
+from model_registry import load_model_and_scaler
+from model_variants import derive_variant, ensemble_bytes, feature_importance, negligible_features, variant_name
+from tree_engine import TreeEnsemble
+
+
+def artifact_mb(variant, scaler):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "variant.apm")
+        export_artifact(variant, scaler, path)
+        return os.path.getsize(path) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, nargs="+", default=[200, 100, 50, 25])
+    parser.add_argument("--dtypes", nargs="+", default=["float64", "float32", "float16"])
+    parser.add_argument("--drop-share", type=float, default=0.01,
+                        help="Share of total gain held by the features the reduced variants drop")
+    parser.add_argument("--readings", default=None, help="CSV/Parquet of raw readings (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    model, scaler = load_model_and_scaler()
+    readings = read_readings(args.readings) if args.readings else synthetic_readings(args.rows)
+    X = build_feature_matrix(readings, scaler)
+    reference = model.predict_proba(X)
+    reference_labels = reference.argmax(axis=1)
+    row = X[:1]
+    lightgbm_single = describe(time_call(lambda: model.predict_proba(row), args.repeat))['p50_ms']
+    lightgbm_batch = time_call(lambda: model.predict_proba(X), 3).min() / len(X)
+
+    full = TreeEnsemble.from_booster(model)
+    drop = negligible_features(feature_importance(model), args.drop_share)
+    print(f"{len(X):,} readings; {len(drop)} features hold {args.drop_share:.0%} of total gain: {', '.join(drop)}")
+    print(f"LightGBM: single-row p50 {lightgbm_single * 1e3:.0f} µs, batch {lightgbm_batch * 1e6:.1f} µs/row, "
+          f"pickle {os.path.getsize('LightGBM.pkl') / 2**20:.2f} MB\n")
+
+    print(f"{'variant':<30} {'nodes':>7} {'mem MB':>7} {'file MB':>8} {'1-row µs':>9} {'µs/row':>7} "
+          f"{'agree':>8} {'max |Δp|':>9}")
+    failed = False
+    for iterations in args.iterations:
+        for dtype in args.dtypes:
+            for dropped in ([], drop) if drop else ([],):
+                variant = derive_variant(full, iterations, dtype, dropped)
+                proba = variant.predict_proba(X)
+                agreement = np.mean(proba.argmax(axis=1) == reference_labels)
+                max_diff = np.abs(proba - reference).max()
+                single = describe(time_call(lambda: variant.predict_proba(row), args.repeat))['p50_ms']
+                batch = time_call(lambda: variant.predict_proba(X), 3).min() / len(X)
+                print(f"{variant_name(iterations, dtype, dropped):<30} {variant.n_nodes:>7,} "
+                      f"{ensemble_bytes(variant) / 2**20:>7.2f} {artifact_mb(variant, scaler):>8.2f} "
+                      f"{single * 1e3:>9.0f} {batch * 1e6:>7.1f} {agreement:>8.2%} {max_diff:>9.2e}")
+                if variant.n_trees == full.n_trees and dtype == "float64" and not dropped:
+                    failed |= max_diff > 1e-9
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import station_options, wind_options
+
+
+def synthetic_readings(n_rows, seed=0):
+    """Random raw readings in roughly the ranges seen in the Beijing data."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'PM10': rng.gamma(2.0, 50.0, n_rows),
+        'SO2': rng.gamma(1.0, 12.0, n_rows),
+        'NO2': rng.gamma(2.5, 20.0, n_rows),
+        'CO': rng.gamma(2.0, 600.0, n_rows),
+        'O3': rng.gamma(1.5, 40.0, n_rows),
+        'PRES': rng.normal(1010.0, 10.0, n_rows),
+        'temp_dewp_diff': rng.gamma(2.0, 6.0, n_rows),
+        'inverse_wind': rng.gamma(1.5, 0.5, n_rows),
+        'CO_NO2_ratio': rng.gamma(2.0, 14.0, n_rows),
+        'month': rng.integers(1, 13, n_rows),
+        'is_night': rng.integers(0, 2, n_rows),
+        'Rain_Flag': (rng.random(n_rows) < 0.05).astype(int),
+        'station': rng.choice(station_options, n_rows),
+        'wd': rng.choice(wind_options, n_rows),
+    })
+
+
+def synthetic_prsa(station, start="2013-03-01", end="2017-03-01", seed=0):
+    """Hourly rows in the PRSA station-file layout (a few percent of values missing, as in the real files)."""
+    rng = np.random.default_rng(seed)
+    when = pd.date_range(start, end, freq="h", inclusive="left")
+    n_rows = len(when)
+    season = np.cos(2 * np.pi * (when.month.to_numpy() - 1) / 12)  # +1 in January, -1 in July
+    # Episodes build up over hours: log PM10 is an AR(1) process with 0.9 persistence per hour
+    from scipy.signal import lfilter
+    episodes = lfilter([1.0], [1.0, -0.9], rng.normal(0.0, 0.25, n_rows))
+    frame = pd.DataFrame({
+        'No': np.arange(1, n_rows + 1), 'year': when.year, 'month': when.month, 'day': when.day, 'hour': when.hour,
+        'PM10': (100.0 + 30.0 * season) * np.exp(episodes - episodes.var()),
+        'SO2': rng.gamma(1.0, 12.0 + 8.0 * season, n_rows),
+        'NO2': rng.gamma(2.5, 20.0, n_rows),
+        'CO': rng.gamma(2.0, 600.0, n_rows),
+        'O3': rng.gamma(1.5, 40.0 - 20.0 * season, n_rows),
+        'TEMP': 13.0 - 15.0 * season + rng.normal(0.0, 4.0, n_rows),
+        'PRES': 1012.0 + 10.0 * season + rng.normal(0.0, 5.0, n_rows),
+        'DEWP': 2.0 - 15.0 * season + rng.normal(0.0, 6.0, n_rows),
+        'RAIN': np.where(rng.random(n_rows) < 0.04, rng.gamma(1.0, 2.0, n_rows), 0.0),
+        'wd': rng.choice(wind_options, n_rows),
+        'WSPM': np.round(rng.gamma(2.0, 0.9, n_rows), 1),
+        'station': station,
+    })
+    frame['DEWP'] = np.minimum(frame['DEWP'], frame['TEMP'])
+    # Fine particles track PM10 and rise in calm air, so a retrained model has signal to find
+    frame.insert(5, 'PM2.5', 0.45 * frame['PM10'] * rng.lognormal(0.0, 0.3, n_rows) / np.sqrt(frame['WSPM'] + 0.5))
+    for col in ('PM2.5', 'PM10', 'SO2', 'NO2', 'CO', 'O3'):
+        frame.loc[rng.random(n_rows) < 0.02, col] = np.nan
+    return frame
+
+
+def time_call(func, repeat):
+    """Per-call wall times in seconds."""
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def describe(times):
+    return {
+        'p50_ms': float(np.percentile(times, 50) * 1e3),
+        'p95_ms': float(np.percentile(times, 95) * 1e3),
+        'p99_ms': float(np.percentile(times, 99) * 1e3),
+        'mean_ms': float(times.mean() * 1e3),
+    }
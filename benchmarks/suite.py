@@ -0,0 +1,269 @@
+"""Stage-by-stage benchmark of the full prediction path, with regression checks.
+
+    python -m benchmarks.suite --output bench_results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.25
+    python -m benchmarks.suite --sizes 1 1000 --threads 1 2 --baseline benchmarks/baseline.json --update-baseline
+
+Stages, timed separately for every batch size (and every thread count for the
+model stages):
+
+    load_pickle       unpickle LightGBM.pkl and StandardScalar.pkl
+    load_artifact     map the same model from an exported artifact
+    features          raw readings DataFrame -> model matrix (the path the app uses)
+    scaler_transform  StandardScaler.transform on the log-transformed numeric block
+    concatenate       np.concatenate of the one-hot block and the scaled block
+    predict_proba     LightGBM predict_proba
+    end_to_end        features + predict_proba, as score_readings does it
+    figure            the Plotly figure the app builds for the result
+
+Every measurement records latency percentiles, throughput, peak traced
+allocations (tracemalloc) and peak process RSS above the starting point
+(memory_profiler, when installed). With ``--baseline`` the run fails when a
+tracked metric (p50 latency, peak allocations) is worse than the baseline by
+more than ``--threshold`` and by more than the absolute floors.
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from benchmarks.common import describe, synthetic_readings, time_call
+from features import (
+    build_feature_matrix, class_labels, encode_categories, label_predictions, numeric_features,
+    numeric_sources, station_options, station_wd_features, wind_options, compiled_transform
+)
+from model_registry import MODEL_PATH, SCALER_PATH, load_model_and_scaler, resident_memory_mb
+
+default_sizes = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+tracked_metrics = {'p50_ms': 'min_delta_ms', 'peak_alloc_mb': 'min_delta_mb'}
+model_stages = ('predict_proba', 'end_to_end')
+
+
+def _peak_rss_mb(func):
+    try:
+        from memory_profiler import memory_usage
+    except ImportError:
+        return None
+    before = resident_memory_mb()
+    peak = memory_usage((func, (), {}), interval=0.005, max_usage=True)
+    return max(float(np.max(peak)) - before, 0.0)
+
+
+def _peak_alloc_mb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func, n_rows, repeat, track_memory=True):
+    func()  # warm-up: first-touch page faults and lazy initialisation are not part of steady state
+    times = time_call(func, repeat)
+    result = {**describe(times), 'repeat': repeat}
+    result['rows_per_sec'] = n_rows / np.percentile(times, 50) if n_rows else None
+    if track_memory:
+        result['peak_alloc_mb'] = _peak_alloc_mb(func)
+        result['peak_rss_mb'] = _peak_rss_mb(func)
+    return result
+
+
+def repeats_for(n_rows, budget_rows=200_000, max_repeat=200):
+    return int(max(5, min(max_repeat, budget_rows // max(n_rows, 1))))
+
+
+# --- Stages ---
+def _load_pickle():
+    with open(MODEL_PATH, 'rb') as f:
+        pickle.load(f)
+    with open(SCALER_PATH, 'rb') as f:
+        pickle.load(f)
+
+
+def _result_figure(proba):
+    if len(proba) == 1:
+        prob_df = pd.DataFrame({"Pollution Level": class_labels, "Probability (%)": proba[0] * 100})
+        return px.bar(prob_df, x='Pollution Level', y='Probability (%)', color='Pollution Level')
+    counts = pd.Series(label_predictions(proba)).value_counts().reindex(class_labels, fill_value=0)
+    return px.bar(x=counts.index, y=counts.to_numpy(), labels={'x': 'Pollution Level', 'y': 'Rows'})
+
+
+def batch_stages(model, scaler, readings):
+    """Callables for each per-batch stage, bound to one batch of readings."""
+    n_num = len(numeric_features)
+    numeric = np.column_stack([
+        np.log1p(readings[column].to_numpy(dtype=np.float64)) if use_log else readings[column].to_numpy(dtype=np.float64)
+        for column, use_log in (numeric_sources[feat] for feat in numeric_features)
+    ]).reshape(len(readings), n_num)
+    categorical = np.zeros((len(readings), len(station_wd_features)))
+    rows = np.arange(len(readings))
+    station_codes = encode_categories(readings['station'], station_options)
+    wd_codes = encode_categories(readings['wd'], wind_options[1:])
+    categorical[rows[station_codes >= 0], station_codes[station_codes >= 0]] = 1
+    offset = len(station_options)
+    categorical[rows[wd_codes >= 0], offset + wd_codes[wd_codes >= 0]] = 1
+    numeric_scaled = scaler.transform(numeric)
+    X = build_feature_matrix(readings, scaler)
+    proba = model.predict_proba(X)
+
+    return {
+        'features': lambda: build_feature_matrix(readings, scaler),
+        'scaler_transform': lambda: scaler.transform(numeric),
+        'concatenate': lambda: np.concatenate([categorical, numeric_scaled], axis=1),
+        'predict_proba': lambda: model.predict_proba(X),
+        'end_to_end': lambda: model.predict_proba(build_feature_matrix(readings, scaler)),
+        'figure': lambda: _result_figure(proba),
+    }
+
+
+def environment():
+    import lightgbm
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'lightgbm': lightgbm.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def run_suite(sizes, threads, load_repeat=5, track_memory=True, log=print):
+    model, scaler = load_model_and_scaler()
+    measurements = []
+
+    def record(stage, n_rows, n_threads, result):
+        measurements.append({'stage': stage, 'rows': n_rows, 'threads': n_threads, **result})
+        rate = f"{result['rows_per_sec']:>14,.0f}" if result.get('rows_per_sec') else f"{'':>14}"
+        peak = result.get('peak_alloc_mb')
+        log(f"{stage:<17} {n_rows if n_rows is not None else '-':>9} {n_threads if n_threads else '-':>7} "
+            f"{result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['p99_ms']:>10.3f} {rate} "
+            f"{peak if peak is not None else float('nan'):>9.1f}")
+
+    log(f"{'stage':<17} {'rows':>9} {'threads':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+        f"{'rows/s':>14} {'alloc MB':>9}")
+    record('load_pickle', None, None, measure(_load_pickle, 0, load_repeat, track_memory))
+    with tempfile.TemporaryDirectory() as tmp:
+        from artifacts import export_artifact, load_artifact
+        path = os.path.join(tmp, 'model.apm')
+        export_artifact(model, scaler, path)
+        record('load_artifact', None, None,
+               measure(lambda: load_artifact(path, engine='native'), 0, load_repeat, track_memory))
+
+    compiled_transform(scaler)
+    for n_rows in sizes:
+        readings = synthetic_readings(n_rows)
+        stages = batch_stages(model, scaler, readings)
+        repeat = repeats_for(n_rows)
+        for stage, func in stages.items():
+            if stage in model_stages:
+                continue
+            record(stage, n_rows, None, measure(func, n_rows, repeat, track_memory))
+        for n_threads in threads:
+            model.set_params(n_jobs=n_threads)
+            for stage in model_stages:
+                record(stage, n_rows, n_threads, measure(stages[stage], n_rows, repeat, track_memory))
+    model.set_params(n_jobs=None)
+    return measurements
+
+
+# --- Regression checks ---
+def _key(measurement):
+    return measurement['stage'], measurement['rows'], measurement['threads']
+
+
+def compare(results, baseline, threshold, floors):
+    """Measurements that got worse than the baseline by more than ``threshold`` and the floor."""
+    previous = {_key(m): m for m in baseline['measurements']}
+    regressions = []
+    for current in results['measurements']:
+        before = previous.get(_key(current))
+        if before is None:
+            continue
+        for metric, floor in tracked_metrics.items():
+            old, new = before.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > floors[floor]:
+                regressions.append({'stage': current['stage'], 'rows': current['rows'], 'threads': current['threads'],
+                                    'metric': metric, 'baseline': old, 'current': new, 'ratio': new / old if old else None})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="Thread counts for the model stages (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--load-repeat", type=int, default=5)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak-memory measurements")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore latency changes smaller than this")
+    parser.add_argument("--min-delta-mb", type=float, default=1.0, help="Ignore memory changes smaller than this")
+    parser.add_argument("--update-baseline", action="store_true", help="Write these results to --baseline")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    threads = args.threads or sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i < cpus], cpus})
+    results = {
+        'environment': environment(),
+        'config': {'sizes': args.sizes, 'threads': threads, 'threshold': args.threshold},
+        'measurements': run_suite(args.sizes, threads, args.load_repeat, track_memory=not args.no_memory),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {len(results['measurements'])} measurements to {args.output}")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Updated baseline {args.baseline}")
+        return 0
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for field in ('cpu_count', 'python', 'lightgbm', 'numpy'):
+        if baseline.get('environment', {}).get(field) != results['environment'][field]:
+            print(f"Note: baseline was recorded with {field}={baseline['environment'].get(field)}, "
+                  f"this run has {results['environment'][field]}")
+    floors = {'min_delta_ms': args.min_delta_ms, 'min_delta_mb': args.min_delta_mb}
+    regressions = compare(results, baseline, args.threshold, floors)
+    for r in regressions:
+        # A zero baseline (e.g. no measurable allocation) has no ratio
+        ratio = f"{r['ratio']:.2f}x" if r['ratio'] is not None else "n/a"
+        print(f"REGRESSION {r['stage']} rows={r['rows']} threads={r['threads']}: {r['metric']} "
+              f"{r['baseline']:.3f} -> {r['current']:.3f} ({ratio})")
+    if regressions:
+        print(f"{len(regressions)} tracked metric(s) regressed by more than {args.threshold:.0%} "
+              f"against {args.baseline}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
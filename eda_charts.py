@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from aggregates import levels, seasons
+from features import class_labels
+
+_layout = dict(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+_level_colors = {'Low': '#1b9e77', 'Moderate': '#d95f02', 'High': '#7570b3'}
+
+
+def level_pie(agg):
+    counts = agg.level_distribution().reset_index()
+    counts.columns = ['Pollution Level', 'Count']
+    fig = px.pie(counts, names='Pollution Level', values='Count', color='Pollution Level',
+                 color_discrete_map=_level_colors, hole=0.3)
+    fig.update_traces(textinfo='percent+label')
+    return fig.update_layout(**_layout)
+
+
+def level_by_area(agg):
+    counts = agg.level_distribution(by='area_type').reset_index().melt(
+        id_vars='area_type', value_vars=levels, var_name='Pollution Level', value_name='Count')
+    fig = px.bar(counts, x='area_type', y='Count', color='Pollution Level', barmode='group',
+                 color_discrete_map=_level_colors, labels={'area_type': 'Area Type'})
+    return fig.update_layout(**_layout)
+
+
+def pm25_box_by_area(agg):
+    quantiles = agg.group_quantiles(by='area_type', pollutant='PM2.5')
+    fig = go.Figure()
+    for area, row in quantiles.iterrows():
+        fig.add_trace(go.Box(
+            name=area, q1=[row['q25']], median=[row['q50']], q3=[row['q75']],
+            lowerfence=[row['q5']], upperfence=[row['q95']],
+        ))
+    fig.update_layout(yaxis_title='PM2.5 (μg/m³), whiskers at 5th/95th percentile', showlegend=False, **_layout)
+    return fig
+
+
+def pm_means_by_area(agg):
+    means = agg.group_means(by='area_type').reset_index().melt(
+        id_vars='area_type', var_name='Pollutant', value_name='Mean (μg/m³)')
+    fig = px.bar(means, x='area_type', y='Mean (μg/m³)', color='Pollutant', barmode='group',
+                 text_auto='.1f', labels={'area_type': 'Area Type'},
+                 color_discrete_sequence=px.colors.qualitative.Dark2)
+    return fig.update_layout(**_layout)
+
+
+def seasonal_pm25_by_area(agg):
+    means = agg.seasonal_means(by='area_type', pollutant='PM2.5')
+    fig = px.bar(means, x='area_type', y='PM2.5', color='season', barmode='group',
+                 category_orders={'season': list(seasons)}, text_auto='.0f',
+                 labels={'area_type': 'Area Type', 'PM2.5': 'Mean PM2.5 (μg/m³)', 'season': 'Season'},
+                 color_discrete_sequence=px.colors.qualitative.Set2)
+    return fig.update_layout(**_layout)
+
+
+def monthly_pollutant_medians(agg, pollutant_subset=('SO2', 'NO2', 'CO', 'O3')):
+    medians = agg.monthly_quantile(0.5)[list(pollutant_subset)].reset_index().melt(
+        id_vars='month', var_name='Pollutant', value_name='Median')
+    fig = px.line(medians, x='month', y='Median', facet_col='Pollutant', facet_col_wrap=2,
+                  markers=True, color='Pollutant', color_discrete_sequence=px.colors.qualitative.Dark2)
+    fig.update_yaxes(matches=None, showticklabels=True)
+    fig.update_xaxes(dtick=1)
+    fig.update_layout(showlegend=False, height=550, **_layout)
+    return fig
+
+
+# --- What-if Sweeps ---
+def sweep_curves(label, values, proba):
+    """Class-probability curves along one swept input (``proba`` as returned by ``run_sweep``)."""
+    curves = pd.DataFrame(proba * 100, columns=class_labels).assign(**{label: values}).melt(
+        id_vars=label, var_name='Pollution Level', value_name='Probability (%)')
+    fig = px.line(curves, x=label, y='Probability (%)', color='Pollution Level',
+                  markers=len(values) <= 50, color_discrete_map=_level_colors)
+    return fig.update_layout(yaxis=dict(range=[0, 100]), hovermode='x unified', **_layout)
+
+
+def sweep_heatmap(x_label, x_values, y_label, y_values, proba, level=None):
+    """P(level) over a two-input sweep, or the predicted level when ``level`` is None."""
+    hover = f'{x_label}: %{{x}}<br>{y_label}: %{{y}}<br>'
+    if level is not None:
+        heatmap = go.Heatmap(
+            z=proba[..., class_labels.index(level)] * 100, x=x_values, y=y_values,
+            colorscale='Viridis', zmin=0, zmax=100, colorbar=dict(title=f'P({level}) %'),
+            hovertemplate=hover + f'P({level}): %{{z:.1f}}%<extra></extra>',
+        )
+    else:
+        predicted = proba.argmax(axis=-1)
+        n = len(class_labels)
+        # One flat band per class, so each cell takes its level's colour
+        colorscale = [[(i + edge) / n, _level_colors[label]] for i, label in enumerate(class_labels) for edge in (0, 1)]
+        heatmap = go.Heatmap(
+            z=predicted, x=x_values, y=y_values, colorscale=colorscale, zmin=-0.5, zmax=n - 0.5,
+            customdata=np.asarray(class_labels)[predicted],
+            colorbar=dict(title='Predicted', tickvals=list(range(n)), ticktext=class_labels),
+            hovertemplate=hover + '%{customdata}<extra></extra>',
+        )
+    fig = go.Figure(heatmap)
+    return fig.update_layout(xaxis_title=x_label, yaxis_title=y_label, **_layout)
+
+
+# --- Citywide Map ---
+def probability_map(lats, lons, grid_proba, stations, station_latlon, station_proba, level=None):
+    """Interpolated grid (as ``sweep_heatmap``) with the scored stations on top, at true east-west scale."""
+    fig = sweep_heatmap('Longitude', lons, 'Latitude', lats, grid_proba, level)
+    predicted = np.asarray(class_labels)[np.asarray(station_proba).argmax(axis=1)]
+    shown = station_proba[:, class_labels.index(level)] * 100 if level is not None else station_proba.max(axis=1) * 100
+    fig.add_trace(go.Scatter(
+        x=station_latlon[:, 1], y=station_latlon[:, 0], mode='markers+text' if len(stations) <= 30 else 'markers',
+        text=stations, textposition='top center', textfont=dict(color='white'),
+        marker=dict(size=9, color=[_level_colors[label] for label in predicted], line=dict(width=1.5, color='white')),
+        customdata=np.column_stack([predicted, shown]), showlegend=False,
+        hovertemplate='%{text}: %{customdata[0]}'
+                      + (f' · P({level}) ' if level is not None else ' · ') + '%{customdata[1]:.1f}%<extra></extra>',
+    ))
+    # A degree of longitude is cos(latitude) of a degree of latitude on the ground
+    aspect = 1 / np.cos(np.radians(np.mean(lats)))
+    return fig.update_layout(
+        xaxis=dict(range=[lons[0] - (lons[1] - lons[0]) / 2, lons[-1] + (lons[1] - lons[0]) / 2], showgrid=False),
+        yaxis=dict(scaleanchor='x', scaleratio=aspect, showgrid=False), height=650)
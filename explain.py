@@ -0,0 +1,143 @@
+"""Per-prediction feature attributions, aggregated to the features operators know.
+
+Contributions are in raw-score (log-odds) units: for every row and class the
+feature contributions plus the expected value add up to the model's raw score.
+Single readings and small batches use LightGBM's exact TreeSHAP output
+(``pred_contrib``). TreeSHAP costs roughly 75x a prediction, so larger batches
+use path-based attributions from the native tree engine, which keep the same
+additivity at a few times the cost of prediction.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from features import class_labels, final_feature_names, numeric_features, station_features, wind_features
+
+# Parent feature of every model column: one-hot station/wind columns fold into one each
+feature_groups = ['station', 'wd'] + numeric_features
+_parent = (['station'] * len(station_features) + ['wd'] * len(wind_features) + numeric_features)
+
+# (n_features + 1) x (n_groups + 1) summing matrix; the last row/column carries the expected value
+_group_matrix = np.zeros((len(final_feature_names) + 1, len(feature_groups) + 1))
+_group_matrix[np.arange(len(final_feature_names)), [feature_groups.index(p) for p in _parent]] = 1.0
+_group_matrix[-1, -1] = 1.0
+
+EXACT, APPROXIMATE = 'exact', 'approximate'
+
+
+def aggregate_contributions(contrib, num_class=len(class_labels)):
+    """``pred_contrib`` output (n, num_class * (n_features + 1)) -> (n, num_class, n_groups + 1)."""
+    contrib = np.asarray(contrib).reshape(len(contrib), num_class, -1)
+    return contrib @ _group_matrix
+
+
+class Explainer:
+    """Cached, grouped feature attributions for a fitted LightGBM model.
+
+    Results are kept in an LRU keyed on a hash of the input matrix and the
+    method, bounded by ``max_bytes``, so re-rendering a page or re-explaining
+    the same uploaded file does not recompute anything.
+    """
+
+    def __init__(self, model, exact_max_rows=2_000, max_bytes=256 * 2**20):
+        self.model = model
+        self._engine = None
+        if hasattr(model, 'predict_contrib'):
+            # Already a native tree engine (e.g. a reduced variant): no TreeSHAP, every batch is approximate
+            self.booster, self._engine = None, model
+        else:
+            self.booster = getattr(model, 'booster_', model)
+            if not hasattr(self.booster, 'dump_model'):
+                raise TypeError("Explanations need a LightGBM model, booster or TreeEnsemble")
+        self.exact_max_rows = exact_max_rows
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from tree_engine import TreeEnsemble
+            self._engine = TreeEnsemble.from_booster(self.booster)
+        return self._engine
+
+    def method_for(self, n_rows):
+        return EXACT if self.booster is not None and n_rows <= self.exact_max_rows else APPROXIMATE
+
+    @staticmethod
+    def _key(X, method):
+        digest = hashlib.blake2b(np.ascontiguousarray(X).view(np.uint8), digest_size=16)
+        digest.update(repr((X.shape, X.dtype.str, method)).encode())
+        return digest.digest()
+
+    def _compute(self, X, method):
+        if method == EXACT and self.booster is None:
+            raise ValueError("Exact explanations need the LightGBM booster")
+        if method == EXACT:
+            contrib = self.booster.predict(X, pred_contrib=True)
+        elif method == APPROXIMATE:
+            contrib = self.engine.predict_contrib(X)
+        else:
+            raise ValueError(f"Unknown explanation method: '{method}'")
+        return aggregate_contributions(contrib)
+
+    def contributions(self, X, method=None):
+        """Grouped contributions, shape (n_rows, n_classes, len(feature_groups) + 1).
+
+        ``method`` is 'exact', 'approximate' or None to choose by batch size.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        method = method or self.method_for(len(X))
+        key = self._key(X, method)
+        with self._lock:
+            values = self._entries.get(key)
+            if values is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return values
+            self.misses += 1
+
+        values = self._compute(X, method)
+        values.flags.writeable = False
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = values
+                self._bytes += values.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped.nbytes
+        return values
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+# --- Presentation ---
+def explanation_frame(values, class_index):
+    """Contributions of one row toward one class, largest effect first."""
+    frame = pd.DataFrame({
+        'Feature': feature_groups,
+        'Contribution': values[class_index, :-1],
+    })
+    return frame.reindex(frame['Contribution'].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+def predicted_class_contributions(values, predicted):
+    """(n_rows, n_groups) contributions of each row toward its own predicted class."""
+    return values[np.arange(len(values)), np.asarray(predicted), :-1]
+
+
+def top_drivers(values, predicted, k=3):
+    """Names of the ``k`` features that pushed each row hardest toward its predicted class."""
+    toward = predicted_class_contributions(values, predicted)
+    order = np.argsort(-toward, axis=1)[:, :k]
+    names = np.asarray(feature_groups)[order]
+    return [", ".join(row) for row in names]
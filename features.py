@@ -0,0 +1,309 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# --- Feature Names ---
+station_options = ["Changping", "Dingling", "Dongsi", "Guanyuan"]
+wind_options = ['N', 'E', 'ENE', 'ESE', 'NE', 'NNE', 'NNW', 'NW', 'S', 'SE', 'SSE', 'SSW', 'SW', 'W', 'WNW', 'WSW']  # 'N' is UI-only
+
+station_features = [f'station_{s}' for s in station_options]
+wind_features = [f'wd_{w}' for w in wind_options if w != 'N']  # Exclude 'N' from encoding
+station_wd_features = station_features + wind_features
+
+numeric_features = [
+    'month', 'is_night', 'Rain_Flag', 'CO_NO2_ratio',
+    'PM10_log', 'CO_log', 'O3_log', 'SO2_log', 'NO2_log',
+    'PRES_log', 'temp_dewp_diff_log', 'inverse_wind_log'
+]
+
+# Hardcoded area type mapping (not used in model)
+station_to_area_type = {
+    'Changping': 'Suburban',
+    'Dingling': 'Industrial',  # Example default for testing
+    'Dongsi': 'Urban',
+    'Guanyuan': 'Rural'  # Assign as needed
+}
+
+final_feature_names = station_wd_features + numeric_features
+
+class_map = {0: "High", 1: "Low", 2: "Moderate"}
+class_labels = [class_map[i] for i in sorted(class_map)]
+
+# --- Raw Readings ---
+# Source column for each numeric feature, and whether it is log1p-transformed.
+numeric_sources = {
+    'month': ('month', False),
+    'is_night': ('is_night', False),
+    'Rain_Flag': ('Rain_Flag', False),
+    'CO_NO2_ratio': ('CO_NO2_ratio', False),
+    'PM10_log': ('PM10', True),
+    'CO_log': ('CO', True),
+    'O3_log': ('O3', True),
+    'SO2_log': ('SO2', True),
+    'NO2_log': ('NO2', True),
+    'PRES_log': ('PRES', True),
+    'temp_dewp_diff_log': ('temp_dewp_diff', True),
+    'inverse_wind_log': ('inverse_wind', True),
+}
+
+raw_numeric_columns = [numeric_sources[feat][0] for feat in numeric_features]
+raw_columns = raw_numeric_columns + ['station', 'wd']
+
+
+def check_raw_columns(readings):
+    missing = [col for col in raw_columns if col not in readings.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+
+def reading_errors(readings, required=raw_columns, check_categories=False):
+    """Per-row ``(field, message)`` of the first problem found, or None for a row that can be scored.
+
+    Flags missing columns, missing or non-numeric raw values and, with
+    ``check_categories``, stations and wind directions the model does not know.
+    """
+    errors = [None] * len(readings)
+    for column in required:
+        if column not in readings.columns:
+            return [(column, f"Missing required columns: {column}")] * len(readings)
+        values = readings[column]
+        message = f"Missing value for '{column}'"
+        if column in raw_numeric_columns:
+            values = pd.to_numeric(values, errors='coerce')
+            message = f"Missing or non-numeric value for '{column}'"
+        elif column == 'time':
+            values = pd.to_datetime(values, errors='coerce')
+            message = "Missing or unparseable value for 'time'"
+        for i in np.flatnonzero(values.isna().to_numpy()):
+            errors[i] = errors[i] or (column, message)
+    if check_categories:
+        for column, options in (('station', station_options), ('wd', wind_options)):
+            values = readings[column]
+            unknown = values.notna().to_numpy() & (encode_categories(values, options) < 0)
+            for i in np.flatnonzero(unknown):
+                errors[i] = errors[i] or (column, f"Unknown {column} '{values.iloc[i]}'; expected one of {', '.join(options)}")
+    return errors
+
+
+class InvalidReadings(ValueError):
+    """Readings that cannot be scored, as (row index, (field, message)) pairs."""
+
+    def __init__(self, problems):
+        super().__init__(f"{len(problems)} invalid readings")
+        self.problems = problems
+
+    def body(self, single=False):
+        """JSON error body: the one reading's field and message, or every problem of a batch by index."""
+        if single:
+            (_, (field, message)), = self.problems
+            return {"error": message, "field": field}
+        return {"error": str(self), "errors": [{"index": i, "field": field, "error": message}
+                                               for i, (field, message) in self.problems]}
+
+
+def require_valid(readings):
+    """Raise ``InvalidReadings`` unless every row can be scored by the model (``reading_errors``)."""
+    # Unknown stations/wind directions and missing values would otherwise score as all-zero one-hots or NaN
+    problems = [(i, error) for i, error in enumerate(reading_errors(readings, check_categories=True)) if error]
+    if problems:
+        raise InvalidReadings(problems)
+
+
+def encode_categories(values, options):
+    """Map category labels to their index in ``options`` (-1 when unknown)."""
+    return pd.Index(options).get_indexer(pd.Index(values).astype(str))
+
+
+def _column_runs(mask):
+    """Contiguous runs of True in ``mask`` as slices, so they can be updated in place."""
+    runs, start = [], None
+    for i, flag in enumerate(list(mask) + [False]):
+        if flag and start is None:
+            start = i
+        elif not flag and start is not None:
+            runs.append(slice(start, i))
+            start = None
+    return runs
+
+
+class FeatureTransform:
+    """Raw readings -> model input, compiled once from the fitted scaler.
+
+    The one-hot block, log1p columns and standard scaling are written straight
+    into a single output buffer in ``final_feature_names`` order. Passing the
+    same ``out`` buffer on every call avoids any per-call allocation.
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.n_cat = len(station_wd_features)
+        self.n_features = len(final_feature_names)
+        self.wd_offset = len(station_features)
+        self.log_runs = [
+            slice(self.n_cat + run.start, self.n_cat + run.stop)
+            for run in _column_runs([numeric_sources[feat][1] for feat in numeric_features])
+        ]
+        self._cast = {}
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        n_num = len(numeric_features)
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) else np.zeros(n_num)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) else np.ones(n_num)
+        return cls(mean, scale)
+
+    def _params(self, dtype):
+        if dtype not in self._cast:
+            self._cast[dtype] = (self.mean.astype(dtype), self.scale.astype(dtype))
+        return self._cast[dtype]
+
+    def allocate(self, n_rows, dtype=np.float64):
+        return np.empty((n_rows, self.n_features), dtype=dtype)
+
+    def transform(self, raw_numeric, station_codes, wd_codes, out=None, dtype=np.float64):
+        """Fill ``out`` from a raw numeric matrix (``raw_numeric_columns`` order) and category codes.
+
+        ``station_codes`` index ``station_options`` and ``wd_codes`` index
+        ``wind_options[1:]``; -1 leaves the one-hot block empty.
+        """
+        raw_numeric = np.asarray(raw_numeric)
+        n_rows = raw_numeric.shape[0]
+        if out is None:
+            out = self.allocate(n_rows, dtype)
+        elif out.shape != (n_rows, self.n_features):
+            raise ValueError(f"Output buffer has shape {out.shape}, expected {(n_rows, self.n_features)}")
+        mean, scale = self._params(out.dtype)
+
+        out[:, :self.n_cat] = 0
+        rows = np.arange(n_rows)
+        station_codes = np.asarray(station_codes)
+        wd_codes = np.asarray(wd_codes)
+        known = station_codes >= 0
+        out[rows[known], station_codes[known]] = 1
+        known = wd_codes >= 0
+        out[rows[known], self.wd_offset + wd_codes[known]] = 1
+
+        numeric = out[:, self.n_cat:]
+        numeric[...] = raw_numeric
+        for run in self.log_runs:
+            np.log1p(out[:, run], out=out[:, run])
+        numeric -= mean
+        numeric /= scale
+        return out
+
+    def transform_frame(self, readings, out=None, dtype=np.float64):
+        check_raw_columns(readings)
+        return self.transform(
+            readings[raw_numeric_columns].to_numpy(dtype=np.float64),
+            encode_categories(readings['station'], station_options),
+            # 'N' has no column of its own, so it encodes to all zeros like an unknown direction
+            encode_categories(readings['wd'], wind_options[1:]),
+            out=out, dtype=dtype,
+        )
+
+
+@lru_cache(maxsize=8)
+def compiled_transform(scaler):
+    """The ``FeatureTransform`` for a fitted scaler, built once per scaler object."""
+    return FeatureTransform.from_scaler(scaler)
+
+
+def build_feature_matrix(readings, scaler, out=None, dtype=np.float64):
+    """Build the model input matrix for a DataFrame of raw readings.
+
+    One-hot encoding, log1p and scaling run column-wise over the whole frame,
+    so the result is identical to the single-row path for every row.
+    """
+    return compiled_transform(scaler).transform_frame(readings, out=out, dtype=dtype)
+
+
+def build_feature_row(reading, scaler, out=None):
+    """Model input (1 x n_features) for one reading given as a mapping of raw values."""
+    raw_numeric = np.array([[reading[col] for col in raw_numeric_columns]], dtype=np.float64)
+    station_code = station_options.index(reading['station']) if reading['station'] in station_options else -1
+    wd = reading['wd']
+    wd_code = wind_options.index(wd) - 1 if wd in wind_options and wd != 'N' else -1
+    return compiled_transform(scaler).transform(raw_numeric, [station_code], [wd_code], out=out)
+
+
+def predict_in_chunks(model, X, chunk_size=50_000):
+    """Run ``predict_proba`` once per chunk of rows and stack the results."""
+    n_rows = X.shape[0]
+    proba = np.empty((n_rows, len(class_labels)))
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        proba[start:stop] = model.predict_proba(X[start:stop])
+    return proba
+
+
+def label_predictions(proba):
+    return np.asarray(class_labels)[np.argmax(proba, axis=1)]
+
+
+def format_predictions(proba):
+    """JSON-ready ``{"level", "probabilities"}`` dicts, one per row of ``proba``."""
+    labels = label_predictions(proba)
+    return [
+        {
+            "level": str(label),
+            "probabilities": {name: float(p) for name, p in zip(class_labels, row)}
+        }
+        for label, row in zip(labels, proba)
+    ]
+
+
+def score_readings(readings, model, scaler, chunk_size=50_000, X=None):
+    """Score a DataFrame of raw readings and return it with prediction columns appended.
+
+    Pass ``X`` when the feature matrix was already built (e.g. for validation).
+    """
+    if X is None:
+        X = build_feature_matrix(readings, scaler)
+    proba = predict_in_chunks(model, X, chunk_size=chunk_size)
+
+    results = readings.reset_index(drop=True).copy()
+    results['Predicted Level'] = label_predictions(proba)
+    for i, label in enumerate(class_labels):
+        results[f'P({label})'] = proba[:, i]
+    return results
+
+
+def read_readings(uploaded_file, file_name=None):
+    """Load raw readings from a CSV or Parquet file (path or file-like object)."""
+    name = (file_name or getattr(uploaded_file, 'name', None) or str(uploaded_file)).lower()
+    if name.endswith('.parquet') or name.endswith('.pq'):
+        return pd.read_parquet(uploaded_file)
+    return pd.read_csv(uploaded_file)
+
+
+# --- PRSA Source Data ---
+# Hourly station files of the Beijing Multi-Site Air-Quality dataset (PRSA_Data_<station>_20130301-20170228.csv)
+prsa_columns = [
+    'year', 'month', 'day', 'hour', 'PM2.5', 'PM10', 'SO2', 'NO2', 'CO', 'O3',
+    'TEMP', 'PRES', 'DEWP', 'RAIN', 'wd', 'WSPM', 'station'
+]
+night_hours = (20, 5)  # 20:00-04:59: 9 of 24 hours (0.375), close to the training share of is_night (0.372)
+min_wind_speed = 0.1  # m/s, the anemometer's resolution; calm hours would otherwise divide by zero
+
+
+def prsa_to_readings(frame):
+    """Raw model inputs from PRSA rows, with the reading time and PM2.5 kept alongside."""
+    missing = [col for col in prsa_columns if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing PRSA columns: {', '.join(missing)}")
+    hour = frame['hour'].to_numpy()
+    return pd.DataFrame({
+        'time': pd.to_datetime(frame[['year', 'month', 'day', 'hour']]),
+        'station': frame['station'].astype(str).to_numpy(),
+        'PM2.5': frame['PM2.5'].to_numpy(dtype=np.float64),
+        **{col: frame[col].to_numpy(dtype=np.float64) for col in ('PM10', 'SO2', 'NO2', 'CO', 'O3', 'PRES')},
+        'temp_dewp_diff': (frame['TEMP'] - frame['DEWP']).to_numpy(dtype=np.float64),
+        'inverse_wind': 1.0 / np.maximum(frame['WSPM'].to_numpy(dtype=np.float64), min_wind_speed),
+        'CO_NO2_ratio': (frame['CO'] / frame['NO2']).to_numpy(dtype=np.float64),
+        'month': frame['month'].to_numpy(dtype=np.int64),
+        'is_night': ((hour >= night_hours[0]) | (hour < night_hours[1])).astype(np.int64),
+        'Rain_Flag': (frame['RAIN'].to_numpy(dtype=np.float64) > 0).astype(np.int64),
+        'wd': frame['wd'].to_numpy(dtype=object),
+    })
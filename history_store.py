@@ -0,0 +1,326 @@
+"""Partitioned columnar store of historical readings and cached predictions, for backtesting.
+
+    python history_store.py ingest PRSA_Data_*_20130301-20170228.csv --store history
+    python history_store.py score --store history
+    python history_store.py query --store history --stations Dongsi --start 2016-01 --end 2016-02 --night
+    python history_store.py backtest --store history --start 2016-01-01 --end 2017-01-01
+
+Layout::
+
+    <store>/index.json
+    <store>/readings/<station>/<YYYY-MM>.parquet
+    <store>/predictions/<model key>/<station>/<YYYY-MM>.npy
+
+Each station and calendar month is one Parquet file holding the reading
+time, PM2.5, the raw model inputs and the derived ``*_log`` features, sorted
+by time. The index records every partition's row count and time span, so a
+query opens only the partitions of the requested stations that overlap its
+time range, reads only the columns it needs and filters the rows (hours of
+day, night/day) with one vectorized mask.
+
+Predictions are cached per model, keyed by a fingerprint of the model and
+scaler files (or of the artifact, which holds both), as (rows, 3) probability
+arrays aligned with the partition's rows and memory-mapped on read.
+Re-ingesting a partition drops its cached predictions.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregates import levels, pm25_level_bounds
+from features import build_feature_matrix, class_labels, numeric_sources, predict_in_chunks, prsa_to_readings, raw_columns
+
+derived_columns = [feature for feature, (_, log) in numeric_sources.items() if log]
+stored_columns = ['time', 'PM2.5'] + raw_columns + derived_columns
+index_name = "index.json"
+
+# Position of each model class in ``levels`` (Low, Moderate, High)
+_class_to_level = np.array([levels.index(label) for label in class_labels])
+
+
+def add_derived(readings):
+    """Add the log1p features the model's scaler sees (``PM10_log``, ...) as plain columns."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for feature in derived_columns:
+            readings[feature] = np.log1p(readings[numeric_sources[feature][0]].to_numpy(dtype=np.float64))
+    return readings
+
+
+def level_codes(pm25):
+    """Index into ``levels`` of each PM2.5 reading's level (-1 when PM2.5 is missing)."""
+    values = np.asarray(pm25, dtype=np.float64)
+    codes = np.searchsorted(pm25_level_bounds, values, side='left')
+    codes[np.isnan(values)] = -1
+    return codes
+
+
+def model_fingerprint(*paths):
+    """Short content hash of the files a model scores with (model and scaler, or an artifact); names its
+    prediction cache."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class HistoryStore:
+    """Readings partitioned by station and month, with a time/station index."""
+
+    def __init__(self, root):
+        self.root = root
+        self.partitions = {}
+        path = os.path.join(root, index_name)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.partitions = json.load(f)["partitions"]
+
+    # --- Index ---
+    def index(self):
+        """One row per partition: station, month, rows and the first/last reading time."""
+        frame = pd.DataFrame(list(self.partitions.values()), columns=["station", "month", "rows", "start", "end"])
+        frame["start"] = pd.to_datetime(frame["start"])
+        frame["end"] = pd.to_datetime(frame["end"])
+        return frame.sort_values(["station", "month"], ignore_index=True)
+
+    @property
+    def rows(self):
+        return sum(entry["rows"] for entry in self.partitions.values())
+
+    def select(self, stations=None, start=None, end=None):
+        """Partitions of ``stations`` holding readings with ``start <= time < end``."""
+        stations = None if stations is None else set([stations] if isinstance(stations, str) else stations)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        return [
+            entry for _, entry in sorted(self.partitions.items())
+            if (stations is None or entry["station"] in stations)
+            and (start is None or pd.Timestamp(entry["end"]) >= start)
+            and (end is None or pd.Timestamp(entry["start"]) < end)
+        ]
+
+    def _save_index(self):
+        path = os.path.join(self.root, index_name)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"partitions": self.partitions}, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def _readings_path(self, entry):
+        return os.path.join(self.root, "readings", entry["station"], f"{entry['month']}.parquet")
+
+    def _predictions_path(self, entry, model_key):
+        return os.path.join(self.root, "predictions", model_key, entry["station"], f"{entry['month']}.npy")
+
+    # --- Writing ---
+    def ingest(self, frame):
+        """Add PRSA rows (or readings with a ``time`` column); returns the number of partitions written.
+
+        Rows already stored for the same station and time are replaced.
+        """
+        readings = prsa_to_readings(frame) if 'hour' in frame.columns else frame
+        missing = [col for col in ['time', 'PM2.5'] + raw_columns if col not in readings.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+        readings = add_derived(readings[['time', 'PM2.5'] + raw_columns].copy())
+        readings['time'] = pd.to_datetime(readings['time'])
+        readings['station'] = readings['station'].astype(str)
+        month = readings['time'].dt.year * 100 + readings['time'].dt.month
+
+        os.makedirs(self.root, exist_ok=True)
+        written = 0
+        for (station, year_month), part in readings.groupby(['station', month], sort=False):
+            key_month = f"{year_month // 100:04d}-{year_month % 100:02d}"
+            entry = {"station": station, "month": key_month}
+            path = self._readings_path(entry)
+            if f"{station}/{key_month}" in self.partitions:
+                part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+                part = part.drop_duplicates('time', keep='last')
+            part = part.sort_values('time', ignore_index=True)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            part.to_parquet(path, index=False)
+            for cached in glob.glob(self._predictions_path(entry, "*")):
+                os.remove(cached)
+            entry.update(rows=len(part), start=part['time'].iloc[0].isoformat(), end=part['time'].iloc[-1].isoformat())
+            self.partitions[f"{station}/{key_month}"] = entry
+            written += 1
+        self._save_index()
+        return written
+
+    def score(self, model, scaler, model_key, stations=None, start=None, end=None, chunk_size=50_000):
+        """Cache ``model``'s probabilities for selected partitions that lack them; returns the rows scored.
+
+        All pending partitions are scored together, so the model sees large batches
+        however small each month is.
+        """
+        pending = self.unscored(model_key, stations, start, end)
+        if not pending:
+            return 0
+        tables = [pq.read_table(self._readings_path(entry), columns=raw_columns) for entry in pending]
+        readings = pa.concat_tables(tables).to_pandas()
+        proba = predict_in_chunks(model, build_feature_matrix(readings, scaler), chunk_size=chunk_size)
+        offsets = np.cumsum([0] + [table.num_rows for table in tables])
+        for entry, first, last in zip(pending, offsets[:-1], offsets[1:]):
+            path = self._predictions_path(entry, model_key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, proba[first:last])
+        return len(readings)
+
+    def unscored(self, model_key, stations=None, start=None, end=None):
+        """Selected partitions without cached predictions from ``model_key``."""
+        return [entry for entry in self.select(stations, start, end)
+                if not os.path.exists(self._predictions_path(entry, model_key))]
+
+    def drop_predictions(self, model_key):
+        shutil.rmtree(os.path.join(self.root, "predictions", model_key), ignore_errors=True)
+
+    # --- Reading ---
+    def query(self, stations=None, start=None, end=None, hours=None, night=None, columns=None, model_key=None):
+        """Readings of ``stations`` with ``start <= time < end``, opening only the overlapping partitions.
+
+        ``hours`` keeps those hours of day and ``night`` keeps night (True) or
+        day (False) readings. ``columns`` limits what is read (time and station
+        are always included); ``model_key`` adds that model's cached
+        ``P(<level>)`` columns and ``Predicted Level``.
+        """
+        selected = self.select(stations, start, end)
+        columns = list(dict.fromkeys(['time', 'station'] + list(stored_columns if columns is None else columns)))
+        read = columns + (['is_night'] if night is not None and 'is_night' not in columns else [])
+        if model_key is not None:
+            columns += [f'P({label})' for label in class_labels] + ['Predicted Level']
+        if not selected:
+            return pd.DataFrame({col: pd.Series(dtype=object) for col in columns})
+
+        tables, probas = [], []
+        for entry in selected:
+            tables.append(pq.read_table(self._readings_path(entry), columns=read))
+            if model_key is not None:
+                path = self._predictions_path(entry, model_key)
+                if not os.path.exists(path):
+                    raise ValueError(f"{entry['station']} {entry['month']} has no predictions from model "
+                                     f"{model_key}; score the store first")
+                probas.append(np.load(path, mmap_mode="r"))
+        # One conversion for all partitions: per-file DataFrames cost more than reading the files
+        frame = pa.concat_tables(tables).to_pandas()
+
+        when = frame['time']
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None:
+            mask &= (when >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (when < pd.Timestamp(end)).to_numpy()
+        if hours is not None:
+            mask &= np.isin(when.dt.hour.to_numpy(), list(hours))
+        if night is not None:
+            mask &= frame['is_night'].to_numpy() == int(night)
+
+        frame = frame[mask].reset_index(drop=True)
+        if model_key is not None:
+            proba = np.concatenate(probas)[mask]
+            for i, label in enumerate(class_labels):
+                frame[f'P({label})'] = proba[:, i]
+            frame['Predicted Level'] = pd.Categorical.from_codes(proba.argmax(axis=1), class_labels)
+        return frame[columns]
+
+    def backtest(self, model_key, **filters):
+        """(confusion matrix, per-reading outcomes) of cached predictions against the PM2.5 level.
+
+        The confusion matrix counts actual (rows) x predicted (columns) levels;
+        readings without PM2.5 are left out. ``filters`` are those of ``query``.
+        """
+        frame = self.query(columns=['PM2.5'], model_key=model_key, **filters)
+        actual = level_codes(frame['PM2.5'])
+        predicted = _class_to_level[frame['Predicted Level'].cat.codes.to_numpy()] if len(frame) else actual
+        known = actual >= 0
+        counts = np.bincount(actual[known] * len(levels) + predicted[known], minlength=len(levels) ** 2)
+        confusion = pd.DataFrame(counts.reshape(len(levels), len(levels)),
+                                 index=pd.Index(levels, name='Actual'), columns=pd.Index(levels, name='Predicted'))
+        outcomes = pd.DataFrame({
+            'time': frame['time'][known].to_numpy(),
+            'station': frame['station'][known].to_numpy(),
+            'Actual Level': pd.Categorical.from_codes(actual[known], levels),
+            'Predicted Level': pd.Categorical.from_codes(predicted[known], levels),
+            'Correct': actual[known] == predicted[known],
+        })
+        return confusion, outcomes
+
+
+def accuracy(confusion):
+    total = confusion.to_numpy().sum()
+    return float(np.trace(confusion.to_numpy()) / total) if total else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and query the historical readings store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Add PRSA station CSVs (or readings files with a 'time' column)")
+    ingest.add_argument("files", nargs="+")
+    score = sub.add_parser("score", help="Cache the model's predictions for every unscored partition")
+    query = sub.add_parser("query", help="Print the readings matching a time/station range")
+    query.add_argument("--columns", nargs="+", default=None)
+    backtest = sub.add_parser("backtest", help="Confusion matrix of cached predictions against PM2.5 levels")
+    for command in (query, backtest):
+        command.add_argument("--stations", nargs="+", default=None)
+        command.add_argument("--start", default=None)
+        command.add_argument("--end", default=None)
+        command.add_argument("--hours", type=int, nargs="+", default=None)
+        command.add_argument("--night", dest="night", action="store_const", const=True, default=None)
+        command.add_argument("--day", dest="night", action="store_const", const=False)
+    for command in (score, backtest):
+        command.add_argument("--model", default="LightGBM.pkl")
+        command.add_argument("--scaler", default="StandardScalar.pkl")
+        command.add_argument("--artifact", default=None, help="Score with a model artifact instead of the pickles")
+    for command in (ingest, score, query, backtest):
+        command.add_argument("--store", default="history")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.store)
+    start = time.perf_counter()
+    if args.command == "ingest":
+        from features import read_readings
+        for path in args.files:
+            frame = read_readings(path)
+            print(f"{path}: {len(frame):,} rows into {store.ingest(frame)} partitions")
+        print(f"{args.store}: {store.rows:,} rows in {len(store.partitions)} partitions")
+        return
+
+    filters = {}
+    if args.command in ("query", "backtest"):
+        filters = dict(stations=args.stations, start=args.start, end=args.end, hours=args.hours, night=args.night)
+    if args.command == "query":
+        frame = store.query(columns=args.columns, **filters)
+        print(frame)
+        print(f"{len(frame):,} rows from {len(store.select(args.stations, args.start, args.end))} partitions "
+              f"in {time.perf_counter() - start:.3f}s")
+        return
+
+    # Backtests score only the partitions they read; the model loads only if some are unscored
+    model_key = model_fingerprint(args.artifact) if args.artifact else model_fingerprint(args.model, args.scaler)
+    selection = {key: filters[key] for key in ("stations", "start", "end") if key in filters}
+    if store.unscored(model_key, **selection):
+        if args.artifact:
+            from artifacts import load_artifact
+            model, scaler = load_artifact(args.artifact)
+        else:
+            from model_registry import load_model_and_scaler
+            model, scaler = load_model_and_scaler(args.model, args.scaler)
+        scored = store.score(model, scaler, model_key, **selection)
+        print(f"Scored {scored:,} rows with model {model_key} in {time.perf_counter() - start:.2f}s")
+    if args.command == "backtest":
+        confusion, outcomes = store.backtest(model_key, **filters)
+        print(confusion)
+        print(f"accuracy {accuracy(confusion):.2%} over {len(outcomes):,} readings "
+              f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import time
+
+import pandas as pd
+from flask import Flask, Response, g, jsonify, request
+
+import metrics
+from features import (
+    InvalidReadings, build_feature_matrix, class_labels, format_predictions, predict_in_chunks, require_valid
+)
+from model_registry import ModelRegistry, ModelSet
+from batcher import MicroBatcher
+from prediction_cache import PredictionCache
+from shadow_scoring import ShadowScorer, register_metrics
+from validation import ValidationStage, load_reference
+
+
+def create_app(registry, chunk_size=50_000, cache_size=0, cache_ttl=None, batch_wait_ms=0, max_batch_size=64,
+               model_set=None, reference_path=None, drift_window=5_000):
+    """Build the Flask app around a model registry, loading it if it is not warm yet.
+
+    With ``cache_size`` > 0, predictions go through a shared ``PredictionCache``.
+    With ``batch_wait_ms`` > 0, concurrent requests are coalesced by a ``MicroBatcher``.
+    With a ``model_set`` (whose primary is ``registry``), requests go through a
+    ``ShadowScorer``: candidates get their traffic share and score the rest in shadow.
+    Every batch is range-checked and added to the drift window (``reference_path``
+    or the artifact's reference, else the scaler's); flagged readings get
+    ``warnings`` in their prediction.
+    Request counts, latencies, predictions per level, flagged inputs and drift are served on ``/metrics``.
+    """
+    app = Flask(__name__)
+    model, scaler = registry.get()
+    shadow = ShadowScorer.from_model_set(model_set) if model_set is not None else None
+    served = shadow if shadow is not None else model
+    batcher = MicroBatcher(served, max_batch_size, batch_wait_ms / 1e3) if batch_wait_ms > 0 else None
+    scorer = batcher if batcher is not None else served
+    cache = PredictionCache(scorer, max_entries=cache_size, ttl_seconds=cache_ttl) if cache_size else None
+    predictor = cache if cache is not None else scorer
+    validation = ValidationStage(scaler, load_reference(scaler, reference_path, registry.artifact_path),
+                                 window_rows=drift_window, metrics_registry=metrics.registry, source="api")
+
+    requests_total = metrics.registry.counter(
+        "air_pollution_http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "status"])
+    request_seconds = metrics.registry.histogram(
+        "air_pollution_http_request_seconds", "HTTP request latency", ["endpoint"])
+    predictions_total = metrics.registry.counter(
+        "air_pollution_predictions_total", "Predictions served", ["source", "level"])
+    if cache is not None:
+        metrics.registry.counter(
+            "air_pollution_cache_lookups_total", "Cache lookups by result", ["cache", "result"]
+        ).set_function(lambda: {("prediction", "hit"): cache.hits, ("prediction", "miss"): cache.misses})
+    if shadow is not None:
+        register_metrics(metrics.registry, lambda: shadow)
+
+    def score(records):
+        readings = pd.DataFrame.from_records(records)
+        require_valid(readings)
+        X = build_feature_matrix(readings, scaler)
+        flagged = validation.check(readings, X).flagged_messages()
+        predictions = format_predictions(predict_in_chunks(predictor, X, chunk_size=chunk_size))
+        for i, messages in flagged.items():
+            predictions[i]["warnings"] = messages
+        for level, count in pd.Series([p["level"] for p in predictions]).value_counts().items():
+            predictions_total.inc(count, source="api", level=level)
+        return predictions
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if endpoint != "/metrics":
+            request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+            requests_total.inc(endpoint=endpoint, status=response.status_code)
+        return response
+
+    @app.errorhandler(ValueError)
+    def bad_request(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.errorhandler(InvalidReadings)
+    def invalid_readings(e):
+        single = request.url_rule is not None and request.url_rule.rule == "/predict"
+        return jsonify(e.body(single)), 400
+
+    @app.get("/health")
+    def health():
+        body = {"status": "ok", "classes": class_labels, "model": registry.stats(), "validation": validation.stats()}
+        if cache is not None:
+            body["cache"] = cache.stats()
+        if batcher is not None:
+            body["batcher"] = batcher.stats()
+        if shadow is not None:
+            body["models"] = shadow.stats()
+        return jsonify(body)
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+    @app.post("/predict")
+    def predict():
+        reading = request.get_json(force=True, silent=True)
+        if not isinstance(reading, dict):
+            raise ValueError("Expected a JSON object with one reading")
+        return jsonify(score([reading])[0])
+
+    @app.post("/predict/batch")
+    def predict_batch():
+        body = request.get_json(force=True, silent=True)
+        readings = body.get("readings") if isinstance(body, dict) else body
+        if not isinstance(readings, list) or not all(isinstance(r, dict) for r in readings):
+            raise ValueError("Expected a JSON list of readings or an object with a 'readings' list")
+        if not readings:
+            return jsonify({"predictions": []})
+        return jsonify({"predictions": score(readings)})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON inference server for the air pollution classifier.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="LightGBM.pkl")
+    parser.add_argument("--scaler", default="StandardScalar.pkl")
+    parser.add_argument("--artifact", default=None,
+                        help="Memory-mapped model artifact (python artifacts.py export) used instead of the pickles")
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm",
+                        help="'native' serves predictions from the NumPy tree evaluator")
+    parser.add_argument("--cache-size", type=int, default=0, help="Entries in the prediction cache (0 disables it)")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="Seconds before a cached prediction expires")
+    parser.add_argument("--batch-wait-ms", type=float, default=0.0,
+                        help="Coalesce concurrent requests arriving within this window (0 disables)")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--models", default=None,
+                        help="Model set JSON of candidates to A/B test or score in shadow (see model_registry.ModelSet)")
+    parser.add_argument("--reference", default=None,
+                        help="Drift reference .npz (validation.py build-reference); default: the artifact's or the scaler's")
+    parser.add_argument("--drift-window", type=int, default=5_000, help="Rows per drift window")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model, args.scaler, engine=args.engine, artifact_path=args.artifact)
+    registry.warm()
+    model_set = ModelSet.from_config(args.models, registry) if args.models else None
+    app = create_app(registry, cache_size=args.cache_size, cache_ttl=args.cache_ttl,
+                     batch_wait_ms=args.batch_wait_ms, max_batch_size=args.max_batch_size, model_set=model_set,
+                     reference_path=args.reference, drift_window=args.drift_window)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
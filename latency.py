@@ -0,0 +1,53 @@
+"""Approximate latency percentiles in constant memory.
+
+``LatencyHistogram`` counts samples in fixed log-spaced buckets, so adding a
+sample is O(1) and percentiles are read from a cumulative sum over ~160
+buckets. It has no dependency beyond NumPy and is shared by the stream scorer,
+the micro-batcher and the shadow scorer.
+"""
+import math
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Fixed log-spaced histogram (1 µs .. ~100 s) giving approximate percentiles in O(1) memory."""
+
+    def __init__(self, buckets_per_decade=20, min_seconds=1e-6, decades=8):
+        self.buckets_per_decade = buckets_per_decade
+        self.min_seconds = min_seconds
+        self.counts = np.zeros(buckets_per_decade * decades + 2, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= self.min_seconds:
+            bucket = 0
+        else:
+            bucket = 1 + int(math.log10(seconds / self.min_seconds) * self.buckets_per_decade)
+            bucket = min(bucket, len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def upper_bound(self, bucket):
+        return self.min_seconds * 10 ** (bucket / self.buckets_per_decade)
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q / 100 * self.count)
+        bucket = int(np.searchsorted(np.cumsum(self.counts), max(rank, 1)))
+        return min(self.upper_bound(bucket), self.max)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p95_ms": self.percentile(95) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
@@ -0,0 +1,186 @@
+import os
+import pickle
+import threading
+import time
+
+MODEL_PATH = "LightGBM.pkl"
+SCALER_PATH = "StandardScalar.pkl"
+# Set to a file written by 'python artifacts.py export' to skip unpickling altogether
+ARTIFACT_PATH = os.environ.get("AIR_POLLUTION_ARTIFACT") or None
+
+
+def resident_memory_mb():
+    """Current resident set size of this process in MB (0.0 when it cannot be read)."""
+    # /proc first: importing psutil costs ~0.1s of cold start
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return 0.0
+
+
+def load_model_and_scaler(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    for path in (model_path, scaler_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model or Scaler file not found: '{path}'")
+
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+
+    return model, scaler
+
+
+class ModelRegistry:
+    """Loads the model and scaler once per process and hands out the same objects.
+
+    The returned objects are shared by every session and thread, so callers must
+    treat them as read-only. Loading is guarded by a lock so concurrent first
+    requests still unpickle the files only once.
+
+    With ``engine="native"`` the booster is compiled into a ``TreeEnsemble``
+    after loading, which serves ``predict_proba`` without calling into LightGBM.
+    With ``artifact_path`` both are read from a memory-mapped artifact (see
+    artifacts.py) instead of the pickles.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, engine="lightgbm", artifact_path=None):
+        if engine not in ("lightgbm", "native"):
+            raise ValueError(f"Unknown engine '{engine}', expected 'lightgbm' or 'native'")
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.engine = engine
+        self.artifact_path = artifact_path
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._stats = {}
+
+    @property
+    def is_loaded(self):
+        return self._loaded is not None
+
+    def get(self):
+        if self._loaded is None:
+            with self._lock:
+                if self._loaded is None:
+                    self._load()
+        return self._loaded
+
+    def _load(self):
+        rss_before = resident_memory_mb()
+        start = time.perf_counter()
+        if self.artifact_path:
+            model, scaler = self._load_artifact()
+        else:
+            model, scaler = load_model_and_scaler(self.model_path, self.scaler_path)
+        if self.engine == "native" and not self.artifact_path:
+            from tree_engine import TreeEnsemble
+            model = TreeEnsemble.from_booster(model)
+        loaded = model, scaler
+        self._stats = {
+            # Native-only artifacts load into the tree engine whatever was asked for
+            "engine": "lightgbm" if hasattr(model, 'booster_') else "native",
+            "source": "artifact" if self.artifact_path else "pickle",
+            "load_seconds": time.perf_counter() - start,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": resident_memory_mb(),
+            "loaded_at": time.time(),
+        }
+        self._loaded = loaded
+
+    def _load_artifact(self):
+        from artifacts import load_artifact
+        if not os.path.exists(self.artifact_path):
+            raise FileNotFoundError(f"Model artifact not found: '{self.artifact_path}'")
+        return load_artifact(self.artifact_path, engine=self.engine)
+
+    def warm(self, background=False):
+        """Load ahead of the first request, optionally on a daemon thread."""
+        if not background:
+            self.get()
+            return None
+        thread = threading.Thread(target=self._warm_quietly, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_quietly(self):
+        try:
+            self.get()
+        except FileNotFoundError:
+            # Reported to the caller on the first get()
+            pass
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["loaded"] = self.is_loaded
+        stats["rss_mb"] = resident_memory_mb()
+        return stats
+
+
+default_registry = ModelRegistry(artifact_path=ARTIFACT_PATH)
+
+
+# --- Candidate Models ---
+class ModelSet:
+    """The served (primary) model plus named candidates, each loaded once through its own ``ModelRegistry``.
+
+    Described by a JSON file::
+
+        {"primary": "lightgbm",
+         "candidates": {"edge": {"artifact": "edge.apm", "engine": "native"},
+                        "retrained": {"model": "training_output/LightGBM.pkl",
+                                      "scaler": "training_output/StandardScalar.pkl"}},
+         "traffic": {"retrained": 0.1}}
+
+    ``primary`` names the model the process already serves (its registry is
+    passed in). ``traffic`` gives candidates a share of live requests (A/B);
+    the rest go to the primary. See shadow_scoring.py for how they are scored.
+    """
+
+    def __init__(self, primary_registry, candidates=None, primary_name="primary", traffic=None):
+        self.primary_name = primary_name
+        self.registries = {primary_name: primary_registry}
+        for name, registry in (candidates or {}).items():
+            if name in self.registries:
+                raise ValueError(f"Duplicate model name '{name}'")
+            self.registries[name] = registry
+        self.traffic = dict(traffic or {})
+        for name, share in self.traffic.items():
+            if name not in self.registries or name == primary_name:
+                raise ValueError(f"Traffic share for unknown candidate '{name}'")
+            if not 0.0 <= share <= 1.0:
+                raise ValueError(f"Traffic share of '{name}' must be between 0 and 1, got {share}")
+        if sum(self.traffic.values()) > 1.0:
+            raise ValueError("Candidate traffic shares add up to more than 1")
+
+    @classmethod
+    def from_config(cls, path, primary_registry):
+        import json
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model set not found: '{path}'")
+        with open(path) as f:
+            config = json.load(f)
+        candidates = {}
+        for name, spec in config.get("candidates", {}).items():
+            if "model" not in spec and "artifact" not in spec:
+                raise ValueError(f"Candidate '{name}' needs a 'model' or an 'artifact'")
+            candidates[name] = ModelRegistry(spec.get("model", MODEL_PATH), spec.get("scaler", SCALER_PATH),
+                                             engine=spec.get("engine", "lightgbm"), artifact_path=spec.get("artifact"))
+        return cls(primary_registry, candidates, config.get("primary", "primary"), config.get("traffic"))
+
+    @property
+    def names(self):
+        return list(self.registries)
+
+    def get(self):
+        """{name: (model, scaler)} for every model, loading those not loaded yet."""
+        return {name: registry.get() for name, registry in self.registries.items()}
+
+    def stats(self):
+        return {name: registry.stats() for name, registry in self.registries.items()}
@@ -0,0 +1,206 @@
+"""Smaller, faster variants of the booster for the native tree engine.
+
+    python model_variants.py export --iterations 100 --dtype float32 --drop-share 0.01 -o edge.apm
+    python model_variants.py importance
+
+A variant is a ``TreeEnsemble`` derived from the full model in three ways,
+which can be combined:
+
+* truncation keeps the first K boosting iterations;
+* quantization stores thresholds and leaf/node values as float32 or float16;
+* dropping a feature folds it to its neutral value (0: the category is absent,
+  or the training mean after scaling), so every split on it always takes the
+  same side and the other side's subtree is pruned away.
+
+Variants are exported as native-only artifacts (no booster section) and
+served with ``engine="native"``. ``benchmarks/bench_variants.py`` reports
+their size, latency and agreement with the original model.
+"""
+import argparse
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from features import final_feature_names
+from tree_engine import TreeEnsemble
+
+_node_arrays = [
+    'split_feature', 'threshold', 'left_child', 'right_child', 'leaf_value', 'node_value',
+    'default_left', 'missing_type'
+]
+
+
+# --- Feature Importance ---
+def model_feature_names(model):
+    """Column names as the model records them: the booster's own, which need not match ``final_feature_names``
+    (the shipped one has ``wd_N`` where the app encodes ``wd_E``), else ``final_feature_names``."""
+    booster = getattr(model, 'booster_', model)
+    names = booster.feature_name() if hasattr(booster, 'feature_name') else getattr(model, 'feature_names', None)
+    names = list(names) if names is not None else list(final_feature_names)
+    if len(names) != len(final_feature_names):
+        raise ValueError(f"The model has {len(names)} columns, expected {len(final_feature_names)}")
+    return names
+
+
+def feature_importance(model):
+    """Total split gain per model column (split counts for a ``TreeEnsemble``), largest first."""
+    booster = getattr(model, 'booster_', model)
+    if hasattr(booster, 'feature_importance'):
+        values = booster.feature_importance(importance_type='gain')
+    else:
+        internal = model.split_feature >= 0
+        values = np.bincount(model.split_feature[internal], minlength=len(final_feature_names))
+    return pd.Series(values, index=model_feature_names(model), dtype=float).sort_values(ascending=False)
+
+
+def negligible_features(importance, max_share=0.01):
+    """The least important columns that together account for at most ``max_share`` of the total."""
+    ascending = importance.sort_values()
+    share = ascending.cumsum() / ascending.sum()
+    return list(ascending.index[share <= max_share])
+
+
+# --- Deriving Variants ---
+def _rebuild(ensemble, trees, fixed):
+    """Copy ``trees`` into fresh node arrays, sending splits on ``fixed`` features down one side.
+
+    Keeps the engine's layout: breadth-first, children side by side, leaves
+    pointing to themselves.
+    """
+    nodes = {name: [] for name in _node_arrays}
+    roots, tree_class = [], []
+
+    def allocate():
+        for name in nodes:
+            nodes[name].append(0)
+        return len(nodes['split_feature']) - 1
+
+    def resolve(node):
+        while int(ensemble.split_feature[node]) in fixed:
+            value = np.array([fixed[int(ensemble.split_feature[node])]], dtype=np.float64)
+            node = int(ensemble._step(np.array([node]), value)[0])
+        return node
+
+    for tree in trees:
+        roots.append(allocate())
+        tree_class.append(ensemble.tree_class[tree])
+        pending = deque([(resolve(ensemble.roots[tree]), roots[-1])])
+        while pending:
+            source, index = pending.popleft()
+            for name in _node_arrays:
+                nodes[name][index] = getattr(ensemble, name)[source]
+            if ensemble.split_feature[source] < 0:
+                nodes['left_child'][index] = nodes['right_child'][index] = index
+                continue
+            left, right = allocate(), allocate()
+            nodes['left_child'][index], nodes['right_child'][index] = left, right
+            pending.append((resolve(ensemble.left_child[source]), left))
+            pending.append((resolve(ensemble.right_child[source]), right))
+
+    arrays = {name: np.asarray(values, dtype=getattr(ensemble, name).dtype) for name, values in nodes.items()}
+    return TreeEnsemble(**arrays, roots=roots, tree_class=tree_class, **ensemble.metadata())
+
+
+def truncate(ensemble, n_iterations):
+    """The first ``n_iterations`` boosting rounds (``num_class`` trees each)."""
+    n_trees = int(n_iterations) * ensemble.num_class
+    if not 0 < n_trees <= ensemble.n_trees:
+        raise ValueError(f"n_iterations must be between 1 and {ensemble.n_trees // ensemble.num_class}")
+    return _rebuild(ensemble, range(n_trees), {})
+
+
+def drop_features(ensemble, features, values=None):
+    """Fold ``features`` (the model's column names, or indices) to constants and prune the unreachable subtrees.
+
+    ``values`` maps a feature to the value it is fixed at; the default 0.0 is
+    "category absent" for one-hot columns and the training mean for scaled ones.
+    """
+    values = values or {}
+    names = model_feature_names(ensemble)
+    fixed = {}
+    for feature in features:
+        if isinstance(feature, str) and feature not in names:
+            raise ValueError(f"Unknown feature '{feature}'; the model's columns are {', '.join(names)}")
+        index = names.index(feature) if isinstance(feature, str) else int(feature)
+        fixed[index] = float(values.get(feature, 0.0))
+    return _rebuild(ensemble, range(ensemble.n_trees), fixed)
+
+
+def quantize(ensemble, dtype):
+    """The same trees with thresholds and leaf/node values stored as ``dtype``.
+
+    Inputs that fall between a threshold and its rounded value change sides;
+    the agreement report measures how often that changes the prediction.
+    """
+    arrays = ensemble.to_arrays()
+    arrays['threshold'] = arrays['threshold'].astype(dtype)
+    arrays['leaf_value'] = arrays['leaf_value'].astype(dtype)
+    arrays['node_value'] = arrays['node_value'].astype(dtype)
+    return TreeEnsemble.from_arrays(arrays, ensemble.metadata())
+
+
+def derive_variant(ensemble, iterations=None, dtype=None, drop=()):
+    """Apply truncation, feature dropping and quantization, in that order."""
+    if iterations is not None and iterations * ensemble.num_class < ensemble.n_trees:
+        ensemble = truncate(ensemble, iterations)
+    if drop:
+        ensemble = drop_features(ensemble, drop)
+    if dtype is not None and np.dtype(dtype) != ensemble.threshold.dtype:
+        ensemble = quantize(ensemble, dtype)
+    return ensemble
+
+
+def variant_name(iterations=None, dtype=None, drop=()):
+    parts = [f"{iterations} iter" if iterations else "all iter", np.dtype(dtype or np.float64).name]
+    if drop:
+        parts.append(f"-{len(drop)} features")
+    return ", ".join(parts)
+
+
+def ensemble_bytes(ensemble):
+    """Memory held by the node arrays."""
+    return sum(values.nbytes for values in ensemble.to_arrays().values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive a reduced model variant for the native engine.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write a variant as a native-only artifact")
+    export.add_argument("--iterations", type=int, default=None, help="Keep the first K boosting iterations")
+    export.add_argument("--dtype", choices=["float64", "float32", "float16"], default="float64")
+    export.add_argument("--drop-share", type=float, default=0.0,
+                        help="Drop the least important features that together hold this share of total gain")
+    export.add_argument("--drop", nargs="*", default=[], help="Feature columns to drop by name")
+    export.add_argument("--model", default="LightGBM.pkl")
+    export.add_argument("--scaler", default="StandardScalar.pkl")
+    export.add_argument("-o", "--output", default="air_pollution_variant.apm")
+    importance = sub.add_parser("importance", help="Print each column's share of total split gain")
+    importance.add_argument("--model", default="LightGBM.pkl")
+    importance.add_argument("--scaler", default="StandardScalar.pkl")
+    args = parser.parse_args()
+
+    from model_registry import load_model_and_scaler
+    model, scaler = load_model_and_scaler(args.model, args.scaler)
+    gain = feature_importance(model)
+
+    if args.command == "importance":
+        share = gain / gain.sum()
+        for name, value in share.items():
+            print(f"{name:<22} {value:8.3%}")
+        return
+
+    from artifacts import export_artifact
+    drop = list(dict.fromkeys(args.drop + (negligible_features(gain, args.drop_share) if args.drop_share else [])))
+    full = TreeEnsemble.from_booster(model)
+    variant = derive_variant(full, args.iterations, args.dtype, drop)
+    header = export_artifact(variant, scaler, args.output)
+    print(f"Wrote {args.output} ({variant_name(args.iterations, args.dtype, drop)}): "
+          f"{variant.n_trees} trees, {variant.n_nodes:,} nodes (from {full.n_nodes:,}), "
+          f"{header['payload_bytes'] / 2**20:.2f} MB payload")
+    if drop:
+        print("Dropped: " + ", ".join(drop))
+
+
+if __name__ == "__main__":
+    main()
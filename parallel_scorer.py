@@ -0,0 +1,156 @@
+"""Score large archives of readings across worker processes.
+
+    python parallel_scorer.py archive.parquet -o scored.parquet --workers 8 --chunk-size 100000
+
+The parent builds the feature matrix directly into a shared-memory block and
+allocates a second block for the probabilities. Workers load the model once,
+attach to both blocks by name and fill in their row ranges, so only
+``(start, stop)`` pairs travel between processes and the output order always
+matches the input.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from features import class_labels, compiled_transform, label_predictions, read_readings
+from model_registry import ModelRegistry
+
+_worker = {}
+
+
+def _attach(name, shape):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+def _init_worker(model_path, scaler_path, artifact_path, engine, X_spec, proba_spec, ready, errors):
+    try:
+        # With an artifact every worker maps the same file instead of unpickling its own copy
+        model, _ = ModelRegistry(model_path, scaler_path, engine=engine, artifact_path=artifact_path).get()
+        if hasattr(model, 'set_params'):
+            # One thread per process; the pool provides the parallelism
+            model.set_params(n_jobs=1)
+        X_block, X = _attach(*X_spec)
+        proba_block, proba = _attach(*proba_spec)
+        _worker.update(model=model, X=X, proba=proba, blocks=(X_block, proba_block))
+    except Exception as e:
+        # Report before breaking the barrier, so the parent fails at once instead of the pool respawning workers
+        errors.put(f"{type(e).__name__}: {e}")
+        ready.abort()
+        raise
+    ready.wait()
+
+
+def _score_range(bounds):
+    start, stop = bounds
+    _worker['proba'][start:stop] = _worker['model'].predict_proba(_worker['X'][start:stop])
+    return stop - start
+
+
+class SharedArray:
+    """A float64 array in a named shared-memory block, unlinked on close."""
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        nbytes = max(int(np.prod(self.shape)) * 8, 1)
+        self.block = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.block.buf)
+
+    @property
+    def spec(self):
+        return self.block.name, self.shape
+
+    def close(self):
+        del self.array
+        self.block.close()
+        self.block.unlink()
+
+
+def score_parallel(readings, scaler, workers=None, chunk_size=100_000, engine="lightgbm",
+                   model_path="LightGBM.pkl", scaler_path="StandardScalar.pkl", artifact_path=None,
+                   startup_timeout=300):
+    """Class probabilities for every row of ``readings``, in input order.
+
+    Returns ``(proba, timings)`` where ``timings`` has the feature-building,
+    pool start-up (model loading) and scoring wall times in seconds.
+    """
+    workers = workers or os.cpu_count() or 1
+    n_rows = len(readings)
+    transform = compiled_transform(scaler)
+    X = SharedArray((n_rows, transform.n_features))
+    proba = SharedArray((n_rows, len(class_labels)))
+    timings = {}
+    try:
+        start = time.perf_counter()
+        transform.transform_frame(readings, out=X.array)
+        timings['features_s'] = time.perf_counter() - start
+
+        bounds = [(i, min(i + chunk_size, n_rows)) for i in range(0, n_rows, chunk_size)]
+        # spawn rather than fork: forking after OpenMP has started in the parent can deadlock
+        context = mp.get_context("spawn")
+        ready = context.Barrier(workers + 1)
+        errors = context.SimpleQueue()
+        start = time.perf_counter()
+        with context.Pool(
+            processes=workers, initializer=_init_worker,
+            initargs=(model_path, scaler_path, artifact_path, engine, X.spec, proba.spec, ready, errors),
+        ) as pool:
+            # Every worker has loaded the model once it reaches the barrier
+            try:
+                ready.wait(timeout=startup_timeout)
+            except threading.BrokenBarrierError:
+                reason = errors.get() if not errors.empty() else f"not all started within {startup_timeout}s"
+                raise RuntimeError(f"Scoring workers failed to start: {reason}") from None
+            timings['startup_s'] = time.perf_counter() - start
+            start = time.perf_counter()
+            scored = sum(pool.imap_unordered(_score_range, bounds))
+            timings['scoring_s'] = time.perf_counter() - start
+        if scored != n_rows:
+            raise RuntimeError(f"Scored {scored:,} of {n_rows:,} rows")
+        return proba.array.copy(), timings
+    finally:
+        X.close()
+        proba.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a large readings file on several cores.")
+    parser.add_argument("input", help="CSV or Parquet file of raw readings")
+    parser.add_argument("-o", "--output", required=True, help="Output CSV or Parquet file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm")
+    parser.add_argument("--model", default="LightGBM.pkl")
+    parser.add_argument("--scaler", default="StandardScalar.pkl")
+    parser.add_argument("--artifact", default=None,
+                        help="Memory-mapped model artifact (python artifacts.py export) used instead of the pickles")
+    args = parser.parse_args()
+
+    readings = read_readings(args.input)
+    _, scaler = ModelRegistry(args.model, args.scaler, artifact_path=args.artifact).get()
+    proba, timings = score_parallel(
+        readings, scaler, workers=args.workers, chunk_size=args.chunk_size, engine=args.engine,
+        model_path=args.model, scaler_path=args.scaler, artifact_path=args.artifact,
+    )
+
+    results = readings.reset_index(drop=True)
+    results['Predicted Level'] = label_predictions(proba)
+    for i, label in enumerate(class_labels):
+        results[f'P({label})'] = proba[:, i]
+    if args.output.lower().endswith(('.parquet', '.pq')):
+        results.to_parquet(args.output, index=False)
+    else:
+        results.to_csv(args.output, index=False)
+
+    print(f"Scored {len(results):,} rows with {args.workers} workers: "
+          f"features {timings['features_s']:.2f}s, start-up {timings['startup_s']:.2f}s, "
+          f"scoring {timings['scoring_s']:.2f}s ({len(results) / timings['scoring_s']:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from features import station_wd_features, numeric_features
+
+# Discrete model inputs are never rounded; everything else is quantized
+discrete_features = set(station_wd_features) | {'month', 'is_night', 'Rain_Flag'}
+continuous_columns = [
+    len(station_wd_features) + i
+    for i, feat in enumerate(numeric_features) if feat not in discrete_features
+]
+
+# Rough per-entry bookkeeping cost of an OrderedDict slot, key bytes object and tuple
+_entry_overhead_bytes = 200
+
+
+class PredictionCache:
+    """LRU/TTL cache in front of ``model.predict_proba``, keyed on the model input vector.
+
+    Continuous columns are rounded to multiples of ``quantum`` (in scaled units,
+    i.e. standard deviations) before hashing, so near-identical readings share an
+    entry. Misses within one call are scored together in a single model call.
+    The cache exposes the same ``predict_proba`` method as the model, so it can
+    be dropped in wherever a model is expected.
+    """
+
+    def __init__(self, model, max_entries=10_000, ttl_seconds=None, quantum=1e-3, clock=time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.model = model
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.quantum = float(quantum)
+        self.clock = clock
+        self.classes_ = getattr(model, 'classes_', None)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def keys_for(self, X):
+        """Hashable cache keys, one per row of ``X``."""
+        keys = np.array(X, dtype=np.float64, copy=True, ndmin=2)
+        if self.quantum > 0:
+            cols = keys[:, continuous_columns]
+            keys[:, continuous_columns] = np.round(cols / self.quantum)
+        keys += 0.0  # fold -0.0 into 0.0 so both hash alike
+        return [row.tobytes() for row in keys]
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        keys = self.keys_for(X)
+        proba = None
+        missing = []
+        now = self.clock()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl_seconds is not None and now - entry[0] > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                    continue
+                self._entries.move_to_end(key)
+                if proba is None:
+                    proba = np.empty((len(keys), len(entry[1])))
+                proba[i] = entry[1]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Score outside the lock so concurrent hits are not held up by the model
+            scored = self.model.predict_proba(X[missing])
+            if proba is None:
+                proba = np.empty((len(keys), scored.shape[1]))
+            proba[missing] = scored
+            with self._lock:
+                for i, row in zip(missing, scored):
+                    self._entries[keys[i]] = (now, row.copy())
+                    self._entries.move_to_end(keys[i])
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return proba
+
+    def predict(self, X):
+        classes = self.classes_ if self.classes_ is not None else np.arange(3)
+        return np.asarray(classes)[np.argmax(self.predict_proba(X), axis=1)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def approx_bytes(self):
+        if not self._entries:
+            return 0
+        key, (_, row) = next(iter(self._entries.items()))
+        return len(self._entries) * (len(key) + row.nbytes + _entry_overhead_bytes)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": self.approx_bytes(),
+            }
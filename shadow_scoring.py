@@ -0,0 +1,352 @@
+"""Serve a primary model while candidate models score the same inputs in the background.
+
+    python shadow_scoring.py models.json readings.csv --batch-size 1
+
+``ShadowScorer`` exposes a model's ``predict_proba``, so it drops in wherever
+one is expected (under a ``PredictionCache`` or ``MicroBatcher``). Each call
+is routed to one served model, the primary or a candidate with a ``traffic``
+share, and answered by it alone. Its inputs are then queued for a daemon
+thread, which gathers what arrives within ``shadow_wait`` seconds and scores
+every model, the primary included, on those rows in one call each. So the
+models are timed on identical batches, and the thread is busy far less often
+than if it scored each request separately. That matters because a caller
+that arrives while it holds the GIL waits for it. The queue is bounded in
+rows: when the thread falls behind, rows are dropped and counted instead of
+delaying callers.
+
+Per model it tracks the latency of served calls, the latency and rows per
+second of its shadow batches and, against the primary, the share of rows
+with the same level, the mean largest probability gap and the confusion
+matrix of levels.
+
+Inputs are built with the primary's scaler. For a candidate fitted with
+another scaler the numeric block is mapped back to raw units and rescaled.
+"""
+import argparse
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import class_labels, final_feature_names, station_wd_features
+from latency import LatencyHistogram
+
+_n_cat = len(station_wd_features)
+_stop = object()
+
+
+def rescale(X, source, target):
+    """``X`` built with the ``source`` scaler, as the ``target`` scaler would have built it."""
+    if source is target or (np.array_equal(source.mean_, target.mean_) and np.array_equal(source.scale_, target.scale_)):
+        return X
+    X = np.array(X, dtype=np.float64, copy=True)
+    raw = X[:, _n_cat:] * source.scale_ + source.mean_
+    X[:, _n_cat:] = (raw - target.mean_) / target.scale_
+    return X
+
+
+class ModelStats:
+    """Served and shadow calls of one model, plus its agreement with the primary."""
+
+    def __init__(self, n_classes):
+        self.latency = {"served": LatencyHistogram(), "shadow": LatencyHistogram()}
+        self.rows = {"served": 0, "shadow": 0}
+        self.seconds = {"served": 0.0, "shadow": 0.0}
+        self.confusion = np.zeros((n_classes, n_classes), dtype=np.int64)  # primary level x this model's level
+        self.gap_total = 0.0
+
+    def add_call(self, role, seconds, n_rows):
+        self.latency[role].add(seconds)
+        self.rows[role] += n_rows
+        self.seconds[role] += seconds
+
+    def add_comparison(self, primary, proba):
+        n_classes = len(self.confusion)
+        pairs = primary.argmax(axis=1) * n_classes + proba.argmax(axis=1)
+        self.confusion += np.bincount(pairs, minlength=n_classes ** 2).reshape(n_classes, n_classes)
+        self.gap_total += float(np.abs(primary - proba).max(axis=1).sum())
+
+    def summary(self):
+        served, shadow = self.latency["served"].summary(), self.latency["shadow"].summary()
+        compared = int(self.confusion.sum())
+        return {
+            "served_rows": self.rows["served"],
+            "served_p50_ms": served["p50_ms"] if served["count"] else None,
+            "served_p95_ms": served["p95_ms"] if served["count"] else None,
+            "shadow_rows": self.rows["shadow"],
+            "batch_p50_ms": shadow["p50_ms"] if shadow["count"] else None,
+            "batch_p95_ms": shadow["p95_ms"] if shadow["count"] else None,
+            "rows_per_sec": self.rows["shadow"] / self.seconds["shadow"] if self.seconds["shadow"] else None,
+            "compared_rows": compared,
+            "agreement": float(np.trace(self.confusion)) / compared if compared else None,
+            "mean_gap": self.gap_total / compared if compared else None,
+        }
+
+
+class ShadowScorer:
+    """``predict_proba`` from the routed model, with every model scored on the same rows off the caller's thread.
+
+    ``models`` and ``scalers`` map names to loaded objects and must include
+    ``primary``. ``traffic`` maps candidates to their share of calls (A/B).
+    ``max_pending_rows`` bounds the rows waiting for shadow scoring (None: no
+    bound) and ``max_batch_rows`` the rows of one shadow batch. With a single
+    model there is nothing to compare and no thread is started.
+    """
+
+    def __init__(self, models, scalers, primary, traffic=None, shadow_wait=0.05, max_batch_rows=4096,
+                 max_pending_rows=200_000, seed=0):
+        if primary not in models:
+            raise ValueError(f"Primary model '{primary}' is not among the models")
+        for name, model in models.items():
+            n_features = getattr(model, 'n_features_in_', None)
+            if n_features is not None and n_features != len(final_feature_names):
+                raise ValueError(f"Model '{name}' takes {n_features} features, expected {len(final_feature_names)}")
+        self.models = dict(models)
+        self.scalers = dict(scalers)
+        self.primary = primary
+        self.traffic = dict(traffic or {})
+        self.classes_ = getattr(models[primary], 'classes_', None)
+        self.shadow_wait = float(shadow_wait)
+        self.max_batch_rows = int(max_batch_rows)
+        self.max_pending_rows = max_pending_rows
+        self._routes = list(zip(self.traffic, np.cumsum(list(self.traffic.values()))))
+        self._random = random.Random(seed)
+        self._stats = {name: ModelStats(len(class_labels)) for name in self.models}
+        self._lock = threading.Lock()
+        self.pending_rows = self.dropped_rows = self.failures = 0
+        self._pending = None
+        if len(self.models) > 1:
+            self._pending = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_model_set(cls, model_set, **kwargs):
+        """A scorer over every model of a ``model_registry.ModelSet``, loading them as needed."""
+        loaded = model_set.get()
+        return cls({name: model for name, (model, _) in loaded.items()},
+                   {name: scaler for name, (_, scaler) in loaded.items()},
+                   model_set.primary_name, model_set.traffic, **kwargs)
+
+    @property
+    def names(self):
+        return list(self.models)
+
+    def route(self):
+        """The model that answers the next call."""
+        if self._routes:
+            draw = self._random.random()
+            for name, bound in self._routes:
+                if draw < bound:
+                    return name
+        return self.primary
+
+    # --- Callers ---
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        proba = self._score(self.route(), X, "served")
+        if self._pending is not None:
+            with self._lock:
+                queued = self.max_pending_rows is None or self.pending_rows + len(X) <= self.max_pending_rows
+                if queued:
+                    self.pending_rows += len(X)
+                else:
+                    self.dropped_rows += len(X)
+            if queued:
+                self._pending.put(X)
+        return proba
+
+    def served_by(self, X, proba):
+        """Name of the model whose output for the single reading ``X`` is ``proba``, e.g. to explain a cached
+        answer (see ``served_by_rows``)."""
+        return self.served_by_rows(X, proba)[0]
+
+    def served_by_rows(self, X, proba):
+        """Per row of ``X``, the name of the model whose output is that row of ``proba``: the primary unless a
+        candidate with a traffic share matches it (and the primary does not). Batches are routed per call, so
+        the rows of one scored file can come from several models."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(final_feature_names))
+        proba = np.asarray(proba, dtype=np.float64).reshape(len(X), -1)
+        names = np.full(len(X), self.primary, dtype=object)
+        if not self.traffic:
+            return names
+        unresolved = np.arange(len(X))
+        for name in [self.primary] + [name for name in self.traffic if name != self.primary]:
+            inputs = rescale(X[unresolved], self.scalers[self.primary], self.scalers[name])
+            outputs = self.models[name].predict_proba(inputs)
+            matched = np.isclose(outputs, proba[unresolved], rtol=0, atol=1e-9).all(axis=1)
+            names[unresolved[matched]] = name
+            unresolved = unresolved[~matched]
+            if not len(unresolved):
+                break
+        return names
+
+    def predict(self, X):
+        classes = self.classes_ if self.classes_ is not None else np.arange(len(class_labels))
+        return np.asarray(classes)[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _score(self, name, X, role):
+        inputs = rescale(X, self.scalers[self.primary], self.scalers[name])
+        start = time.perf_counter()
+        proba = self.models[name].predict_proba(inputs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats[name].add_call(role, elapsed, len(X))
+        return proba
+
+    # --- Worker ---
+    def _collect(self, first):
+        """The first queued rows plus whatever else arrives within ``shadow_wait``; and whether to stop."""
+        if first is _stop:
+            return [], True
+        batch, n_rows = [first], len(first)
+        deadline = time.perf_counter() + self.shadow_wait
+        while n_rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is _stop:
+                return batch, True
+            batch.append(item)
+            n_rows += len(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect(self._pending.get())
+            try:
+                if batch:
+                    self._shadow(batch[0] if len(batch) == 1 else np.concatenate(batch))
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self._pending.task_done()
+            if stopping:
+                return
+
+    def _shadow(self, X):
+        outputs = {}
+        try:
+            for name in self.models:
+                outputs[name] = self._score(name, X, "shadow")
+        except Exception:
+            with self._lock:
+                self.failures += 1
+        with self._lock:
+            self.pending_rows -= len(X)
+            primary = outputs.get(self.primary)
+            if primary is not None:
+                for name, proba in outputs.items():
+                    if name != self.primary:
+                        self._stats[name].add_comparison(primary, proba)
+
+    def drain(self):
+        """Block until every queued row has been shadow-scored."""
+        if self._pending is not None:
+            self._pending.join()
+
+    def close(self, timeout=5.0):
+        """Score what is already queued, then stop the worker thread."""
+        if self._pending is not None:
+            self._pending.put(_stop)
+            self._thread.join(timeout)
+
+    # --- Reporting ---
+    def stats(self):
+        primary_share = 1.0 - sum(self.traffic.values())
+        with self._lock:
+            models = {
+                name: {"role": "primary" if name == self.primary else "candidate",
+                       "traffic": primary_share if name == self.primary else self.traffic.get(name, 0.0),
+                       **stats.summary()}
+                for name, stats in self._stats.items()
+            }
+            return {"primary": self.primary, "models": models, "pending_rows": self.pending_rows,
+                    "dropped_rows": self.dropped_rows, "failures": self.failures}
+
+    def comparison(self):
+        """One row per model: role, traffic share, latency, throughput and agreement with the primary."""
+        frame = pd.DataFrame.from_dict(self.stats()["models"], orient="index").rename_axis("model")
+        optional = ["served_p50_ms", "served_p95_ms", "batch_p50_ms", "batch_p95_ms", "rows_per_sec",
+                    "agreement", "mean_gap"]
+        return frame.astype({column: float for column in optional})
+
+    def confusion(self, name):
+        """Rows by the primary's level (index) and ``name``'s level (columns)."""
+        with self._lock:
+            counts = self._stats[name].confusion.copy()
+        return pd.DataFrame(counts, index=pd.Index(class_labels, name=self.primary),
+                            columns=pd.Index(class_labels, name=name))
+
+
+def register_metrics(metrics_registry, get_scorer):
+    """Publish the stats of ``get_scorer()`` (None until one exists) at scrape time."""
+    def models():
+        scorer = get_scorer()
+        return scorer.stats()["models"] if scorer is not None else {}
+
+    def latencies():
+        values = {}
+        for name, s in models().items():
+            for role, prefix in (("served", "served"), ("shadow", "batch")):
+                for quantile, key in (("0.5", f"{prefix}_p50_ms"), ("0.95", f"{prefix}_p95_ms")):
+                    if s[key] is not None:
+                        values[(name, role, quantile)] = s[key] / 1e3
+        return values
+
+    metrics_registry.counter(
+        "air_pollution_model_rows_total", "Rows scored by each model, served or in shadow", ["model", "role"]
+    ).set_function(lambda: {(name, role): s[f"{role}_rows"] for name, s in models().items()
+                            for role in ("served", "shadow")})
+    metrics_registry.gauge(
+        "air_pollution_model_latency_seconds", "Latency percentiles of served calls and shadow batches",
+        ["model", "role", "quantile"]
+    ).set_function(latencies)
+    metrics_registry.gauge(
+        "air_pollution_model_agreement", "Share of shadow-scored rows whose level matches the primary's", ["model"]
+    ).set_function(lambda: {(name,): s["agreement"] for name, s in models().items() if s["compared_rows"]})
+    metrics_registry.counter(
+        "air_pollution_shadow_dropped_rows_total", "Rows not shadow-scored because the queue was full"
+    ).set_function(lambda: get_scorer().dropped_rows if get_scorer() is not None else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay readings through a model set and compare the models.")
+    parser.add_argument("models", help="Model set JSON (see model_registry.ModelSet)")
+    parser.add_argument("input", help="CSV or Parquet file of raw readings")
+    parser.add_argument("--model", default="LightGBM.pkl", help="The primary model")
+    parser.add_argument("--scaler", default="StandardScalar.pkl")
+    parser.add_argument("--artifact", default=None, help="Memory-mapped artifact of the primary model")
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm")
+    parser.add_argument("--batch-size", type=int, default=1, help="Rows per call, as live requests would send them")
+    args = parser.parse_args()
+
+    from features import build_feature_matrix, read_readings
+    from model_registry import ModelRegistry, ModelSet
+
+    primary = ModelRegistry(args.model, args.scaler, engine=args.engine, artifact_path=args.artifact)
+    scorer = ShadowScorer.from_model_set(ModelSet.from_config(args.models, primary), max_pending_rows=None)
+    readings = read_readings(args.input)
+    X = build_feature_matrix(readings, scorer.scalers[scorer.primary])
+    start = time.perf_counter()
+    for offset in range(0, len(X), args.batch_size):
+        scorer.predict_proba(X[offset:offset + args.batch_size])
+    served = time.perf_counter() - start
+    scorer.drain()
+    print(f"{len(X):,} readings in calls of {args.batch_size}: served in {served:.2f}s, "
+          f"shadow scoring done after {time.perf_counter() - start:.2f}s\n")
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4g}".format):
+        print(scorer.comparison())
+    for name in scorer.names:
+        if name != scorer.primary:
+            print(f"\nLevels of {scorer.primary} (rows) vs {name} (columns):\n{scorer.confusion(name)}")
+
+
+if __name__ == "__main__":
+    main()
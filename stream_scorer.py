@@ -0,0 +1,263 @@
+"""Score an unbounded feed of readings in micro-batches with constant memory.
+
+    python stream_scorer.py readings.jsonl -o predictions.jsonl
+    tail -f feed.csv | python stream_scorer.py - --format csv --max-wait 0.5
+
+Each input line is one reading (a JSON object, or a CSV row under a header).
+A batch is scored when it reaches ``--batch-size`` readings or when its oldest
+reading has waited ``--max-wait`` seconds. Every output line is a JSON object
+with the reading's ``request_id``/``id`` (when present), ``level`` and
+``probabilities``, or an ``error`` for readings that could not be scored.
+Readings outside the training range (validation.py) are scored but carry
+``warnings``, and every batch is added to the drift window.
+
+With ``--temporal-spec`` (written by ``train.py --temporal``) every reading
+also needs a ``time``; per-station rolling/lag features (temporal_features.py)
+are appended to the model input, and a forecast model's outputs carry its
+``horizon_hours``.
+"""
+import argparse
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import (
+    compiled_transform, format_predictions, predict_in_chunks, raw_columns, raw_numeric_columns, reading_errors
+)
+from latency import LatencyHistogram
+from model_registry import ModelRegistry
+from validation import ValidationStage, load_reference
+
+id_fields = ('request_id', 'id')
+_end_of_feed = object()
+
+
+# --- Reading the feed ---
+def read_records(stream, fmt="jsonl"):
+    """Yield one dict per non-empty input line."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield row
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {"_error": f"line {line_number}: invalid JSON ({e.msg})"}
+        yield record if isinstance(record, dict) else {"_error": f"line {line_number}: expected a JSON object"}
+
+
+def micro_batches(records, batch_size=512, max_wait=None):
+    """Group records into lists of at most ``batch_size``.
+
+    With ``max_wait`` a reader thread feeds a bounded queue, so a partial batch
+    is flushed after ``max_wait`` seconds even while the source is blocked
+    waiting for input (e.g. a quiet stdin).
+    """
+    if max_wait is None:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    pending = queue.Queue(maxsize=batch_size * 4)
+    failure = []
+
+    def pump():
+        # The end marker goes in even when the source raises, so the consumer never waits on a dead reader
+        try:
+            for record in records:
+                pending.put(record)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            pending.put(_end_of_feed)
+
+    threading.Thread(target=pump, name="feed-reader", daemon=True).start()
+    batch, deadline = [], None
+    while True:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            record = pending.get(timeout=timeout)
+        except queue.Empty:
+            yield batch
+            batch, deadline = [], None
+            continue
+        if record is _end_of_feed:
+            if batch:
+                yield batch
+            if failure:
+                raise failure[0]
+            return
+        batch.append(record)
+        if deadline is None:
+            deadline = time.monotonic() + max_wait
+        if len(batch) >= batch_size:
+            yield batch
+            batch, deadline = [], None
+
+
+# --- Scoring ---
+class StreamScorer:
+    """Scores micro-batches, reusing one feature buffer, and tracks throughput and latency.
+
+    Batches go through ``validation`` (a ``ValidationStage``, by default one
+    against the scaler's training distribution) before the model.
+    """
+
+    def __init__(self, model, scaler, batch_size=512, temporal=None, horizon=0, validation=None):
+        self.model = model
+        self.validation = validation if validation is not None else ValidationStage(scaler, source="stream")
+        self.temporal = temporal
+        self.horizon = horizon
+        self.transform = compiled_transform(scaler)
+        self.buffer = self.transform.allocate(batch_size)
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def _features(self, readings):
+        n_rows = len(readings)
+        if n_rows > len(self.buffer):
+            self.buffer = self.transform.allocate(n_rows)
+        return self.transform.transform_frame(readings, out=self.buffer[:n_rows])
+
+    def _row_errors(self, readings):
+        """Per-row error message (or None) for missing or non-numeric raw values."""
+        required = raw_columns + (['time'] if self.temporal is not None else [])
+        return [error and error[1] for error in reading_errors(readings, required)]
+
+    def score_batch(self, batch):
+        start = time.perf_counter()
+        results = [{"error": record["_error"]} if "_error" in record else None for record in batch]
+        parsed = [i for i, record in enumerate(batch) if "_error" not in record]
+        if parsed:
+            readings = pd.DataFrame.from_records([batch[i] for i in parsed])
+            errors = self._row_errors(readings)
+            valid = [j for j, error in enumerate(errors) if error is None]
+            for j, error in enumerate(errors):
+                if error is not None:
+                    results[parsed[j]] = {"error": error}
+            if valid:
+                readings = readings.iloc[valid]
+                readings = readings.assign(**{
+                    col: pd.to_numeric(readings[col]) for col in raw_numeric_columns
+                })
+                X = self._features(readings)
+                flagged = self.validation.check(readings, X).flagged_messages()
+                if self.temporal is not None:
+                    X = np.hstack([X, self.temporal.update(readings)])
+                proba = predict_in_chunks(self.model, X)
+                for k, (j, result) in enumerate(zip(valid, format_predictions(proba))):
+                    if self.horizon:
+                        result["horizon_hours"] = self.horizon
+                    if k in flagged:
+                        result["warnings"] = flagged[k]
+                    results[parsed[j]] = result
+
+        for record, result in zip(batch, results):
+            for field in id_fields:
+                if field in record:
+                    result[field] = record[field]
+        self.errors += sum("error" in result for result in results)
+        self.rows += len(batch)
+        self.latency.add(time.perf_counter() - start)
+        return results
+
+    def score(self, batches):
+        for batch in batches:
+            yield from self.score_batch(batch)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "flagged": self.validation.flagged_rows,
+            "drift_windows": self.validation.monitor.windows,
+            "rows_per_sec": self.rows / elapsed if elapsed > 0 else 0.0,
+            "batch_latency": self.latency.summary(),
+        }
+
+
+def format_stats(stats):
+    latency = stats["batch_latency"]
+    return (f"{stats['rows']:,} rows ({stats['errors']} errors, {stats['flagged']} flagged), "
+            f"{stats['rows_per_sec']:,.0f} rows/s; "
+            f"batch latency p50 {latency['p50_ms']:.2f} ms, p95 {latency['p95_ms']:.2f} ms, "
+            f"p99 {latency['p99_ms']:.2f} ms over {latency['count']} batches")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a feed of readings in micro-batches.")
+    parser.add_argument("input", help="Input file, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output JSONL file, or '-' for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--max-wait", type=float, default=None,
+                        help="Flush a partial batch after this many seconds")
+    parser.add_argument("--engine", choices=["lightgbm", "native"], default="lightgbm")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="Seconds between progress reports on stderr")
+    parser.add_argument("--model", default="LightGBM.pkl")
+    parser.add_argument("--scaler", default="StandardScalar.pkl")
+    parser.add_argument("--artifact", default=None,
+                        help="Memory-mapped model artifact (python artifacts.py export) used instead of the pickles")
+    parser.add_argument("--temporal-spec", default=None,
+                        help="temporal_spec.json of a model trained with temporal features (train.py --temporal)")
+    parser.add_argument("--reference", default=None,
+                        help="Drift reference .npz (validation.py build-reference); default: the artifact's or the scaler's")
+    parser.add_argument("--drift-window", type=int, default=5_000, help="Rows per drift window")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    model, scaler = ModelRegistry(args.model, args.scaler, engine=args.engine, artifact_path=args.artifact).get()
+    temporal, horizon = None, 0
+    if args.temporal_spec:
+        from temporal_features import load_spec
+        temporal, horizon = load_spec(args.temporal_spec)
+    validation = ValidationStage(scaler, load_reference(scaler, args.reference, args.artifact),
+                                 window_rows=args.drift_window, source="stream")
+    scorer = StreamScorer(model, scaler, batch_size=args.batch_size, temporal=temporal, horizon=horizon,
+                          validation=validation)
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    last_report = time.monotonic()
+    try:
+        batches = micro_batches(read_records(source, fmt), args.batch_size, args.max_wait)
+        for batch in batches:
+            for result in scorer.score_batch(batch):
+                sink.write(json.dumps(result) + "\n")
+            sink.flush()
+            if time.monotonic() - last_report >= args.report_every:
+                print(format_stats(scorer.stats()), file=sys.stderr)
+                last_report = time.monotonic()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(format_stats(scorer.stats()), file=sys.stderr)
+    drift = scorer.validation.monitor.latest()
+    if drift is not None:
+        print("Drift over the last closed window:\n" + drift.to_string(float_format=lambda v: f"{v:.4f}"), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
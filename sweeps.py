@@ -0,0 +1,122 @@
+"""What-if sweeps: score one reading with one or two inputs varied over a grid.
+
+The grid is written straight into the raw numeric matrix and category codes
+that ``FeatureTransform.transform`` takes, so even a 200 x 200 sweep is one
+feature build and one ``predict_in_chunks`` call, with no per-row dicts.
+"""
+import numpy as np
+import pandas as pd
+
+from features import (
+    check_raw_columns, class_labels, compiled_transform, encode_categories, predict_in_chunks,
+    raw_numeric_columns, station_options, wind_options
+)
+
+# --- Sweepable Inputs ---
+# Raw column -> label used in the prediction view
+sweep_parameters = {
+    'PM10': 'PM10 (μg/m³)',
+    'SO2': 'SO₂ (μg/m³)',
+    'NO2': 'NO₂ (μg/m³)',
+    'CO': 'CO (μg/m³)',
+    'O3': 'O₃ (μg/m³)',
+    'PRES': 'Pressure (hPa)',
+    'temp_dewp_diff': 'Temp - Dew Point Diff (°C)',
+    'inverse_wind': 'Inverse Wind Speed (1/WSPM)',
+    'CO_NO2_ratio': 'CO / NO₂ Ratio',
+    'month': 'Month',
+    'is_night': 'Night Time?',
+    'Rain_Flag': 'Did it Rain?',
+    'station': 'Station',
+    'wd': 'Wind Direction',
+}
+
+# Default range for continuous inputs, roughly the spread seen in the Beijing data; every point passes validation.py
+sweep_ranges = {
+    'PM10': (0.0, 600.0),
+    'SO2': (0.0, 100.0),
+    'NO2': (0.0, 200.0),
+    'CO': (100.0, 5000.0),
+    'O3': (0.0, 300.0),
+    'PRES': (985.0, 1040.0),
+    'temp_dewp_diff': (0.0, 40.0),
+    'inverse_wind': (0.1, 5.0),
+    'CO_NO2_ratio': (0.0, 100.0),
+}
+
+# Inputs that only take a few values are swept over all of them
+discrete_values = {
+    'month': list(range(1, 13)),
+    'is_night': [0, 1],
+    'Rain_Flag': [0, 1],
+    'station': station_options,
+    'wd': wind_options,
+}
+
+
+def axis_values(parameter, n_points=50, low=None, high=None):
+    """Grid values for one input: ``n_points`` evenly spaced, or every option of a discrete input."""
+    if parameter in discrete_values:
+        return list(discrete_values[parameter])
+    if parameter not in sweep_ranges:
+        raise ValueError(f"Unknown sweep parameter '{parameter}'")
+    default_low, default_high = sweep_ranges[parameter]
+    return np.linspace(default_low if low is None else low, default_high if high is None else high, int(n_points))
+
+
+def sweep_matrix(base_reading, axes, scaler, out=None):
+    """Model input for every combination of ``axes`` values, other inputs taken from ``base_reading``.
+
+    ``axes`` is a list of one or two ``(parameter, values)`` pairs. The first
+    axis varies fastest, so the rows reshape to ``(len(y values), len(x values))``.
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("A sweep varies one or two inputs")
+    parameters = [parameter for parameter, _ in axes]
+    if len(set(parameters)) != len(parameters):
+        raise ValueError("Each input can only be swept along one axis")
+    unknown = [parameter for parameter in parameters if parameter not in sweep_parameters]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameter: {', '.join(unknown)}")
+    missing = [col for col in sweep_parameters if col not in base_reading]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    sizes = [len(values) for _, values in axes]
+    n_rows = int(np.prod(sizes))
+    index = np.unravel_index(np.arange(n_rows), sizes[::-1])[::-1]
+
+    raw_numeric = np.empty((n_rows, len(raw_numeric_columns)))
+    raw_numeric[:] = [base_reading[col] for col in raw_numeric_columns]
+    # 'N' has no column of its own, so it encodes to all zeros like an unknown direction
+    station_codes = np.repeat(encode_categories([base_reading['station']], station_options), n_rows)
+    wd_codes = np.repeat(encode_categories([base_reading['wd']], wind_options[1:]), n_rows)
+    for (parameter, values), idx in zip(axes, index):
+        if parameter == 'station':
+            station_codes = encode_categories(values, station_options)[idx]
+        elif parameter == 'wd':
+            wd_codes = encode_categories(values, wind_options[1:])[idx]
+        else:
+            raw_numeric[:, raw_numeric_columns.index(parameter)] = np.asarray(values, dtype=np.float64)[idx]
+    return compiled_transform(scaler).transform(raw_numeric, station_codes, wd_codes, out=out)
+
+
+def run_sweep(model, scaler, base_reading, axes, chunk_size=50_000):
+    """Class probabilities over the grid, shaped ``(len(y values), len(x values), n_classes)``.
+
+    For a single axis the shape is ``(len(x values), n_classes)``.
+    """
+    X = sweep_matrix(base_reading, axes, scaler)
+    proba = predict_in_chunks(model, X, chunk_size=chunk_size)
+    return proba.reshape(*[len(values) for _, values in axes][::-1], len(class_labels))
+
+
+def sweep_readings(base_reading, axes):
+    """The swept readings as a DataFrame, in the same row order as ``sweep_matrix``."""
+    sizes = [len(values) for _, values in axes]
+    index = np.unravel_index(np.arange(int(np.prod(sizes))), sizes[::-1])[::-1]
+    readings = pd.DataFrame({col: [base_reading[col]] * len(index[0]) for col in sweep_parameters})
+    for (parameter, values), idx in zip(axes, index):
+        readings[parameter] = np.asarray(values)[idx]
+    check_raw_columns(readings)
+    return readings
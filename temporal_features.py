@@ -0,0 +1,211 @@
+"""Rolling, lag and delta features of recent readings, kept per station and updated incrementally.
+
+    python temporal_features.py PRSA_Data_Dongsi_20130301-20170228.csv -o dongsi_temporal.parquet
+
+Each station keeps a buffer of its last ``capacity`` hours of the source
+pollutants (hours without a reading hold NaN), so memory per station is fixed
+whatever the length of the feed. ``update`` lays a batch of new readings out
+on an hourly timeline behind that buffer and computes every feature for all
+of its rows at once:
+
+* rolling mean over the last w hours, from prefix sums of values and counts;
+* rolling max over the last w hours, from prefix and suffix maxima of w-hour
+  blocks (van Herk / Gil-Werman), three comparisons per reading;
+* lag k, the value k hours earlier, and delta k, the current value minus it.
+
+So the cost per reading does not depend on the window lengths. Windows count
+hours, not readings: gaps leave NaN slots, and a gap longer than the buffer
+is shortened to it since nothing older is kept. A reading no newer than its
+station's latest one is late: its features are NaN and the state is unchanged.
+
+Training (``train.py --temporal``) replays the history through the same
+engine, so offline and streaming values are identical.
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+temporal_sources = ['PM10', 'SO2', 'NO2', 'CO', 'O3']
+default_windows = (3, 6, 24)
+default_lags = (1, 3)
+
+
+def sliding_max(values, window):
+    """Maximum of ``values[i - window + 1 : i + 1]`` along axis 0, for every ``i >= window - 1``."""
+    n_rows = len(values)
+    n_blocks = -(-n_rows // window)
+    padded = np.full((n_blocks * window,) + values.shape[1:], -np.inf)
+    padded[:n_rows] = values
+    blocks = padded.reshape((n_blocks, window) + values.shape[1:])
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(padded.shape)[:n_rows]
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+    result = np.full(values.shape, -np.inf)
+    # A window ending at i starts at i - window + 1: the suffix of its first block meets the prefix of its last
+    result[window - 1:] = np.maximum(suffix[:n_rows - window + 1], prefix[window - 1:])
+    return result
+
+
+def reading_hours(times):
+    """Hours since the epoch of each reading time (floored to the hour)."""
+    times = np.asarray(times)
+    if times.dtype.kind != 'M':
+        times = pd.to_datetime(times).to_numpy()
+    return times.astype('datetime64[h]').astype(np.int64)
+
+
+class TemporalFeatureEngine:
+    """Per-station fixed-size history of the ``sources`` columns and the window features built from it."""
+
+    def __init__(self, sources=temporal_sources, windows=default_windows, lags=default_lags):
+        self.sources = list(sources)
+        self.windows = tuple(sorted(int(w) for w in windows))
+        self.lags = tuple(sorted(int(k) for k in lags))
+        if min(self.windows + self.lags, default=1) < 1:
+            raise ValueError("Windows and lags must be at least one hour")
+        self.capacity = max(self.windows + tuple(k + 1 for k in self.lags))
+        self.stats = ([f'mean_{w}h' for w in self.windows] + [f'max_{w}h' for w in self.windows]
+                      + [f'lag_{k}h' for k in self.lags] + [f'delta_{k}h' for k in self.lags])
+        self.feature_names = [f'{source}_{stat}' for source in self.sources for stat in self.stats]
+        self.reset()
+
+    def reset(self):
+        self._state = {}  # station -> (hour of the latest reading, (capacity, n_sources) history)
+        self.late = 0
+
+    def spec(self):
+        return {'sources': self.sources, 'windows': list(self.windows), 'lags': list(self.lags)}
+
+    @classmethod
+    def from_spec(cls, spec):
+        return cls(spec['sources'], spec['windows'], spec['lags'])
+
+    def state_bytes(self):
+        """Memory held by the station histories: ``capacity * len(sources) * 8`` bytes per station."""
+        return sum(history.nbytes for _, history in self._state.values())
+
+    def update(self, readings):
+        """Features (n_rows x len(feature_names)) of new readings, in input order; advances each station's history.
+
+        ``readings`` needs ``station`` and ``time``; missing source columns count as NaN.
+        """
+        n_rows = len(readings)
+        out = np.full((n_rows, len(self.feature_names)), np.nan)
+        if not n_rows:
+            return out
+        hours = reading_hours(readings['time'])
+        codes, stations = pd.factorize(np.asarray(readings['station'], dtype=object))
+        stations = [str(station) for station in stations]
+        rows = np.lexsort((hours, codes))
+        hours, codes = hours[rows], codes[rows]
+        lasts = np.array([self._state[s][0] if s in self._state else np.iinfo(np.int64).min for s in stations])
+        # Hours already seen (or repeated within the batch) are late
+        fresh = (hours > lasts[codes]) & ((np.diff(codes, prepend=-1) != 0) | (np.diff(hours, prepend=0) != 0))
+        self.late += int(n_rows - fresh.sum())
+        if not fresh.any():
+            return out
+        rows, hours, codes = rows[fresh], hours[fresh], codes[fresh]
+
+        # Every station in the batch gets a segment of one timeline: its history, then its new hours
+        capacity = self.capacity
+        first = np.diff(codes, prepend=-1) != 0
+        segment = np.cumsum(first) - 1
+        previous = np.where(first, np.maximum(lasts[codes], hours - capacity), np.roll(hours, 1))
+        steps = np.minimum(hours - previous, capacity)
+        offsets = np.cumsum(steps)
+        offsets -= (offsets - steps)[first][segment]
+        lengths = capacity + offsets[np.r_[np.flatnonzero(first)[1:] - 1, len(hours) - 1]]
+        starts = np.cumsum(lengths) - lengths
+        positions = starts[segment] + capacity - 1 + offsets
+
+        timeline = np.full((lengths.sum(), len(self.sources)), np.nan)
+        segment_stations = [stations[code] for code in codes[first]]
+        for station, start in zip(segment_stations, starts):
+            if station in self._state:
+                timeline[start:start + capacity] = self._state[station][1]
+        for j, source in enumerate(self.sources):
+            if source in readings:
+                timeline[positions, j] = readings[source].to_numpy(dtype=np.float64)[rows]
+        out[rows] = self._features(timeline, positions)
+        latest = hours[np.r_[np.flatnonzero(first)[1:] - 1, len(hours) - 1]]
+        for station, end, hour in zip(segment_stations, starts + lengths, latest):
+            self._state[station] = (int(hour), timeline[end - capacity:end].copy())
+        return out
+
+    def _features(self, timeline, positions):
+        present = ~np.isnan(timeline)
+        sums = np.zeros((len(timeline) + 1, timeline.shape[1]))
+        counts = np.zeros_like(sums)
+        np.cumsum(np.where(present, timeline, 0.0), axis=0, out=sums[1:])
+        np.cumsum(present, axis=0, out=counts[1:])
+        maxable = np.where(present, timeline, -np.inf)
+        end = positions + 1
+
+        blocks = []
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for w in self.windows:
+                blocks.append((sums[end] - sums[end - w]) / (counts[end] - counts[end - w]))
+            for w in self.windows:
+                blocks.append(sliding_max(maxable, w)[positions])
+            current = timeline[positions]
+            for k in self.lags:
+                blocks.append(timeline[positions - k])
+            for k in self.lags:
+                blocks.append(current - timeline[positions - k])
+        stacked = np.stack(blocks, axis=2)  # (rows, sources, stats), the feature_names order
+        stacked[np.isinf(stacked)] = np.nan
+        return stacked.reshape(len(positions), -1)
+
+
+def temporal_matrix(readings, engine=None):
+    """The features of a whole history, replayed through a fresh engine (or ``engine``'s spec)."""
+    engine = TemporalFeatureEngine() if engine is None else TemporalFeatureEngine.from_spec(engine.spec())
+    return engine.update(readings)
+
+
+def lead(readings, column, hours):
+    """``column`` of the same station ``hours`` later (NaN when there is no such reading): forecast targets."""
+    when = reading_hours(readings['time'])
+    keys = pd.MultiIndex.from_arrays([readings['station'].astype(str).to_numpy(), when])
+    later = pd.Series(readings[column].to_numpy(dtype=np.float64), index=keys)
+    later = later[~later.index.duplicated(keep='last')]
+    target = pd.MultiIndex.from_arrays([readings['station'].astype(str).to_numpy(), when + int(hours)])
+    return later.reindex(target).to_numpy()
+
+
+def load_spec(path):
+    with open(path) as f:
+        spec = json.load(f)
+    return TemporalFeatureEngine.from_spec(spec), int(spec.get('horizon', 0))
+
+
+def save_spec(engine, path, horizon=0):
+    with open(path, "w") as f:
+        json.dump({**engine.spec(), 'horizon': int(horizon)}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the temporal features of a readings history.")
+    parser.add_argument("files", nargs="+", help="PRSA station files, or readings files with a 'time' column")
+    parser.add_argument("--windows", type=int, nargs="+", default=list(default_windows))
+    parser.add_argument("--lags", type=int, nargs="+", default=list(default_lags))
+    parser.add_argument("-o", "--output", required=True, help="Output CSV or Parquet file")
+    args = parser.parse_args()
+
+    from features import prsa_to_readings, read_readings
+    frames = [read_readings(path) for path in args.files]
+    readings = pd.concat([prsa_to_readings(f) if 'hour' in f.columns else f for f in frames], ignore_index=True)
+    engine = TemporalFeatureEngine(windows=args.windows, lags=args.lags)
+    features = pd.DataFrame(engine.update(readings), columns=engine.feature_names)
+    result = pd.concat([readings[['time', 'station']], features], axis=1)
+    if args.output.lower().endswith(('.parquet', '.pq')):
+        result.to_parquet(args.output, index=False)
+    else:
+        result.to_csv(args.output, index=False)
+    print(f"{len(result):,} rows x {len(engine.feature_names)} temporal features; "
+          f"{engine.state_bytes() // max(len(engine._state), 1):,} bytes of history per station")
+
+
+if __name__ == "__main__":
+    main()
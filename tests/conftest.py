@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def model_and_scaler():
+    from model_registry import load_model_and_scaler
+    return load_model_and_scaler()
+
+
+@pytest.fixture(scope="session")
+def readings():
+    from benchmarks.common import synthetic_readings
+    return synthetic_readings(500, seed=1)
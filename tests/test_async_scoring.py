@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from async_scoring import AsyncScorer
+from features import InvalidReadings
+
+
+class GatedModel:
+    """Wraps a model: records each call's rows and the peak number of concurrent calls, and holds every call
+    until ``gate`` is set (optionally sleeping ``delays[i]`` seconds in the i-th call)."""
+
+    def __init__(self, model, delays=()):
+        self.model = model
+        self.gate = threading.Event()
+        self.delays = list(delays)
+        self.calls = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def predict_proba(self, X):
+        with self._lock:
+            call = len(self.calls)
+            self.calls.append(len(X))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            self.gate.wait(5)
+            if call < len(self.delays):
+                time.sleep(self.delays[call])
+            return self.model.predict_proba(X)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+async def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+def records(readings):
+    return readings.to_dict("records")
+
+
+def test_semaphore_bounds_requests_in_flight(model_and_scaler, records):
+    model, scaler = model_and_scaler
+    gated = GatedModel(model)
+
+    async def run():
+        async with AsyncScorer(gated, scaler, workers=8, max_in_flight=2, batch_wait_ms=0) as scorer:
+            tasks = [asyncio.ensure_future(scorer.predict_batch(records[i:i + 1])) for i in range(10)]
+            await until(lambda: len(gated.calls) == 2)
+            await asyncio.sleep(0.05)
+            assert scorer.in_flight == 2 and len(gated.calls) == 2
+            gated.gate.set()
+            await asyncio.gather(*tasks)
+            assert scorer.completed == 10 and scorer.in_flight == 0
+        return gated.peak
+
+    assert asyncio.run(run()) == 2
+
+
+def test_cancellation_releases_its_slot(model_and_scaler, records):
+    model, scaler = model_and_scaler
+    gated = GatedModel(model)
+
+    async def run():
+        async with AsyncScorer(gated, scaler, workers=2, max_in_flight=1, batch_wait_ms=0) as scorer:
+            first = asyncio.ensure_future(scorer.predict_batch(records[:1]))
+            await until(lambda: scorer.in_flight == 1)
+            second = asyncio.ensure_future(scorer.predict_batch(records[1:2]))
+            await asyncio.sleep(0.05)
+            assert len(gated.calls) == 1  # the second request waits for the only slot
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            # The slot is free before the cancelled call's model work has finished
+            await until(lambda: len(gated.calls) == 2)
+            gated.gate.set()
+            result = await second
+            assert len(result) == 1
+            assert scorer.cancelled == 1 and scorer.completed == 1 and scorer.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_concurrent_single_predictions_are_coalesced(model_and_scaler, records):
+    model, scaler = model_and_scaler
+    gated = GatedModel(model)
+
+    async def run():
+        async with AsyncScorer(gated, scaler, workers=2, max_in_flight=64, batch_wait_ms=50) as scorer:
+            tasks = [asyncio.ensure_future(scorer.predict(record)) for record in records[:16]]
+            # The first reading is scored on its own; the other 15 queue behind it while the model is busy
+            await until(lambda: scorer.stats()["batcher"]["pending"] == 15)
+            gated.gate.set()
+            results = await asyncio.gather(*tasks)
+            expected = await scorer.predict_batch(records[:16])
+        return results, expected
+
+    results, expected = asyncio.run(run())
+    assert gated.calls[:2] == [1, 15]
+    assert results == expected
+
+
+def test_stream_keeps_input_order_with_prefetch(model_and_scaler, records):
+    model, scaler = model_and_scaler
+    # Earlier batches take longer, so with prefetch they finish after later ones
+    gated = GatedModel(model, delays=[0.2, 0.15, 0.1, 0.05])
+    gated.gate.set()
+
+    async def run():
+        async with AsyncScorer(gated, scaler, workers=4, max_in_flight=8, batch_wait_ms=0) as scorer:
+            expected = await scorer.predict_batch(records[:40])
+            gated.calls.clear()
+            gated.peak = 0
+            streamed = [result async for result in scorer.stream(records[:40], batch_size=10, prefetch=4)]
+        return expected, streamed
+
+    expected, streamed = asyncio.run(run())
+    assert streamed == expected
+    assert gated.calls == [10, 10, 10, 10] and gated.peak > 1
+
+
+def test_unscorable_readings_are_rejected(model_and_scaler, records):
+    model, scaler = model_and_scaler
+
+    async def run():
+        async with AsyncScorer(model, scaler, batch_wait_ms=0) as scorer:
+            with pytest.raises(InvalidReadings) as single:
+                await scorer.predict({**records[0], "station": "Nowhere"})
+            with pytest.raises(InvalidReadings) as batch:
+                await scorer.predict_batch([records[0], {**records[1], "PM10": None}])
+        return single.value, batch.value
+
+    single, batch = asyncio.run(run())
+    assert single.body(single=True)["field"] == "station"
+    assert [(i, field) for i, (field, _) in batch.problems] == [(1, "PM10")]
@@ -0,0 +1,68 @@
+import lightgbm
+import numpy as np
+import pytest
+
+from features import build_feature_matrix
+from tree_engine import TreeEnsemble
+
+tolerance = 1e-9
+
+
+def _rows(X):
+    """Dense rows, rows with NaN in a few features and rows with zeros in the same features."""
+    with_nan, with_zero = X.copy(), X.copy()
+    columns = [0, X.shape[1] // 2, X.shape[1] - 1]
+    with_nan[::3, columns] = np.nan
+    with_zero[::3, columns] = 0.0
+    return {"dense": X, "nan": with_nan, "zero": with_zero}
+
+
+def _fitted(zero_as_missing, num_class=3, seed=0):
+    """A small LightGBM model trained on data with missing values, so its splits carry missing rules."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(2_000, 6))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int) + (X[:, 2] > 1).astype(int) if num_class == 3 else (X[:, 0] > 0).astype(int)
+    X[rng.random(X.shape) < 0.1] = 0.0 if zero_as_missing else np.nan
+    model = lightgbm.LGBMClassifier(n_estimators=30, num_leaves=15, zero_as_missing=zero_as_missing, verbose=-1)
+    return model.fit(X, y), X
+
+
+@pytest.fixture(scope="module")
+def shipped(model_and_scaler, readings):
+    model, scaler = model_and_scaler
+    return model, TreeEnsemble.from_booster(model), build_feature_matrix(readings, scaler)
+
+
+@pytest.mark.parametrize("rows", ["dense", "nan", "zero"])
+def test_shipped_model_matches_lightgbm(shipped, rows):
+    model, engine, X = shipped
+    X = _rows(X)[rows]
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=tolerance)
+    np.testing.assert_allclose(engine.predict_raw(X), model.predict_proba(X, raw_score=True), rtol=0, atol=tolerance)
+    for i in range(5):
+        np.testing.assert_allclose(engine.predict_proba(X[i]), model.predict_proba(X[i:i + 1]), rtol=0, atol=tolerance)
+
+
+@pytest.mark.parametrize("zero_as_missing", [False, True])
+@pytest.mark.parametrize("num_class", [2, 3])
+@pytest.mark.parametrize("rows", ["dense", "nan", "zero"])
+def test_missing_value_rules_match_lightgbm(zero_as_missing, num_class, rows):
+    model, X = _fitted(zero_as_missing, num_class)
+    engine = TreeEnsemble.from_booster(model)
+    X = _rows(X[:300])[rows]
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=tolerance)
+    np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+
+
+@pytest.mark.parametrize("rows", ["dense", "nan", "zero"])
+def test_contributions_sum_to_raw_score(shipped, rows):
+    _, engine, X = shipped
+    X = _rows(X)[rows]
+    contrib = engine.predict_contrib(X).reshape(len(X), engine.num_class, X.shape[1] + 1)
+    np.testing.assert_allclose(contrib.sum(axis=2), engine.predict_raw(X), rtol=0, atol=1e-9)
+
+
+def test_round_trip_through_arrays(shipped):
+    _, engine, X = shipped
+    copy = TreeEnsemble.from_arrays(engine.to_arrays(), engine.metadata())
+    np.testing.assert_array_equal(copy.predict_proba(X), engine.predict_proba(X))
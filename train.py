@@ -0,0 +1,413 @@
+"""Offline training pipeline: PRSA station files to the model, scaler and figures the app ships.
+
+    python train.py PRSA_Data_*_20130301-20170228.csv --trials 30 --folds 5 --workers 8 -o training_output
+    python train.py --history history --trials 0 -o training_output
+    python train.py PRSA_Data_*.csv --temporal --horizon 3 -o forecast_output   # level in 3 hours
+
+Stages, each timed and reported:
+
+1. ``load``: read the station files (or a history store, see history_store.py)
+   and convert them with ``features.prsa_to_readings``, keeping the stations
+   the model encodes.
+2. ``features``: the unscaled matrix in ``final_feature_names`` order and the
+   PM2.5-level labels of the complete rows. ``--temporal`` appends the rolling,
+   lag and delta columns of temporal_features.py (computed over every reading,
+   complete or not), and ``--horizon H`` labels each row with the level H
+   hours later instead (adding past PM2.5 to the temporal sources). Cached in ``.train_cache/<hash of the inputs>/`` as
+   ``.npy`` files, so later runs skip both stages and workers map the file
+   instead of receiving the matrix.
+3. ``split``: stratified hold-out test rows; the scaler is fitted on the
+   training rows only. With ``--temporal`` or ``--horizon`` neighbouring hours
+   share windows and labels, so the split follows time instead: the test set
+   is the last ``--test-size`` of the hours, the CV folds are contiguous
+   blocks of time, and training rows within the window length plus the
+   horizon of a test or validation block are left out.
+4. ``search``: random search over LightGBM parameters (trial 0 is the shipped
+   configuration). Every trial is k-fold CV with early stopping; the
+   (trial, fold) fits run in a process pool, and each worker bins every fold's
+   ``lightgbm.Dataset`` once and reuses it for all trials.
+5. ``fit``: the final classifier on all training rows with the best
+   parameters and their mean early-stopped iteration count.
+6. ``evaluate`` and ``write``: hold-out metrics, then ``LightGBM.pkl``,
+   ``StandardScalar.pkl``, ``confusion_matrix.png``, ``feature_importance.png``,
+   a drift reference (``reference.npz``, see validation.py) and
+   ``training_report.json`` in the output directory. Copy them over the
+   shipped files (or export an artifact) to deploy. Temporal models also get
+   ``temporal_spec.json`` and are served by ``stream_scorer.py --temporal-spec``.
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing as mp
+import os
+import pickle
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from aggregates import levels
+from features import (
+    FeatureTransform, class_labels, final_feature_names, numeric_features, prsa_to_readings, raw_columns,
+    read_readings, station_options
+)
+from history_store import level_codes
+from temporal_features import (
+    TemporalFeatureEngine, lead, reading_hours, save_spec, temporal_matrix, temporal_sources
+)
+
+cache_root = ".train_cache"
+_n_base = len(final_feature_names)
+_n_cat = _n_base - len(numeric_features)
+# Label of each PM2.5 level as a model class index (class_labels order)
+_level_to_class = np.array([class_labels.index(level) for level in levels])
+
+# The shipped model's configuration; always evaluated as trial 0
+baseline_params = {
+    'num_leaves': 31, 'max_depth': 6, 'learning_rate': 0.05, 'min_child_samples': 20, 'reg_lambda': 0.1,
+    'colsample_bytree': 1.0, 'subsample': 1.0, 'subsample_freq': 0,
+}
+_train_params = {'objective': 'multiclass', 'num_class': len(class_labels), 'metric': 'multi_logloss',
+                 'verbosity': -1, 'num_threads': 1}
+# Binning is fixed when a Dataset is built; without pre-filtering, trials may change min_child_samples freely
+_dataset_params = {'max_bin': 255, 'feature_pre_filter': False, 'verbosity': -1}
+
+
+class StageTimer:
+    """Wall time of each named stage, printed as it finishes."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        yield
+        self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+        print(f"[{name}] {self.seconds[name]:.2f}s", flush=True)
+
+
+def sample_params(rng):
+    subsample = round(float(rng.uniform(0.6, 1.0)), 2)
+    return {
+        'num_leaves': int(rng.choice([15, 31, 63, 127])),
+        'max_depth': int(rng.choice([-1, 4, 6, 8, 10])),
+        'learning_rate': round(float(np.exp(rng.uniform(np.log(0.02), np.log(0.2)))), 4),
+        'min_child_samples': int(rng.choice([10, 20, 50, 100])),
+        'reg_lambda': round(float(np.exp(rng.uniform(np.log(1e-3), np.log(10.0)))), 4),
+        'colsample_bytree': round(float(rng.uniform(0.6, 1.0)), 2),
+        'subsample': subsample,
+        'subsample_freq': 1 if subsample < 1.0 else 0,
+    }
+
+
+# --- Data ---
+def load_readings(files=(), history=None, stations=station_options):
+    """Readings of ``stations`` with their time, from PRSA files and/or a history store."""
+    frames = [prsa_to_readings(read_readings(path)) for path in files]
+    if history:
+        from history_store import HistoryStore
+        frames.append(HistoryStore(history).query(stations=stations, columns=['PM2.5'] + raw_columns))
+    if not frames:
+        raise ValueError("Pass PRSA station files or --history")
+    readings = pd.concat(frames, ignore_index=True)
+    return readings[readings['station'].isin(stations)].reset_index(drop=True)
+
+
+def input_key(files, history, stations, options=None):
+    """Hash of everything the cached matrix depends on: input files, stations, feature layout and ``options``."""
+    digest = hashlib.sha256(json.dumps([final_feature_names, list(stations), options]).encode())
+    sources = list(files) + ([os.path.join(history, "index.json")] if history else [])
+    for path in sorted(sources):
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def build_training_matrix(readings, temporal=None, horizon=0):
+    """Unscaled features (log1p applied, mean 0 / scale 1) in model order, class labels and reading hours.
+
+    Rows without every raw input or without a label are left out, after the
+    temporal features have seen them.
+    """
+    identity = FeatureTransform(np.zeros(len(numeric_features)), np.ones(len(numeric_features)))
+    X = identity.transform_frame(readings)
+    target = lead(readings, 'PM2.5', horizon) if horizon else readings['PM2.5'].to_numpy(dtype=np.float64)
+    keep = readings[raw_columns].notna().all(axis=1).to_numpy() & ~np.isnan(target)
+    if temporal is not None:
+        X = np.hstack([X, temporal_matrix(readings, temporal)])
+    return X[keep], _level_to_class[level_codes(target[keep])], reading_hours(readings['time'])[keep]
+
+
+def cached_matrix(key, build):
+    """``(X, y, hours)`` from the cache (X memory-mapped), building and saving them on a miss."""
+    directory = os.path.join(cache_root, key)
+    names = ("X", "y", "hours")
+    # hours.npy is written last, so its presence marks a complete entry
+    if not os.path.exists(os.path.join(directory, "hours.npy")):
+        arrays = build()
+        os.makedirs(directory, exist_ok=True)
+        for name, array in zip(names, arrays):
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+    return (directory, np.load(os.path.join(directory, "X.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "y.npy")), np.load(os.path.join(directory, "hours.npy")))
+
+
+def scale_numeric(X, mean, scale):
+    """Scale the snapshot numeric block in place; temporal columns stay in raw units."""
+    X[:, _n_cat:_n_base] -= mean
+    X[:, _n_cat:_n_base] /= scale
+    return X
+
+
+def stratified_folds(y, n_folds, rng):
+    """(training rows, validation rows) of ``n_folds`` folds with the class mix of ``y``."""
+    folds = [[] for _ in range(n_folds)]
+    for label in np.unique(y):
+        rows = rng.permutation(np.flatnonzero(y == label))
+        for fold, part in enumerate(np.array_split(rows, n_folds)):
+            folds[fold].append(part)
+    folds = [np.sort(np.concatenate(parts)) for parts in folds]
+    return [(np.concatenate(folds[:i] + folds[i + 1:]), valid) for i, valid in enumerate(folds)]
+
+
+def stratified_holdout(y, test_size, rng):
+    """Sorted row indices of a hold-out set taking ``ceil(test_size * n)`` rows of each class."""
+    if not 0 < test_size < 1:
+        raise ValueError(f"test_size must be between 0 and 1, got {test_size}")
+    parts = []
+    for label in np.unique(y):
+        rows = rng.permutation(np.flatnonzero(y == label))
+        parts.append(rows[:math.ceil(test_size * len(rows))])
+    return np.sort(np.concatenate(parts))
+
+
+def time_holdout(hours, test_size, gap):
+    """(training rows, test rows): the last ``test_size`` of the readings by hour are the test set, and training
+    stops ``gap`` hours before it."""
+    if not 0 < test_size < 1:
+        raise ValueError(f"test_size must be between 0 and 1, got {test_size}")
+    cutoff = np.sort(hours)[int(len(hours) * (1 - test_size))]
+    return np.flatnonzero(hours < cutoff - gap), np.flatnonzero(hours >= cutoff)
+
+
+def time_folds(hours, n_folds, gap):
+    """(training rows, validation rows) of ``n_folds`` contiguous blocks of hours, without the training rows
+    within ``gap`` hours of the validation block on either side."""
+    edges = np.quantile(hours, np.linspace(0, 1, n_folds + 1))
+    block = np.clip(np.searchsorted(edges, hours, side='right') - 1, 0, n_folds - 1)
+    folds = []
+    for fold in range(n_folds):
+        valid = block == fold
+        if not valid.any():
+            raise ValueError(f"Too few distinct hours for {n_folds} time-ordered folds")
+        start, end = hours[valid].min(), hours[valid].max()
+        train = ~valid & ((hours < start - gap) | (hours > end + gap))
+        folds.append((np.flatnonzero(train), np.flatnonzero(valid)))
+    return folds
+
+
+# --- Cross-Validation Workers ---
+_worker = {}
+
+
+def _init_worker(cache_dir, train_rows, folds, mean, scale):
+    X = np.load(os.path.join(cache_dir, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(cache_dir, "y.npy"))
+    _worker.update(X=scale_numeric(np.array(X[train_rows]), mean, scale), y=y[train_rows], folds=folds, datasets={})
+
+
+def _fold_data(fold):
+    """(train Dataset, validation Dataset, validation rows) of one fold, binned on first use and kept for later trials."""
+    if fold not in _worker['datasets']:
+        import lightgbm
+        train_rows, valid_rows = _worker['folds'][fold]
+        X, y = _worker['X'], _worker['y']
+        train = lightgbm.Dataset(X[train_rows], y[train_rows], params=_dataset_params).construct()
+        valid = lightgbm.Dataset(X[valid_rows], y[valid_rows], reference=train, params=_dataset_params).construct()
+        _worker['datasets'][fold] = (train, valid, valid_rows)
+    return _worker['datasets'][fold]
+
+
+def _run_fold(task):
+    import lightgbm
+    trial, fold, params, max_rounds, patience = task
+    start = time.perf_counter()
+    train, valid, valid_rows = _fold_data(fold)
+    booster = lightgbm.train({**_train_params, **params}, train, num_boost_round=max_rounds, valid_sets=[valid],
+                             callbacks=[lightgbm.early_stopping(patience, verbose=False)])
+    proba = booster.predict(_worker['X'][valid_rows], num_iteration=booster.best_iteration)
+    return {
+        'trial': trial, 'fold': fold, 'best_iteration': booster.best_iteration,
+        'logloss': booster.best_score['valid_0']['multi_logloss'],
+        'accuracy': float(np.mean(proba.argmax(axis=1) == _worker['y'][valid_rows])),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def cross_validate(cache_dir, train_rows, folds, mean, scale, trials, workers, max_rounds, patience):
+    """Mean CV log loss, accuracy and best iteration of every parameter set in ``trials``."""
+    tasks = [(trial, fold, params, max_rounds, patience) for trial, params in enumerate(trials)
+             for fold in range(len(folds))]
+    initargs = (cache_dir, train_rows, folds, mean, scale)
+    if workers <= 1:
+        _init_worker(*initargs)
+        results = [_run_fold(task) for task in tasks]
+    else:
+        # spawn rather than fork: forking after OpenMP has started in the parent can deadlock
+        with mp.get_context("spawn").Pool(processes=workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.imap_unordered(_run_fold, tasks))
+    frame = pd.DataFrame(results)
+    summary = frame.groupby('trial').agg(
+        logloss=('logloss', 'mean'), accuracy=('accuracy', 'mean'),
+        best_iteration=('best_iteration', 'mean'), fit_seconds=('seconds', 'sum'))
+    summary['params'] = [trials[trial] for trial in summary.index]
+    return summary.sort_values('logloss')
+
+
+# --- Outputs ---
+def save_confusion_matrix(confusion, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(6, 5))
+    ax.imshow(confusion, cmap="Blues")
+    for (i, j), count in np.ndenumerate(confusion):
+        ax.text(j, i, f"{count:,}", ha="center", va="center",
+                color="white" if count > confusion.max() / 2 else "black")
+    ax.set_xticks(range(len(class_labels)), class_labels)
+    ax.set_yticks(range(len(class_labels)), class_labels)
+    ax.set_xlabel("Predicted level")
+    ax.set_ylabel("Actual level")
+    ax.set_title("Confusion Matrix - LightGBM (Test Data)")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def save_feature_importance(model, path, feature_names, top=20):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    gain = pd.Series(model.booster_.feature_importance(importance_type='gain'), index=feature_names)
+    gain = gain.sort_values().tail(top)
+    fig, ax = plt.subplots(figsize=(8, 7))
+    ax.barh(gain.index, gain.to_numpy())
+    ax.set_xlabel("Total split gain")
+    ax.set_title(f"Top {top} Features - LightGBM")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the model and scaler from raw station data.")
+    parser.add_argument("files", nargs="*", help="PRSA station CSV/Parquet files")
+    parser.add_argument("--history", default=None, help="Read the readings from a history store instead")
+    parser.add_argument("--stations", nargs="+", default=station_options)
+    parser.add_argument("--trials", type=int, default=20, help="Random parameter sets tried after the baseline")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--max-rounds", type=int, default=2000)
+    parser.add_argument("--early-stopping", type=int, default=50, help="Rounds without improvement before stopping")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--temporal", action="store_true",
+                        help="Add per-station rolling/lag/delta features (temporal_features.py)")
+    parser.add_argument("--horizon", type=int, default=0, help="Predict the level this many hours ahead")
+    parser.add_argument("-o", "--output-dir", default="training_output")
+    args = parser.parse_args()
+
+    import lightgbm
+    from sklearn.metrics import classification_report, confusion_matrix
+    from sklearn.preprocessing import StandardScaler
+
+    timer = StageTimer()
+    rng = np.random.default_rng(args.seed)
+    total_start = time.perf_counter()
+
+    temporal = None
+    if args.temporal:
+        temporal = TemporalFeatureEngine(temporal_sources + (['PM2.5'] if args.horizon else []))
+    feature_names = final_feature_names + (temporal.feature_names if temporal else [])
+    options = {'temporal': temporal.spec() if temporal else None, 'horizon': args.horizon}
+
+    def build():
+        with timer("load"):
+            readings = load_readings(args.files, args.history, args.stations)
+        with timer("features"):
+            return build_training_matrix(readings, temporal, args.horizon)
+
+    cache_dir, X, y, hours = cached_matrix(input_key(args.files, args.history, args.stations, options), build)
+    if "features" not in timer.seconds:
+        print(f"Feature matrix from {cache_dir}")
+    print(f"{len(y):,} rows, {X.shape[1]} features; levels "
+          + ", ".join(f"{label} {np.mean(y == i):.1%}" for i, label in enumerate(class_labels)))
+
+    # Hours whose windows or labels reach into another row's: the history kept per station plus the horizon
+    gap = (temporal.capacity if temporal else 0) + args.horizon
+    split = "time" if gap else "stratified"
+    with timer("split"):
+        if split == "time":
+            train_rows, test_rows = time_holdout(hours, args.test_size, gap)
+            folds = time_folds(hours[train_rows], args.folds, gap)
+        else:
+            test_mask = np.zeros(len(y), dtype=bool)
+            test_mask[stratified_holdout(y, args.test_size, rng)] = True
+            train_rows, test_rows = np.flatnonzero(~test_mask), np.flatnonzero(test_mask)
+            folds = stratified_folds(y[train_rows], args.folds, rng)
+        scaler = StandardScaler().fit(pd.DataFrame(X[train_rows, _n_cat:_n_base], columns=numeric_features))
+    if split == "time":
+        print(f"time-ordered split: test from {np.datetime64(int(hours[test_rows].min()), 'h')}, "
+              f"{gap}h gaps around test and validation blocks")
+
+    with timer("search"):
+        trials = [baseline_params] + [sample_params(rng) for _ in range(args.trials)]
+        summary = cross_validate(cache_dir, train_rows, folds, scaler.mean_, scaler.scale_, trials,
+                                 args.workers, args.max_rounds, args.early_stopping)
+    best = summary.iloc[0]
+    print(summary[['logloss', 'accuracy', 'best_iteration', 'fit_seconds']].head(5).round(4).to_string())
+
+    with timer("fit"):
+        X_train = scale_numeric(np.array(X[train_rows]), scaler.mean_, scaler.scale_)
+        model = lightgbm.LGBMClassifier(**best['params'], n_estimators=max(int(round(best['best_iteration'])), 1),
+                                        random_state=args.seed, verbose=-1)
+        model.fit(pd.DataFrame(X_train, columns=feature_names), y[train_rows])
+
+    with timer("evaluate"):
+        X_test = scale_numeric(np.array(X[test_rows]), scaler.mean_, scaler.scale_)
+        predicted = model.predict_proba(pd.DataFrame(X_test, columns=feature_names)).argmax(axis=1)
+        confusion = confusion_matrix(y[test_rows], predicted, labels=range(len(class_labels)))
+        report = classification_report(y[test_rows], predicted, target_names=class_labels, output_dict=True)
+    print(f"hold-out accuracy {report['accuracy']:.2%}, macro F1 {report['macro avg']['f1-score']:.3f}")
+
+    with timer("write"):
+        from validation import DriftReference
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(os.path.join(args.output_dir, "LightGBM.pkl"), "wb") as f:
+            pickle.dump(model, f)
+        with open(os.path.join(args.output_dir, "StandardScalar.pkl"), "wb") as f:
+            pickle.dump(scaler, f)
+        save_confusion_matrix(confusion, os.path.join(args.output_dir, "confusion_matrix.png"))
+        save_feature_importance(model, os.path.join(args.output_dir, "feature_importance.png"), feature_names)
+        DriftReference.from_matrix(X_train[:, :_n_base]).save(os.path.join(args.output_dir, "reference.npz"))
+        if temporal is not None:
+            save_spec(temporal, os.path.join(args.output_dir, "temporal_spec.json"), args.horizon)
+
+    timer.seconds["total"] = time.perf_counter() - total_start
+    with open(os.path.join(args.output_dir, "training_report.json"), "w") as f:
+        json.dump({
+            "rows": {"train": len(train_rows), "test": len(test_rows)}, "split": split, "gap_hours": gap, **options,
+            "best_params": best['params'], "n_estimators": model.n_estimators,
+            "cv": summary.drop(columns='params').reset_index().to_dict(orient="records"),
+            "test": {"accuracy": report['accuracy'], "confusion_matrix": confusion.tolist(), "report": report},
+            "stage_seconds": timer.seconds, "workers": args.workers,
+        }, f, indent=2, default=float)
+    print("\nstage seconds: " + ", ".join(f"{name} {seconds:.2f}" for name, seconds in timer.seconds.items()))
+    print(f"Wrote the model, scaler, figures and report to {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
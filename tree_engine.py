@@ -0,0 +1,264 @@
+"""Pure-NumPy evaluator for LightGBM tree ensembles.
+
+The trees of a fitted booster are flattened into one set of node arrays
+(split feature, threshold, left/right child, leaf value, missing-value rule).
+Leaves point to themselves, so every row can be pushed down every tree for a
+fixed number of steps without checking which rows have already finished.
+Only ``lightgbm`` is needed to compile a model; evaluating it needs NumPy alone.
+"""
+from collections import deque
+
+import numpy as np
+
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_missing_types = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+_zero_threshold = 1e-35  # LightGBM's kZeroThreshold
+
+array_names = [
+    'split_feature', 'threshold', 'left_child', 'right_child', 'leaf_value', 'node_value',
+    'default_left', 'missing_type', 'roots', 'tree_class'
+]
+
+
+class TreeEnsemble:
+    """Flat, array-backed copy of a LightGBM model with a ``predict_proba`` API."""
+
+    def __init__(self, split_feature, threshold, left_child, right_child, leaf_value, node_value,
+                 default_left, missing_type, roots, tree_class,
+                 num_class, objective='multiclass', sigmoid=1.0, classes=None, feature_names=None):
+        self.split_feature = np.asarray(split_feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold)
+        self.left_child = np.asarray(left_child, dtype=np.int32)
+        self.right_child = np.asarray(right_child, dtype=np.int32)
+        self.leaf_value = np.asarray(leaf_value)
+        # Output of every node (the cover-weighted mean of its leaves), used for contributions
+        self.node_value = np.asarray(node_value)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing_type = np.asarray(missing_type, dtype=np.uint8)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.tree_class = np.asarray(tree_class, dtype=np.int32)
+        self.num_class = int(num_class)
+        self.objective = objective
+        self.sigmoid = float(sigmoid)
+        self.classes_ = np.arange(max(self.num_class, 2)) if classes is None else np.asarray(classes)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+
+        if self.objective not in ('multiclass', 'binary'):
+            raise ValueError(f"Unsupported objective for native evaluation: '{self.objective}'")
+
+        # Leaves carry feature -1; index column 0 instead, their children are themselves anyway
+        self._gather_feature = np.maximum(self.split_feature, 0)
+        self._plain_missing = not np.any(self.missing_type != MISSING_NONE)
+        internal = self.split_feature >= 0
+        # Fast path: the next node is left_child + (x > threshold), which needs
+        # paired children and leaves that never move (threshold +inf)
+        self._paired = bool(
+            np.all(self.right_child[internal] == self.left_child[internal] + 1)
+            and np.all(self.threshold[~internal] == np.inf)
+        )
+        self._class_matrix = np.zeros((len(self.roots), self.num_class))
+        self._class_matrix[np.arange(len(self.roots)), self.tree_class] = 1.0
+        self.max_depth = self._max_depth()
+
+    # --- Construction ---
+    @classmethod
+    def from_booster(cls, model):
+        """Compile an ``LGBMClassifier`` or ``lightgbm.Booster``."""
+        booster = getattr(model, 'booster_', model)
+        dump = booster.dump_model()
+        if dump.get('average_output'):
+            raise ValueError("Random-forest style boosters (average_output) are not supported")
+
+        objective_parts = dump['objective'].split()
+        objective = objective_parts[0]
+        objective = 'multiclass' if objective == 'softmax' else objective
+        params = dict(part.split(':', 1) for part in objective_parts[1:] if ':' in part)
+
+        nodes = {name: [] for name in array_names if name not in ('roots', 'tree_class')}
+        roots, tree_class = [], []
+        num_tree_per_iteration = dump['num_tree_per_iteration']
+
+        def allocate():
+            for name in nodes:
+                nodes[name].append(0)
+            return len(nodes['split_feature']) - 1
+
+        # Breadth-first, with the two children of a split stored side by side
+        # so that right_child == left_child + 1 everywhere
+        for tree in dump['tree_info']:
+            roots.append(allocate())
+            tree_class.append(tree['tree_index'] % num_tree_per_iteration)
+            pending = deque([(tree['tree_structure'], roots[-1])])
+            while pending:
+                node, index = pending.popleft()
+                if 'leaf_value' in node:
+                    nodes['split_feature'][index] = -1
+                    nodes['threshold'][index] = np.inf
+                    nodes['left_child'][index] = index
+                    nodes['right_child'][index] = index
+                    nodes['leaf_value'][index] = node['leaf_value']
+                    nodes['node_value'][index] = node['leaf_value']
+                    continue
+                if node['decision_type'] != '<=':
+                    raise ValueError("Categorical splits are not supported by the native evaluator")
+                left, right = allocate(), allocate()
+                nodes['split_feature'][index] = node['split_feature']
+                nodes['threshold'][index] = node['threshold']
+                nodes['node_value'][index] = node.get('internal_value', 0.0)
+                nodes['default_left'][index] = node['default_left']
+                nodes['missing_type'][index] = _missing_types[node['missing_type']]
+                nodes['left_child'][index] = left
+                nodes['right_child'][index] = right
+                pending.append((node['left_child'], left))
+                pending.append((node['right_child'], right))
+
+        return cls(
+            nodes['split_feature'], np.asarray(nodes['threshold'], dtype=np.float64),
+            nodes['left_child'], nodes['right_child'], np.asarray(nodes['leaf_value'], dtype=np.float64),
+            np.asarray(nodes['node_value'], dtype=np.float64),
+            nodes['default_left'], nodes['missing_type'], roots, tree_class,
+            num_class=num_tree_per_iteration, objective=objective,
+            sigmoid=float(params.get('sigmoid', 1.0)),
+            classes=getattr(model, 'classes_', None), feature_names=dump.get('feature_names'),
+        )
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in array_names}
+
+    def metadata(self):
+        return {
+            'num_class': self.num_class,
+            'objective': self.objective,
+            'sigmoid': self.sigmoid,
+            'classes': self.classes_.tolist(),
+            'feature_names': self.feature_names,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        return cls(**{name: arrays[name] for name in array_names}, **metadata)
+
+    def _max_depth(self):
+        frontier = self.roots
+        max_depth = 0
+        internal = self.split_feature >= 0
+        while True:
+            frontier = frontier[internal[frontier]]
+            if frontier.size == 0:
+                return max_depth
+            max_depth += 1
+            frontier = np.concatenate([self.left_child[frontier], self.right_child[frontier]])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.split_feature)
+
+    # --- Evaluation ---
+    def _step(self, idx, fval):
+        threshold = self.threshold.take(idx)
+        if self._plain_missing:
+            if self._paired:
+                return self.left_child.take(idx) + (fval > threshold)
+            go_left = fval <= threshold
+        else:
+            missing_type = self.missing_type.take(idx)
+            is_nan = np.isnan(fval)
+            fval = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, fval)
+            use_default = (((missing_type == MISSING_ZERO) & (np.abs(fval) <= _zero_threshold))
+                           | ((missing_type == MISSING_NAN) & is_nan))
+            go_left = np.where(use_default, self.default_left.take(idx), fval <= threshold)
+        return np.where(go_left, self.left_child.take(idx), self.right_child.take(idx))
+
+    def _prepare(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self._plain_missing and np.isnan(X).any():
+            # Splits without a missing rule treat NaN as zero
+            X = np.nan_to_num(X, nan=0.0)
+        return X
+
+    def predict_raw_single(self, x):
+        """Raw class scores for one row: a depth-long loop, vectorized across trees."""
+        x = self._prepare(x).ravel()
+        idx = self.roots
+        for _ in range(self.max_depth):
+            idx = self._step(idx, x.take(self._gather_feature.take(idx)))
+        return self.leaf_value.take(idx) @ self._class_matrix
+
+    def predict_raw(self, X, chunk_size=256):
+        """Raw class scores for a batch.
+
+        Rows are processed in small chunks so the (rows x trees) node-index
+        matrix stays in cache; gathers go through ``take`` on the flattened chunk.
+        """
+        X = self._prepare(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        n_rows, n_features = X.shape
+        raw = np.empty((n_rows, self.num_class))
+        for start in range(0, n_rows, chunk_size):
+            chunk = np.ascontiguousarray(X[start:start + chunk_size]).ravel()
+            n_chunk = chunk.size // n_features
+            row_offset = (np.arange(n_chunk) * n_features)[:, None]
+            idx = np.broadcast_to(self.roots, (n_chunk, self.n_trees))
+            for _ in range(self.max_depth):
+                idx = self._step(idx, chunk.take(row_offset + self._gather_feature.take(idx)))
+            raw[start:start + n_chunk] = self.leaf_value.take(idx) @ self._class_matrix
+        return raw
+
+    def predict_contrib(self, X, chunk_size=256):
+        """Path-based (Saabas) feature contributions in LightGBM's ``pred_contrib`` layout.
+
+        Every split a row passes through credits its feature with the change in
+        node value, so each class block (n_features contributions, then the
+        expected value) sums to the raw score like TreeSHAP does, but costs only
+        one extra gather per step on top of prediction.
+        """
+        X = self._prepare(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        n_rows, n_features = X.shape
+        width = n_features + 1
+        contrib = np.empty((n_rows, self.num_class, width))
+        bias = self.node_value.take(self.roots) @ self._class_matrix
+        tree_offset = self.tree_class * width
+        for start in range(0, n_rows, chunk_size):
+            chunk = np.ascontiguousarray(X[start:start + chunk_size]).ravel()
+            n_chunk = chunk.size // n_features
+            row_offset = (np.arange(n_chunk) * n_features)[:, None]
+            # Flat index of (row, class, feature) in the chunk's output block
+            out_offset = (np.arange(n_chunk) * self.num_class * width)[:, None] + tree_offset
+            totals = np.zeros(n_chunk * self.num_class * width)
+            idx = np.broadcast_to(self.roots, (n_chunk, self.n_trees))
+            for _ in range(self.max_depth):
+                feature = self._gather_feature.take(idx)
+                child = self._step(idx, chunk.take(row_offset + feature))
+                # Leaves point to themselves, so finished rows add zero
+                delta = self.node_value.take(child) - self.node_value.take(idx)
+                totals += np.bincount((out_offset + feature).ravel(), weights=delta.ravel(),
+                                      minlength=totals.size)
+                idx = child
+            contrib[start:start + n_chunk] = totals.reshape(n_chunk, self.num_class, width)
+        contrib[:, :, -1] = bias
+        return contrib.reshape(n_rows, -1)
+
+    def _link(self, raw):
+        if self.objective == 'binary':
+            p = 1.0 / (1.0 + np.exp(-self.sigmoid * raw[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        raw = raw - raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1 or X.shape[0] == 1:
+            return self._link(self.predict_raw_single(X)[None, :])
+        return self._link(self.predict_raw(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
@@ -0,0 +1,436 @@
+"""Input validation and drift monitoring, vectorized over whole batches.
+
+    python validation.py build-reference training_readings.csv -o reference.npz
+    python validation.py check readings.csv --reference reference.npz
+
+``InputValidator.check`` flags out-of-range rows in one pass over a batch of
+raw readings and its feature matrix: physically impossible values, non-integer
+months or flags, unknown categories, and values more than ``z_max`` standard
+deviations from the scaler's training mean.
+
+Drift is measured against a ``DriftReference``: per-feature histograms of the
+scaled numeric features (quantile bins) and the station / wind-direction
+frequencies. A reference is built from a sample of training readings and can
+be stored in the model artifact; without one, the normal distribution implied
+by the scaler's mean and variance stands in for the numeric features.
+``DriftMonitor`` accumulates live histograms over tumbling windows of rows and
+reports PSI and KS per feature when each window closes.
+
+``ValidationStage`` runs both ahead of ``predict_proba`` in the inference
+server, the stream scorer and the async scorer.
+"""
+import argparse
+import threading
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from features import (
+    build_feature_matrix, numeric_features, numeric_sources, raw_numeric_columns, read_readings,
+    station_features, wind_features, wind_options
+)
+
+# --- Range Rules ---
+# Physically possible range of each raw input (None leaves that side open)
+valid_ranges = {
+    'month': (1, 12),
+    'is_night': (0, 1),
+    'Rain_Flag': (0, 1),
+    'CO_NO2_ratio': (0, None),
+    'PM10': (0, None),
+    'CO': (0, None),
+    'O3': (0, None),
+    'SO2': (0, None),
+    'NO2': (0, None),
+    'PRES': (850, 1100),
+    'temp_dewp_diff': (0, None),
+    'inverse_wind': (0, None),
+}
+# Inputs that must be whole numbers, and inputs that must be strictly above their minimum
+integer_inputs = {'month', 'is_night', 'Rain_Flag'}
+positive_inputs = {'inverse_wind'}  # 1 / wind speed: 0 would mean infinite wind
+
+rules = ['not_finite', 'below_min', 'above_max', 'not_integer', 'unknown_category', 'far_from_training']
+checked_columns = raw_numeric_columns + ['station', 'wd']
+
+_low = np.array([valid_ranges[col][0] if valid_ranges[col][0] is not None else -np.inf for col in raw_numeric_columns])
+_high = np.array([valid_ranges[col][1] if valid_ranges[col][1] is not None else np.inf for col in raw_numeric_columns])
+_positive = np.array([col in positive_inputs for col in raw_numeric_columns])
+_integer = np.array([col in integer_inputs for col in raw_numeric_columns])
+_n_cat = len(station_features) + len(wind_features)
+
+
+class ValidationResult:
+    """Per-row, per-column flags of one batch; ``flags[rule]`` is (n_rows, len(checked_columns))."""
+
+    def __init__(self, flags, raw_numeric, readings):
+        self.flags = flags
+        self._raw_numeric = raw_numeric
+        self._readings = readings
+
+    @property
+    def n_rows(self):
+        return len(self._raw_numeric)
+
+    @property
+    def invalid_rows(self):
+        """Boolean mask of rows with at least one issue."""
+        return np.logical_or.reduce([flag.any(axis=1) for flag in self.flags.values()])
+
+    def rule_counts(self):
+        """Flagged rows per rule (a row counts once per rule, whatever the number of columns)."""
+        return {rule: int(flag.any(axis=1).sum()) for rule, flag in self.flags.items()}
+
+    def summary(self):
+        """Flag counts by column and rule, only the columns with issues."""
+        counts = pd.DataFrame({rule: flag.sum(axis=0) for rule, flag in self.flags.items()}, index=checked_columns)
+        return counts.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+
+    def flagged_messages(self):
+        """Readable issues of every flagged row, as {row position: [messages]}."""
+        return {int(row): self.messages(row) for row in np.flatnonzero(self.invalid_rows)}
+
+    def messages(self, row=0):
+        """Readable issues of one row."""
+        found = []
+        for rule, flag in self.flags.items():
+            for j in np.flatnonzero(flag[row]):
+                column = checked_columns[j]
+                value = self._readings[column].iloc[row] if column in ('station', 'wd') else self._raw_numeric[row, j]
+                found.append(f"{column} = {value}: {_describe(rule, column)}")
+        return found
+
+
+def _describe(rule, column):
+    low, high = valid_ranges.get(column, (None, None))
+    return {
+        'not_finite': "not a number",
+        'below_min': f"must be {'above' if column in positive_inputs else 'at least'} {low}",
+        'above_max': f"must be at most {high}",
+        'not_integer': "must be a whole number",
+        'unknown_category': "not a known option",
+        'far_from_training': "far outside the training range",
+    }[rule]
+
+
+class InputValidator:
+    """Range checks against physical limits and the scaler's training mean/variance."""
+
+    def __init__(self, scaler, z_max=5.0):
+        self.z_max = float(z_max)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    def check(self, readings, X, allow_unknown=()):
+        """Validate a DataFrame of raw readings and the feature matrix built from it.
+
+        ``allow_unknown`` names categorical columns ('station', 'wd') whose unseen values are expected.
+        """
+        X = np.asarray(X)
+        raw_numeric = readings[raw_numeric_columns].to_numpy(dtype=np.float64)
+        n_rows, n_numeric = raw_numeric.shape
+        empty = np.zeros((n_rows, 2), dtype=bool)
+        finite = np.isfinite(raw_numeric)
+        with np.errstate(invalid='ignore'):
+            below = finite & ((raw_numeric < _low) | (_positive & (raw_numeric <= _low)))
+            above = finite & (raw_numeric > _high)
+            not_integer = finite & _integer & (raw_numeric != np.round(raw_numeric))
+            # Scaled numeric block of X: |z| beyond z_max standard deviations of the training data.
+            # Whole-number inputs are range-checked instead (a rare flag set to 1 is not an outlier)
+            far = (np.abs(X[:, _n_cat:]) > self.z_max) & ~_integer
+        # Known categories set one one-hot column; only rows with no wind column can be 'N' or unknown
+        unknown = np.zeros((n_rows, 2), dtype=bool)
+        unknown[:, 0] = ~X[:, :len(station_features)].any(axis=1)
+        no_wind = ~X[:, len(station_features):_n_cat].any(axis=1)
+        if no_wind.any():
+            unknown[no_wind, 1] = readings['wd'].to_numpy()[no_wind].astype(str) != wind_options[0]
+        for column in allow_unknown:
+            unknown[:, ['station', 'wd'].index(column)] = False
+        pad = np.zeros((n_rows, n_numeric), dtype=bool)
+        flags = {
+            'not_finite': np.hstack([~finite, empty]),
+            'below_min': np.hstack([below, empty]),
+            'above_max': np.hstack([above, empty]),
+            'not_integer': np.hstack([not_integer, empty]),
+            'unknown_category': np.hstack([pad, unknown]),
+            'far_from_training': np.hstack([far & ~below & ~above, empty]),
+        }
+        return ValidationResult(flags, raw_numeric, readings)
+
+
+# --- Drift ---
+drift_features = numeric_features + ['station', 'wd']
+
+
+def _category_codes(X):
+    """Station and wind-direction index per row from the one-hot block (last index = none/'N')."""
+    station_block = X[:, :len(station_features)]
+    wd_block = X[:, len(station_features):_n_cat]
+    station = np.where(station_block.any(axis=1), station_block.argmax(axis=1), len(station_features))
+    wd = np.where(wd_block.any(axis=1), wd_block.argmax(axis=1), len(wind_features))
+    return station, wd
+
+
+class DriftReference:
+    """Reference histograms: ``edges`` (n_numeric, bins - 1) interior edges in scaled space,
+    ``counts`` (n_numeric, bins), and station / wind-direction counts (last bucket = none/'N')."""
+
+    def __init__(self, edges, counts, station_counts, wd_counts):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.station_counts = np.asarray(station_counts, dtype=np.float64)
+        self.wd_counts = np.asarray(wd_counts, dtype=np.float64)
+        self.bins = self.counts.shape[1]
+
+    @classmethod
+    def from_matrix(cls, X, bins=20):
+        """Quantile bins of each scaled numeric feature of a reference feature matrix."""
+        X = np.asarray(X, dtype=np.float64)
+        numeric = X[:, _n_cat:]
+        edges = np.nanquantile(numeric, np.linspace(0, 1, bins + 1)[1:-1], axis=0).T
+        reference = cls(edges, np.zeros((len(numeric_features), bins)), np.zeros(len(station_features) + 1),
+                        np.zeros(len(wind_features) + 1))
+        reference.counts, reference.station_counts, reference.wd_counts = reference.histograms(X)
+        return reference
+
+    @classmethod
+    def from_readings(cls, readings, scaler, bins=20):
+        return cls.from_matrix(build_feature_matrix(readings, scaler), bins=bins)
+
+    @classmethod
+    def from_scaler(cls, scaler, bins=20):
+        """Stand-in reference from the scaler alone.
+
+        Continuous features are standard normal after scaling. A 0/1 flag's
+        mean is its frequency, so flags get that Bernoulli distribution and
+        months are equally likely; so are the known stations and all 16 wind
+        directions.
+        """
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        normal_edges = np.array([NormalDist().inv_cdf(q) for q in quantiles])
+        edges = np.tile(normal_edges, (len(numeric_features), 1))
+        counts = np.full((len(numeric_features), bins), 1.0 / bins)
+        mean, scale = np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scaler.scale_, dtype=np.float64)
+        for j, feature in enumerate(numeric_features):
+            source = numeric_sources[feature][0]
+            if source not in integer_inputs:
+                continue
+            low, high = valid_ranges[source]
+            values = np.arange(low, high + 1)
+            # One bin per value: edges halfway between values, unused edges at +inf
+            midpoints = (values[:-1] + 0.5 - mean[j]) / scale[j]
+            edges[j] = np.concatenate([midpoints, np.full(bins - len(values), np.inf)])
+            counts[j] = 0.0
+            if len(values) == 2:
+                p = float(np.clip(mean[j], 0.0, 1.0))
+                counts[j, :2] = [1.0 - p, p]
+            else:
+                counts[j, :len(values)] = 1.0 / len(values)
+        station_counts = np.append(np.ones(len(station_features)), 0.0)
+        return cls(edges, counts, station_counts, np.ones(len(wind_features) + 1))
+
+    def histograms(self, X):
+        """(numeric counts, station counts, wd counts) of a feature matrix, one bincount each."""
+        X = np.asarray(X, dtype=np.float64)
+        # One contiguous row per feature, so each searchsorted reads memory in order
+        numeric = np.ascontiguousarray(X[:, _n_cat:].T)
+        n_numeric = len(numeric)
+        bins = np.empty(numeric.shape, dtype=np.int64)
+        for j in range(n_numeric):
+            bins[j] = np.searchsorted(self.edges[j], numeric[j], side='right')
+        bins += (np.arange(n_numeric) * self.bins)[:, None]
+        # NaN sorts past the last edge; leave it out rather than count it as the top bin
+        flat = bins[~np.isnan(numeric)]
+        counts = np.bincount(flat, minlength=n_numeric * self.bins).reshape(n_numeric, self.bins)
+        station, wd = _category_codes(X)
+        return (counts, np.bincount(station, minlength=len(self.station_counts)),
+                np.bincount(wd, minlength=len(self.wd_counts)))
+
+    def compare(self, counts, station_counts, wd_counts, eps=1e-4):
+        """PSI and KS of live histograms against the reference, one row per drift feature."""
+        rows = []
+        numeric = [(self.counts[j], counts[j]) for j in range(len(numeric_features))]
+        for name, (expected, actual) in zip(drift_features, numeric + [(self.station_counts, station_counts),
+                                                                        (self.wd_counts, wd_counts)]):
+            rows.append((name, *_psi_ks(expected, actual, eps), int(np.sum(actual))))
+        return pd.DataFrame(rows, columns=['feature', 'psi', 'ks', 'rows']).set_index('feature')
+
+    def drift(self, X):
+        return self.compare(*self.histograms(X))
+
+    # --- Persistence ---
+    def to_arrays(self):
+        return {'edges': self.edges, 'counts': self.counts, 'station_counts': self.station_counts,
+                'wd_counts': self.wd_counts}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['edges'], arrays['counts'], arrays['station_counts'], arrays['wd_counts'])
+
+    def save(self, path):
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls.from_arrays({name: arrays[name] for name in arrays.files})
+
+
+def _psi_ks(expected, actual, eps):
+    """Population stability index and the largest CDF gap (KS on the binned distributions)."""
+    total = actual.sum()
+    if total == 0:
+        return float('nan'), float('nan')
+    p = np.maximum(expected / expected.sum(), eps)
+    q = np.maximum(actual / total, eps)
+    psi = float(np.sum((q - p) * np.log(q / p)))
+    ks = float(np.max(np.abs(np.cumsum(actual) / total - np.cumsum(expected) / expected.sum())))
+    return psi, ks
+
+
+def drift_status(psi):
+    """Conventional PSI reading: below 0.1 stable, up to 0.25 moderate shift, above that major."""
+    if not np.isfinite(psi):
+        return "no data"
+    return "stable" if psi < 0.1 else "moderate" if psi < 0.25 else "major"
+
+
+class DriftMonitor:
+    """Live histograms over tumbling windows of ``window_rows`` rows; thread-safe.
+
+    ``update`` adds a batch and returns the drift table when it closes a
+    window (else None); ``latest`` is the last closed window's table.
+    """
+
+    def __init__(self, reference, window_rows=5_000):
+        self.reference = reference
+        self.window_rows = int(window_rows)
+        self._lock = threading.Lock()
+        self._reset()
+        self.windows = 0
+        self._latest = None
+
+    def _reset(self):
+        self._counts = np.zeros_like(self.reference.counts)
+        self._station = np.zeros_like(self.reference.station_counts)
+        self._wd = np.zeros_like(self.reference.wd_counts)
+        self._rows = 0
+
+    def update(self, X):
+        counts, station, wd = self.reference.histograms(X)
+        with self._lock:
+            self._counts += counts
+            self._station += station
+            self._wd += wd
+            self._rows += len(X)
+            if self._rows < self.window_rows:
+                return None
+            table = self.reference.compare(self._counts, self._station, self._wd)
+            self._reset()
+            self.windows += 1
+            self._latest = table
+            return table
+
+    def latest(self):
+        with self._lock:
+            return self._latest
+
+    def pending_rows(self):
+        with self._lock:
+            return self._rows
+
+
+# --- Serving ---
+def load_reference(scaler, path=None, artifact_path=None):
+    """The drift reference saved at ``path``, else the artifact's, else the scaler's stand-in."""
+    if path:
+        return DriftReference.load(path)
+    if artifact_path:
+        from artifacts import ModelArtifact
+        reference = ModelArtifact(artifact_path).reference()
+        if reference is not None:
+            return reference
+    return DriftReference.from_scaler(scaler)
+
+
+class ValidationStage:
+    """Range checks and drift monitoring of every scored batch, for the serving paths.
+
+    ``check`` validates raw readings and their feature matrix (extra columns
+    past the model's base features, e.g. temporal ones, are ignored), adds the
+    rows to the drift window and, given a ``metrics_registry``, counts flagged
+    rows per rule and publishes PSI/KS when a window closes.
+    """
+
+    def __init__(self, scaler, reference=None, window_rows=5_000, metrics_registry=None, source="api"):
+        self.validator = InputValidator(scaler)
+        self.monitor = DriftMonitor(reference or DriftReference.from_scaler(scaler), window_rows=window_rows)
+        self.source = source
+        self.flagged_rows = 0
+        self._invalid_inputs = self._feature_drift = None
+        if metrics_registry is not None:
+            self._invalid_inputs = metrics_registry.counter(
+                "air_pollution_invalid_inputs_total", "Scored rows flagged by each validation rule", ["source", "rule"])
+            self._feature_drift = metrics_registry.gauge(
+                "air_pollution_feature_drift", "PSI and KS of each feature over the last closed drift window",
+                ["feature", "statistic"])
+
+    def check(self, readings, X):
+        X = np.asarray(X)[:, :_n_cat + len(numeric_features)]
+        result = self.validator.check(readings, X)
+        table = self.monitor.update(X)
+        self.flagged_rows += int(result.invalid_rows.sum())
+        if self._invalid_inputs is not None:
+            for rule, count in result.rule_counts().items():
+                if count:
+                    self._invalid_inputs.inc(count, source=self.source, rule=rule)
+            if table is not None:
+                for feature, row in table.iterrows():
+                    self._feature_drift.set(row['psi'], feature=feature, statistic="psi")
+                    self._feature_drift.set(row['ks'], feature=feature, statistic="ks")
+        return result
+
+    def stats(self):
+        return {"flagged_rows": self.flagged_rows, "drift_windows": self.monitor.windows,
+                "pending_rows": self.monitor.pending_rows()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a drift reference or check a readings file against it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build-reference", help="Histograms of a reference (e.g. training) readings file")
+    build.add_argument("readings")
+    build.add_argument("-o", "--output", default="reference.npz")
+    build.add_argument("--bins", type=int, default=20)
+    check = sub.add_parser("check", help="Range checks and drift of a readings file")
+    check.add_argument("readings")
+    check.add_argument("--reference", default=None, help="Reference .npz (default: the scaler's normal stand-in)")
+    for command in (build, check):
+        command.add_argument("--scaler", default="StandardScalar.pkl")
+        command.add_argument("--model", default="LightGBM.pkl")
+    args = parser.parse_args()
+
+    from model_registry import load_model_and_scaler
+    _, scaler = load_model_and_scaler(args.model, args.scaler)
+    readings = read_readings(args.readings)
+    X = build_feature_matrix(readings, scaler)
+
+    if args.command == "build-reference":
+        DriftReference.from_matrix(X, bins=args.bins).save(args.output)
+        print(f"Wrote {args.output} from {len(readings):,} readings")
+        return
+
+    result = InputValidator(scaler).check(readings, X)
+    print(f"{int(result.invalid_rows.sum()):,} of {len(readings):,} rows flagged")
+    summary = result.summary()
+    if not summary.empty:
+        print(summary.to_string())
+    reference = DriftReference.load(args.reference) if args.reference else DriftReference.from_scaler(scaler)
+    table = reference.drift(X)
+    table['status'] = table['psi'].map(drift_status)
+    print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
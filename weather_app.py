@@ -1,11 +1,111 @@
 import streamlit as st
-import numpy as np
-import pandas as pd
 import os
-import pickle
-import plotly.express as px
-from PIL import Image
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
+
+from assets import AssetCache
+import metrics
+from model_registry import default_registry
+
+# numpy, pandas, plotly.express and the model (LightGBM/sklearn via unpickling) are imported
+# by the views that use them, so text and image views start without paying for them
+
+# --- Metrics ---
+# Prometheus text format on http://127.0.0.1:<port>/metrics; AIR_POLLUTION_METRICS_PORT=0 disables the endpoint
+stage_seconds = metrics.registry.histogram("air_pollution_stage_seconds", "Time spent in each hot-path stage", ["stage"])
+view_seconds = metrics.registry.histogram("air_pollution_view_render_seconds", "Script run time per sidebar view", ["view"])
+predictions_total = metrics.registry.counter("air_pollution_predictions_total", "Predictions served", ["source", "level"])
+errors_total = metrics.registry.counter("air_pollution_errors_total", "Failures shown to the user", ["operation"])
+invalid_inputs_total = metrics.registry.counter(
+    "air_pollution_invalid_inputs_total", "Scored rows flagged by each validation rule", ["source", "rule"])
+feature_drift = metrics.registry.gauge(
+    "air_pollution_feature_drift", "PSI and KS of each feature over the last closed drift window", ["feature", "statistic"])
+
+@st.cache_resource
+def start_metrics_endpoint(port):
+    try:
+        return metrics.serve(port)
+    except OSError:
+        # Another app process already serves this port
+        return None
+
+metrics_port = int(os.environ.get("AIR_POLLUTION_METRICS_PORT", "9464"))
+if metrics_port:
+    start_metrics_endpoint(metrics_port)
+render_start = time.perf_counter()
+
+# Display width of every image the views show (None = container width)
+image_widths = {
+    "beijing_pollution_image.png": 600,
+    "data_distribution_overview.png": 650,
+    "pm25_level_distribution.png": 550,
+    "pm25_by_area_type.png": 650,
+    "pm25_area_type_boxplot.png": 650,
+    "pm_by_area_type_barchart.png": 650,
+    "seasonal_pm25_by_area.png": 650,
+    "monthly_pollutants_trend.png": 650,
+    "Model_Comparison.png": None,
+    "feature_importance.png": 700,
+    "shap_LightGBM.png": 700,
+    "confusion_matrix.png": 700,
+    "heatmap.png": 700,
+}
+
+# Decoded once per process and shared by all sessions; set AIR_POLLUTION_ASSET_CACHE=0 to read from disk
+@st.cache_resource
+def get_asset_cache(enabled):
+    cache = AssetCache(image_widths, enabled=enabled)
+    if enabled:
+        cache.preload(background=True)
+    return cache
+
+assets = get_asset_cache(os.environ.get("AIR_POLLUTION_ASSET_CACHE", "1") != "0")
+
+def load_image(path):
+    with stage_seconds.time(stage="image_load"):
+        return assets.get(path)
+
+def render_chart(fig, **kwargs):
+    with stage_seconds.time(stage="chart"):
+        st.plotly_chart(fig, **kwargs)
+
+# Incremental EDA aggregates (see aggregates.py); the static PNGs are shown when the store is absent
+aggregates_path = os.environ.get("AIR_POLLUTION_AGGREGATES", "aggregates.npz")
+
+# Only the latest version of the file is kept; older mtimes are evicted
+@st.cache_resource(max_entries=1)
+def _load_aggregates(path, modified):
+    from aggregates import PollutionAggregates
+    return PollutionAggregates.load(path)
+
+def load_live_aggregates():
+    if not os.path.exists(aggregates_path):
+        return None
+    # Keyed on the file's mtime so appended readings show up on the next rerun
+    return _load_aggregates(aggregates_path, os.path.getmtime(aggregates_path))
+
+# Partitioned historical readings with cached predictions (see history_store.py), for the Backtest view
+history_path = os.environ.get("AIR_POLLUTION_HISTORY", "history")
+
+@st.cache_data
+def model_key(paths, modified):
+    from history_store import model_fingerprint
+    return model_fingerprint(*paths)
+
+def current_model_key():
+    # An artifact holds the scaler; otherwise a new scaler file must not reuse the old predictions
+    if default_registry.artifact_path:
+        paths = (default_registry.artifact_path,)
+    else:
+        paths = (default_registry.model_path, default_registry.scaler_path)
+    return model_key(paths, tuple(os.path.getmtime(path) for path in paths))
+
+# Neighbours and weights of every map cell, rebuilt only when the stations, grid or IDW settings change
+@st.cache_resource(max_entries=8)
+def get_interpolator(station_latlon, bounds, rows, neighbors, power):
+    from spatial import IDWInterpolator, make_grid
+    lats, lons = make_grid(bounds, rows)
+    return lats, lons, IDWInterpolator(station_latlon, lats, lons, k=neighbors, power=power)
 
 st.set_page_config(page_title="Air Pollution Classifier", page_icon="🌫️", layout="wide")
 
@@ -22,29 +122,125 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Load Single Model and Scaler ---
-@st.cache_data
+# The registry keeps one copy per process, shared read-only by every session and rerun
 def load_model_and_scaler():
-    model_path = "LightGBM.pkl"
-    scaler_path = "StandardScalar.pkl"
-
-    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
+    try:
+        return default_registry.get()
+    except FileNotFoundError:
+        errors_total.inc(operation="load_model")
         st.error("\u26a0\ufe0f Model or Scaler file not found! Please upload 'LightGBM.pkl' and 'StandardScalar.pkl'.")
         return None, None
 
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
-    with open(scaler_path, 'rb') as f:
-        scaler = pickle.load(f)
-
-    return model, scaler
-
-model, scaler = load_model_and_scaler()
-if model is None or scaler is None:
-    st.stop()
+# Shared by all sessions: repeat submissions of the same inputs skip the model, and
+# concurrent misses are scored together within AIR_POLLUTION_BATCH_WAIT_MS (0 disables batching)
+@st.cache_resource
+def get_prediction_cache(_model, batch_wait_ms):
+    from batcher import MicroBatcher
+    from prediction_cache import PredictionCache
+    predictor = MicroBatcher(_model, max_wait=batch_wait_ms / 1e3) if batch_wait_ms > 0 else _model
+    return PredictionCache(predictor, max_entries=10_000, ttl_seconds=3600)
+
+# Per-prediction attributions, cached by input hash and shared by all sessions; one per served model name
+@st.cache_resource
+def get_explainer(_model, name="primary"):
+    from explain import Explainer
+    return Explainer(_model)
+
+# Range checks against physical limits and the scaler's training distribution
+@st.cache_resource
+def get_validator(_scaler):
+    from validation import InputValidator
+    return InputValidator(_scaler)
+
+# Live feature histograms over tumbling windows of scored rows, shared by all sessions. The reference is
+# AIR_POLLUTION_REFERENCE (.npz from 'validation.py build-reference'), else the artifact's, else the scaler's
+@st.cache_resource
+def get_drift_monitor(_scaler, window_rows):
+    from validation import DriftMonitor, load_reference
+    reference = load_reference(_scaler, os.environ.get("AIR_POLLUTION_REFERENCE"), default_registry.artifact_path)
+    return DriftMonitor(reference, window_rows=window_rows)
+
+# Every live prediction goes through this scorer: the primary answers (or a candidate, for its A/B traffic share)
+# and the other candidates of AIR_POLLUTION_MODELS (a model set JSON, see model_registry.ModelSet) score the same
+# inputs on a background thread, for the live comparison in the Metrics Comparison view
+@st.cache_resource
+def get_shadow_scorer(_model, _scaler, models_path):
+    from shadow_scoring import ShadowScorer, register_metrics
+    register_metrics(metrics.registry, lambda: services.get("shadow_scorer"))
+    if not models_path:
+        return ShadowScorer({"primary": _model}, {"primary": _scaler}, "primary")
+    from model_registry import ModelSet
+    return ShadowScorer.from_model_set(ModelSet.from_config(models_path, default_registry))
+
+# The caches above once a view has created them; read by the metrics endpoint between runs
+@st.cache_resource
+def shared_services():
+    return {}
+
+services = shared_services()
+
+def load_prediction_services():
+    """Model, scaler, prediction cache, explainer, validator and the live (shadow) scorer, loaded by the first view
+    that scores readings."""
+    with stage_seconds.time(stage="load_model"):
+        model, scaler = load_model_and_scaler()
+    if model is None or scaler is None:
+        st.stop()
+    services["shadow_scorer"] = get_shadow_scorer(model, scaler, os.environ.get("AIR_POLLUTION_MODELS"))
+    services["prediction_cache"] = get_prediction_cache(
+        services["shadow_scorer"], float(os.environ.get("AIR_POLLUTION_BATCH_WAIT_MS", "2")))
+    services["explainer"] = get_explainer(model)
+    services["drift_monitor"] = get_drift_monitor(scaler, int(os.environ.get("AIR_POLLUTION_DRIFT_WINDOW", "5000")))
+    return (model, scaler, services["prediction_cache"], services["explainer"], get_validator(scaler),
+            services["shadow_scorer"])
+
+def record_validation(validation, source):
+    for rule, count in validation.rule_counts().items():
+        if count:
+            invalid_inputs_total.inc(count, source=source, rule=rule)
+
+def observe_drift(X):
+    """Add scored rows to the live drift window; publishes PSI/KS when the window closes."""
+    with stage_seconds.time(stage="drift"):
+        table = services["drift_monitor"].update(X)
+    if table is not None:
+        for feature, row in table.iterrows():
+            feature_drift.set(row['psi'], feature=feature, statistic="psi")
+            feature_drift.set(row['ks'], feature=feature, statistic="ks")
+
+def _cache_lookups():
+    images = assets.stats()
+    lookups = {("image", "hit"): images["hits"], ("image", "miss"): images["misses"]}
+    if "prediction_cache" in services:
+        prediction, explainer = services["prediction_cache"].stats(), services["explainer"]
+        lookups.update({
+            ("prediction", "hit"): prediction["hits"], ("prediction", "miss"): prediction["misses"],
+            ("explanation", "hit"): explainer.hits, ("explanation", "miss"): explainer.misses,
+        })
+    return lookups
+
+# Read from the caches' own counters at scrape time, so lookups cost nothing extra
+metrics.registry.counter(
+    "air_pollution_cache_lookups_total", "Cache lookups by result", ["cache", "result"]
+).set_function(_cache_lookups)
+metrics.registry.gauge("air_pollution_model_load_seconds", "Cold load time of the model and scaler").set_function(
+    lambda: default_registry.stats().get("load_seconds", 0.0))
 
 # --- Sidebar Navigation ---
 
-view_option = st.sidebar.radio("Select View", ["Introduction", "EDA", "Metrics Comparison", "Modelling & Prediction", "Feature Importance", "SHAP",'Confusion Matrix', 'HeatMap'])
+views = ["Introduction", "EDA", "Metrics Comparison", "Modelling & Prediction", "Feature Importance", "SHAP",'Confusion Matrix', 'HeatMap',
+         "Backtest", "Citywide Map"]
+# ?view=<name> opens a view directly
+requested_view = st.query_params.get("view")
+view_option = st.sidebar.radio("Select View", views, index=views.index(requested_view) if requested_view in views else 0)
+
+load_stats = default_registry.stats()
+if load_stats["loaded"]:
+    st.sidebar.caption(
+        f"Model loaded in {load_stats.get('load_seconds', 0.0):.2f}s · RSS {load_stats['rss_mb']:.0f} MB"
+    )
+else:
+    st.sidebar.caption(f"Model not loaded yet · RSS {load_stats['rss_mb']:.0f} MB")
 
 # --- Introduction ---
 if view_option == "Introduction":
@@ -52,8 +248,8 @@ if view_option == "Introduction":
     
     # Add project logo/image if available
     intro_image_path = "beijing_pollution_image.png"  # Update with your actual image path
-    if os.path.exists(intro_image_path):
-        st.image(Image.open(intro_image_path), width=600)
+    if assets.exists(intro_image_path):
+        st.image(load_image(intro_image_path), width=600)
     
     st.markdown("""
     ## Beijing Air Pollution Classification Project
@@ -116,13 +312,21 @@ if view_option == "Introduction":
         """)
 elif view_option == "EDA":
     st.subheader("\U0001f50d Exploratory Data Analysis")
+
+    live_aggregates = load_live_aggregates()
+    if live_aggregates is not None:
+        import eda_charts
+        st.caption(
+            f"Charts below are computed live from {live_aggregates.rows:,} readings across "
+            f"{len(live_aggregates.stations)} stations (`{aggregates_path}`)."
+        )
     
     st.markdown("## 📊 Data Distribution Analysis")
     
     # Make image slightly smaller with width parameter
     dist_analysis_image = "data_distribution_overview.png"
-    if os.path.exists(dist_analysis_image):
-        st.image(Image.open(dist_analysis_image), caption="Comprehensive Distribution Analysis", width=650)
+    if assets.exists(dist_analysis_image):
+        st.image(load_image(dist_analysis_image), caption="Comprehensive Distribution Analysis", width=650)
     else:
         st.warning("⚠️ Distribution analysis image not found.")
     
@@ -167,8 +371,10 @@ elif view_option == "EDA":
     st.markdown("## 🥧 PM2.5 Pollution Level Distribution")
     
     pm25_pie_image = "pm25_level_distribution.png"
-    if os.path.exists(pm25_pie_image):
-        st.image(Image.open(pm25_pie_image), caption="PM2.5 Pollution Level Distribution", width=550)
+    if live_aggregates is not None:
+        render_chart(eda_charts.level_pie(live_aggregates), use_container_width=True)
+    elif assets.exists(pm25_pie_image):
+        st.image(load_image(pm25_pie_image), caption="PM2.5 Pollution Level Distribution", width=550)
     else:
         st.warning("⚠️ PM2.5 distribution pie chart not found.")
     
@@ -200,8 +406,10 @@ elif view_option == "EDA":
     st.markdown("## 🏙️ PM2.5 Distribution by Area Type")
     
     area_dist_image = "pm25_by_area_type.png"
-    if os.path.exists(area_dist_image):
-        st.image(Image.open(area_dist_image), caption="PM2.5 Distribution Across Different Area Types", width=650)
+    if live_aggregates is not None:
+        render_chart(eda_charts.level_by_area(live_aggregates), use_container_width=True)
+    elif assets.exists(area_dist_image):
+        st.image(load_image(area_dist_image), caption="PM2.5 Distribution Across Different Area Types", width=650)
     else:
         st.warning("⚠️ Area distribution chart not found.")
     
@@ -233,8 +441,10 @@ elif view_option == "EDA":
     st.markdown("## 🗺️ Geographical Disadvantage in Air Pollution")
     
     geo_boxplot_image = "pm25_area_type_boxplot.png"
-    if os.path.exists(geo_boxplot_image):
-        st.image(Image.open(geo_boxplot_image), caption="Distribution of PM2.5 Levels by Area Type", width=650)
+    if live_aggregates is not None:
+        render_chart(eda_charts.pm25_box_by_area(live_aggregates), use_container_width=True)
+    elif assets.exists(geo_boxplot_image):
+        st.image(load_image(geo_boxplot_image), caption="Distribution of PM2.5 Levels by Area Type", width=650)
     else:
         st.warning("⚠️ Geographical distribution boxplot not found.")
     
@@ -261,8 +471,10 @@ elif view_option == "EDA":
     st.markdown("## 📊 PM2.5 and PM10 Geographic Disparity")
     
     pm_geo_disparity_image = "pm_by_area_type_barchart.png"
-    if os.path.exists(pm_geo_disparity_image):
-        st.image(Image.open(pm_geo_disparity_image), caption="Average PM2.5 and PM10 by Area Type", width=650)
+    if live_aggregates is not None:
+        render_chart(eda_charts.pm_means_by_area(live_aggregates), use_container_width=True)
+    elif assets.exists(pm_geo_disparity_image):
+        st.image(load_image(pm_geo_disparity_image), caption="Average PM2.5 and PM10 by Area Type", width=650)
     else:
         st.warning("⚠️ PM geographic disparity chart not found.")
     
@@ -311,8 +523,10 @@ elif view_option == "EDA":
     st.markdown("## 🌤️ Seasonal Variation of PM2.5 Across Area Types")
     
     seasonal_variation_image = "seasonal_pm25_by_area.png"
-    if os.path.exists(seasonal_variation_image):
-        st.image(Image.open(seasonal_variation_image), caption="Seasonal Variation of PM2.5 Levels by Area Type", width=650)
+    if live_aggregates is not None:
+        render_chart(eda_charts.seasonal_pm25_by_area(live_aggregates), use_container_width=True)
+    elif assets.exists(seasonal_variation_image):
+        st.image(load_image(seasonal_variation_image), caption="Seasonal Variation of PM2.5 Levels by Area Type", width=650)
     else:
         st.warning("⚠️ Seasonal variation chart not found.")
     
@@ -366,8 +580,10 @@ elif view_option == "EDA":
     st.markdown("## 📈 Monthly Trends of Key Pollutants")
     
     monthly_pollutants_image = "monthly_pollutants_trend.png"
-    if os.path.exists(monthly_pollutants_image):
-        st.image(Image.open(monthly_pollutants_image), caption="Pollution Levels by Month (Median)", width=650)
+    if live_aggregates is not None:
+        render_chart(eda_charts.monthly_pollutant_medians(live_aggregates), use_container_width=True)
+    elif assets.exists(monthly_pollutants_image):
+        st.image(load_image(monthly_pollutants_image), caption="Pollution Levels by Month (Median)", width=650)
     else:
         st.warning("⚠️ Monthly pollutant trends chart not found.")
     
@@ -444,39 +660,79 @@ elif view_option == "Metrics Comparison":
         This indicates both accurate and reliable predictions on unseen data.
         """)
 
+    # Live figures of the models serving this process, once a view has scored readings (see get_shadow_scorer)
+    live_scorer = services.get("shadow_scorer")
+    live = live_scorer.comparison() if live_scorer is not None else None
+    has_live = live is not None and live['served_rows'].sum() > 0
+
     with col2:
         model_Compare_path = "Model_Comparison.png"
-        if os.path.exists(model_Compare_path):
-            st.image(Image.open(model_Compare_path), caption="Model Comparison - Test Accuracy", use_container_width=True)
+        if has_live:
+            import plotly.express as px
+
+            # With candidates every model scores the same shadow batches, so their throughput compares directly
+            measure = 'rows_per_sec' if live['rows_per_sec'].notna().any() else 'served_p95_ms'
+            fig = px.bar(live.reset_index(), x='model', y=measure, color='role', text_auto='.3s',
+                         labels={'rows_per_sec': 'Rows/sec on the same batches', 'served_p95_ms': 'p95 latency (ms)',
+                                 'model': ''},
+                         color_discrete_sequence=px.colors.qualitative.Dark2)
+            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            render_chart(fig, use_container_width=True)
+            st.caption("Live figures of the deployed models on this app's predictions (see below).")
+        elif assets.exists(model_Compare_path):
+            st.image(load_image(model_Compare_path), caption="Model Comparison - Test Accuracy", use_container_width=True)
         else:
             st.warning("⚠️ Model comparison image not found.")
-    
-# --- Feature Names ---
-station_options = ["Changping", "Dingling", "Dongsi", "Guanyuan"]
-wind_options = ['N', 'E', 'ENE', 'ESE', 'NE', 'NNE', 'NNW', 'NW', 'S', 'SE', 'SSE', 'SSW', 'SW', 'W', 'WNW', 'WSW']  # Include 'N' for UI only  # 'N' is UI-only  # 'N' is UI-only
-
-station_features = [f'station_{s}' for s in station_options]
-wind_features = [f'wd_{w}' for w in wind_options if w != 'N']  # Exclude 'N' from encoding
-station_wd_features = station_features + wind_features
-
-numeric_features = [
-    'month', 'is_night', 'Rain_Flag', 'CO_NO2_ratio',
-    'PM10_log', 'CO_log', 'O3_log', 'SO2_log', 'NO2_log',
-    'PRES_log', 'temp_dewp_diff_log', 'inverse_wind_log'
-]
-
-# Hardcoded area type mapping (not used in model)
-station_to_area_type = {
-    'Changping': 'Suburban',
-    'Dingling': 'Industrial',  # Example default for testing
-    'Dongsi': 'Urban',
-    'Guanyuan': 'Rural'  # Assign as needed
-}
-
-final_feature_names = station_wd_features + numeric_features
 
+    # --- Live Model Comparison ---
+    st.markdown("---")
+    st.subheader("📡 Live Model Comparison")
+    if not has_live:
+        st.info("No predictions have been made in this app process yet. Predictions from the Modelling & Prediction "
+                "view are tracked here; set AIR_POLLUTION_MODELS to a model set JSON to score candidate models "
+                "(e.g. a pruned variant or a retrained model) on the same inputs in the background.")
+    else:
+        st.button("🔄 Refresh")  # reruns the script, which reads the scorer's latest figures
+        shown = live.assign(traffic=live['traffic'] * 100, agreement=live['agreement'] * 100)
+        st.dataframe(shown.style.format({
+            'traffic': '{:.0f}%', 'served_rows': '{:,}', 'served_p50_ms': '{:.2f}', 'served_p95_ms': '{:.2f}',
+            'shadow_rows': '{:,}', 'batch_p50_ms': '{:.2f}', 'batch_p95_ms': '{:.2f}', 'rows_per_sec': '{:,.0f}',
+            'compared_rows': '{:,}', 'agreement': '{:.1f}%', 'mean_gap': '{:.3f}'
+        }, na_rep='—'), use_container_width=True)
+        stats = live_scorer.stats()
+        st.caption(
+            f"Each prediction is answered by the primary ({stats['primary']}) or, for its traffic share, a candidate "
+            f"(served_*); every model then scores the same inputs in batches on a background thread (batch_*, "
+            f"rows_per_sec). Agreement is the share of rows with the primary's level and mean_gap the mean largest "
+            f"probability difference. "
+            f"{stats['pending_rows']:,} rows waiting, {stats['dropped_rows']:,} skipped while the shadow queue was full."
+        )
+        candidates = [name for name in live_scorer.names if name != live_scorer.primary]
+        if candidates:
+            import plotly.express as px
+
+            candidate = st.selectbox("Levels against the primary", candidates, key="live_candidate")
+            fig = px.imshow(live_scorer.confusion(candidate), text_auto=True, color_continuous_scale="Blues",
+                            labels=dict(x=f"{candidate} level", y=f"{live_scorer.primary} level", color="Rows"))
+            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            render_chart(fig, use_container_width=True)
+    
 # --- Prediction ---
 if view_option == "Modelling & Prediction":
+    import numpy as np
+    import pandas as pd
+    import plotly.express as px
+
+    from explain import EXACT, explanation_frame, feature_groups, predicted_class_contributions, top_drivers
+    from features import (
+        station_options, wind_options, station_to_area_type, class_map, class_labels,
+        raw_columns, build_feature_matrix, build_feature_row, read_readings, score_readings
+    )
+    from sweeps import axis_values, run_sweep, sweep_parameters, sweep_ranges
+    from validation import drift_status
+
+    model, scaler, prediction_cache, explainer, validator, live_scorer = load_prediction_services()
+
     st.subheader("📅 Input Environmental Parameters")
     col1, col2, col3 = st.columns(3)
 
@@ -484,14 +740,14 @@ if view_option == "Modelling & Prediction":
         pm10 = st.number_input("PM10 (μg/m³)", value=100.0)
         so2 = st.number_input("SO₂ (μg/m³)", value=10.0)
         no2 = st.number_input("NO₂ (μg/m³)", value=20.0)
-        co = st.number_input("CO (mg/m³)", value=1.0)
+        co = st.number_input("CO (μg/m³)", value=800.0)
         o3 = st.number_input("O₃ (μg/m³)", value=30.0)
         pres = st.number_input("Pressure (hPa)", value=1000.0)
 
     with col2:
         temp_dewp_diff = st.number_input("Temp - Dew Point Diff (°C)", value=20.0)
         inverse_wind = st.number_input("Inverse Wind Speed (1/WSPM)", value=1.0)
-        co_no2_ratio = st.number_input("CO / NO₂ Ratio", value=1.0)
+        co_no2_ratio = st.number_input("CO / NO₂ Ratio", value=40.0)
         month = st.selectbox("Month", list(range(1, 13)), format_func=lambda x: datetime(1900, x, 1).strftime('%B'))
 
     with col3:
@@ -503,41 +759,37 @@ if view_option == "Modelling & Prediction":
         st.markdown(f"**Mapped Area Type:** `{area_type}`")
 
     # Construct Input
-    user_input = {feat: 0 for feat in final_feature_names}
-    user_input[f'station_{station}'] = 1
-    if wd != 'N':
-        user_input[f'wd_{wd}'] = 1  # Encode only if not 'N'
-
-    user_input['PM10_log'] = np.log1p(pm10)
-    user_input['SO2_log'] = np.log1p(so2)
-    user_input['NO2_log'] = np.log1p(no2)
-    user_input['CO_log'] = np.log1p(co)
-    user_input['O3_log'] = np.log1p(o3)
-    user_input['PRES_log'] = np.log1p(pres)
-    user_input['temp_dewp_diff_log'] = np.log1p(temp_dewp_diff)
-    user_input['inverse_wind_log'] = np.log1p(inverse_wind)
-    user_input['CO_NO2_ratio'] = co_no2_ratio
-    user_input['month'] = month
-    user_input['is_night'] = is_night
-    user_input['Rain_Flag'] = rain_flag
-
-    X_cat = np.array([[user_input[feat] for feat in station_wd_features]])
-    X_num = np.array([[user_input[feat] for feat in numeric_features]])
-    X_num_scaled = scaler.transform(X_num)
-    X_input = np.concatenate([X_cat, X_num_scaled], axis=1)
+    user_input = {
+        'PM10': pm10, 'SO2': so2, 'NO2': no2, 'CO': co, 'O3': o3, 'PRES': pres,
+        'temp_dewp_diff': temp_dewp_diff, 'inverse_wind': inverse_wind,
+        'CO_NO2_ratio': co_no2_ratio, 'month': month,
+        'is_night': is_night, 'Rain_Flag': rain_flag,
+        'station': station, 'wd': wd
+    }
+    with stage_seconds.time(stage="build_input"):
+        X_input = build_feature_row(user_input, scaler)
 
     st.markdown("---")
 
     if st.button("🌫️ Predict Pollution Level"):
         try:
-            pred_proba = model.predict_proba(X_input)[0]
+            with stage_seconds.time(stage="validate"):
+                validation = validator.check(pd.DataFrame([user_input]), X_input)
+            issues = validation.messages(0)
+            if issues:
+                record_validation(validation, "single")
+                st.warning("⚠️ Some inputs are outside the range the model was trained on, "
+                           "so this prediction may be unreliable:\n\n" + "\n".join(f"- {issue}" for issue in issues))
+            with stage_seconds.time(stage="predict"):
+                pred_proba = prediction_cache.predict_proba(X_input)[0]
+            observe_drift(X_input)
             pred_class = np.argmax(pred_proba)
+            predictions_total.inc(source="single", level=class_map[pred_class])
 
-            class_map = {0: "High", 1: "Low", 2: "Moderate"}
             st.success(f"🌟 Predicted Pollution Level: **{class_map[pred_class]}**")
 
             prob_df = pd.DataFrame({
-                "Pollution Level": ["High", "Low", "Moderate"],
+                "Pollution Level": class_labels,
                 "Probability (%)": pred_proba * 100
             })
 
@@ -551,11 +803,236 @@ if view_option == "Modelling & Prediction":
                 yaxis=dict(range=[0, 100]), showlegend=False,
                 plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, use_container_width=True)
+
+            cache_stats = prediction_cache.stats()
+            st.caption(
+                f"Prediction cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+            )
+
+            # --- Why this prediction? ---
+            # Explained by the model that answered: a candidate with an A/B traffic share may have
+            served_by = live_scorer.served_by(X_input, pred_proba[None, :])
+            explain_with, X_explain = explainer, X_input
+            if served_by != live_scorer.primary:
+                from shadow_scoring import rescale
+                explain_with = get_explainer(live_scorer.models[served_by], served_by)
+                X_explain = rescale(X_input, live_scorer.scalers[live_scorer.primary], live_scorer.scalers[served_by])
+            exact = explain_with.method_for(1) == EXACT
+            st.markdown(f"#### 🧠 Why **{class_map[pred_class]}**?")
+            contributions = explain_with.contributions(X_explain)[0]
+            explanation = explanation_frame(contributions, pred_class)
+            explanation['Effect'] = np.where(explanation['Contribution'] >= 0, f"Towards {class_map[pred_class]}", f"Away from {class_map[pred_class]}")
+            fig = px.bar(
+                explanation.iloc[::-1], x='Contribution', y='Feature', orientation='h', color='Effect',
+                color_discrete_sequence=px.colors.qualitative.Dark2
+            )
+            fig.update_layout(
+                xaxis_title='SHAP value (log-odds)' if exact else 'Path attribution (log-odds)',
+                yaxis_title=None, legend_title=None,
+                plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)'
+            )
+            render_chart(fig, use_container_width=True)
+            method_text = "Exact TreeSHAP values" if exact else "Path-based attributions"
+            model_text = ("" if served_by == live_scorer.primary
+                          else f" by candidate model '{served_by}', which served it")
+            st.caption(
+                f"{method_text} for this reading{model_text}; together with the expected value "
+                f"({contributions[pred_class, -1]:.2f}) they add up to the model's raw score for {class_map[pred_class]}."
+            )
 
         except Exception as e:
+            errors_total.inc(operation="predict")
             st.error(f"\u26a0\ufe0f Prediction failed: {e}")
 
+    # --- What-if Sweep ---
+    st.markdown("---")
+    st.subheader("🔀 What-if Sweep")
+    st.markdown(
+        "Vary one or two inputs over a grid while the rest keep the values above. "
+        "The whole grid is scored in one model call."
+    )
+    sweep_choices = list(sweep_parameters)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sweep_x = st.selectbox("Vary", sweep_choices, format_func=sweep_parameters.get, key="sweep_x")
+    with col2:
+        # A fixed option list, so changing the first input does not reset this one
+        y_choices = [None] + sweep_choices
+        sweep_y = st.selectbox(
+            "Against", y_choices, index=y_choices.index('inverse_wind'),
+            format_func=lambda p: "Nothing (probability curves)" if p is None else sweep_parameters[p], key="sweep_y"
+        )
+    with col3:
+        sweep_points = st.slider("Grid points per axis", 10, 200, 50, step=10, key="sweep_points")
+
+    sweep_bounds = {}
+    for param in (sweep_x, sweep_y):
+        if param in sweep_ranges:
+            low, high = sweep_ranges[param]
+            sweep_bounds[param] = st.slider(f"{sweep_parameters[param]} range", low, high, (low, high), key=f"sweep_range_{param}")
+
+    if sweep_y == sweep_x:
+        st.warning("Pick two different inputs, or nothing to sweep against.")
+    elif st.button("🔀 Run Sweep"):
+        try:
+            axes = [
+                (param, axis_values(param, sweep_points, *sweep_bounds.get(param, (None, None))))
+                for param in (sweep_x, sweep_y) if param is not None
+            ]
+            start = time.perf_counter()
+            sweep_proba = run_sweep(model, scaler, user_input, axes)
+            elapsed = time.perf_counter() - start
+            stage_seconds.observe(elapsed, stage="sweep")
+            st.session_state['sweep'] = (axes, sweep_proba, elapsed)
+        except Exception as e:
+            errors_total.inc(operation="sweep")
+            st.error(f"\u26a0\ufe0f Sweep failed: {e}")
+
+    if 'sweep' in st.session_state:
+        import eda_charts
+
+        axes, sweep_proba, elapsed = st.session_state['sweep']
+        (x_param, x_values) = axes[0]
+        if len(axes) == 1:
+            fig = eda_charts.sweep_curves(sweep_parameters[x_param], x_values, sweep_proba)
+        else:
+            (y_param, y_values) = axes[1]
+            shown = st.radio("Colour by", ["Predicted level"] + [f"P({label})" for label in class_labels],
+                             horizontal=True, key="sweep_show")
+            fig = eda_charts.sweep_heatmap(
+                sweep_parameters[x_param], x_values, sweep_parameters[y_param], y_values, sweep_proba,
+                level=None if shown == "Predicted level" else shown[2:-1]
+            )
+        render_chart(fig, use_container_width=True)
+        n_scored = sweep_proba[..., 0].size
+        st.caption(f"{n_scored:,} readings scored in {elapsed:.2f}s ({n_scored / max(elapsed, 1e-9):,.0f} rows/sec).")
+
+    # --- Batch Prediction ---
+    st.markdown("---")
+    st.subheader("📂 Batch Prediction")
+    st.markdown(
+        "Upload a CSV or Parquet file of raw readings with the columns: "
+        + ", ".join(f"`{col}`" for col in raw_columns)
+        + ". Wind direction `N` and unknown stations encode to all zeros, as in the single prediction above."
+    )
+
+    uploaded_file = st.file_uploader("Readings file", type=["csv", "parquet"])
+    chunk_size = st.number_input("Rows per model call", min_value=1_000, max_value=1_000_000, value=50_000, step=10_000)
+
+    if uploaded_file is not None and st.button("📊 Score File"):
+        try:
+            readings = read_readings(uploaded_file)
+            start = time.perf_counter()
+            X_batch = build_feature_matrix(readings, scaler)
+            with stage_seconds.time(stage="validate"):
+                validation = validator.check(readings, X_batch)
+            results = score_readings(readings, live_scorer, scaler, chunk_size=int(chunk_size), X=X_batch)
+            results['Valid Input'] = ~validation.invalid_rows
+            elapsed = time.perf_counter() - start
+            stage_seconds.observe(elapsed, stage="batch_score")
+            record_validation(validation, "batch")
+            observe_drift(X_batch)
+            drift = services["drift_monitor"].reference.drift(X_batch)
+            drift['status'] = drift['psi'].map(drift_status)
+            st.session_state['batch_validation'] = (validation.summary(), drift)
+            for level, count in results['Predicted Level'].value_counts().items():
+                predictions_total.inc(count, source="batch", level=level)
+            st.session_state['batch_results'] = results
+            st.session_state['batch_rate'] = len(results) / elapsed if elapsed > 0 else float('inf')
+            st.session_state['batch_name'] = os.path.splitext(uploaded_file.name)[0]
+            st.session_state.pop('batch_importance', None)
+        except Exception as e:
+            errors_total.inc(operation="batch")
+            st.error(f"\u26a0\ufe0f Batch prediction failed: {e}")
+
+    if 'batch_results' in st.session_state:
+        results = st.session_state['batch_results']
+        col1, col2 = st.columns(2)
+        col1.metric("Rows Scored", f"{len(results):,}")
+        col2.metric("Throughput", f"{st.session_state['batch_rate']:,.0f} rows/sec")
+
+        level_counts = results['Predicted Level'].value_counts().reindex(class_labels, fill_value=0)
+        st.dataframe(level_counts.rename("Rows"), use_container_width=False)
+
+        if 'batch_validation' in st.session_state:
+            summary, drift = st.session_state['batch_validation']
+            n_flagged = int((~results['Valid Input']).sum())
+            if n_flagged:
+                st.warning(f"⚠️ {n_flagged:,} of {len(results):,} rows have inputs outside the valid or training "
+                           f"range (see 'Valid Input'); their predictions may be unreliable.")
+                st.dataframe(summary.rename_axis("Column"), use_container_width=False)
+            shifted = drift[drift['status'].isin(["moderate", "major"])]
+            with st.expander(f"Feature drift against the training reference ({len(shifted)} shifted)"):
+                st.dataframe(drift.style.format({'psi': '{:.3f}', 'ks': '{:.3f}', 'rows': '{:,.0f}'}),
+                             use_container_width=True)
+                st.caption("PSI below 0.1 is stable, 0.1–0.25 a moderate shift and above 0.25 a major one; "
+                           "KS is the largest gap between the binned cumulative distributions.")
+
+        if st.button("🧠 Explain Predictions"):
+            try:
+                start = time.perf_counter()
+                X_batch = build_feature_matrix(results, scaler)
+                # Each chunk was answered by the primary or, for its A/B share, a candidate: explain every row
+                # with the model that scored it
+                proba = results[[f'P({label})' for label in class_labels]].to_numpy()
+                served = live_scorer.served_by_rows(X_batch, proba)
+                values, methods = None, {}
+                for name in pd.unique(served):
+                    rows = served == name
+                    explain_with, X_explain = explainer, X_batch[rows]
+                    if name != live_scorer.primary:
+                        from shadow_scoring import rescale
+                        explain_with = get_explainer(live_scorer.models[name], name)
+                        X_explain = rescale(X_explain, live_scorer.scalers[live_scorer.primary],
+                                            live_scorer.scalers[name])
+                    methods[name] = explain_with.method_for(len(X_batch))
+                    group = explain_with.contributions(X_explain, method=methods[name])
+                    if values is None:
+                        values = np.empty((len(X_batch),) + group.shape[1:])
+                    values[rows] = group
+                predicted = pd.Index(class_labels).get_indexer(results['Predicted Level'])
+                results = results.assign(**{'Top Drivers': top_drivers(values, predicted)})
+                st.session_state['batch_results'] = results
+                st.session_state['batch_importance'] = pd.Series(
+                    np.abs(predicted_class_contributions(values, predicted)).mean(axis=0), index=feature_groups
+                ).sort_values()
+                served_rows = pd.Series(served).value_counts()
+                st.session_state['batch_explain'] = (methods, served_rows, time.perf_counter() - start)
+                stage_seconds.observe(st.session_state['batch_explain'][2], stage="explain")
+            except Exception as e:
+                errors_total.inc(operation="explain")
+                st.error(f"\u26a0\ufe0f Explanation failed: {e}")
+
+        if 'batch_importance' in st.session_state and 'Top Drivers' in results:
+            methods, served_rows, elapsed = st.session_state['batch_explain']
+            method = set(methods.values()).pop() if len(set(methods.values())) == 1 else None
+            value_label = {EXACT: 'Mean |SHAP value|', None: 'Mean |attribution|'}.get(method, 'Mean |path attribution|')
+            fig = px.bar(
+                st.session_state['batch_importance'], orientation='h',
+                labels={'value': value_label + ' toward the predicted level', 'index': ''}
+            )
+            fig.update_layout(showlegend=False, plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            render_chart(fig, use_container_width=True)
+            models_text = ""
+            if len(served_rows) > 1 or served_rows.index[0] != live_scorer.primary:
+                models_text = " Each row is explained by the model that scored it: " + ", ".join(
+                    f"{name} ({count:,} rows, {methods[name]})" for name, count in served_rows.items()) + "."
+            st.caption(
+                f"{(method or 'Mixed').capitalize()} attributions for {len(results):,} rows in {elapsed:.2f}s."
+                f"{models_text} 'Top Drivers' lists the features that pushed each row hardest toward its predicted level."
+            )
+
+        st.dataframe(results.head(100), use_container_width=True)
+
+        st.download_button(
+            "⬇️ Download Predictions (CSV)",
+            data=results.to_csv(index=False).encode("utf-8"),
+            file_name=f"{st.session_state['batch_name']}_predictions.csv",
+            mime="text/csv"
+        )
+
 # --- Feature Importance ---
 # --- Feature Importance ---
 if view_option == "Feature Importance":
@@ -573,8 +1050,8 @@ if view_option == "Feature Importance":
     This insight helps prioritize key environmental variables for both monitoring and model explainability.
     """)
     feature_importance_path = "feature_importance.png"
-    if os.path.exists(feature_importance_path):
-        st.image(Image.open(feature_importance_path), caption="Feature Importance - LightGBM", width=700)
+    if assets.exists(feature_importance_path):
+        st.image(load_image(feature_importance_path), caption="Feature Importance - LightGBM", width=700)
     else:
         st.warning("\u26a0\ufe0f Feature importance image not found.")
 
@@ -601,8 +1078,10 @@ elif view_option == "SHAP":
     """)
     
     shap_path = "shap_LightGBM.png"
-    if os.path.exists(shap_path):
-        st.image(Image.open(shap_path), caption="SHAP Summary - LightGBM", width=700)
+    if assets.exists(shap_path):
+        st.image(load_image(shap_path), caption="SHAP Summary - LightGBM", width=700)
+        st.info("For the reasons behind one specific reading, predict it under **Modelling & Prediction**; "
+                "batch-scored files can be explained there too.")
     else:
         st.warning("⚠️ SHAP visualization not found.")
 
@@ -620,8 +1099,8 @@ elif view_option == "Confusion Matrix":
     This matrix confirms that the deployed LightGBM model is well-calibrated, with high predictive precision and strong recall performance—validating its selection for real-world deployment.
     """)
     confusion_matrix_path = "confusion_matrix.png"
-    if os.path.exists(confusion_matrix_path):
-        st.image(Image.open(confusion_matrix_path), caption="Confusion Matrix - LightGBM", width=700)
+    if assets.exists(confusion_matrix_path):
+        st.image(load_image(confusion_matrix_path), caption="Confusion Matrix - LightGBM", width=700)
     else:
         st.warning("⚠️ Confusion matrix image not found.") 
 
@@ -660,7 +1139,196 @@ if view_option == "HeatMap":
     A reduced feature set for linear/distance models might include: PM10_log, NO2_log, temp_dewp_diff_log, Rain_Flag, PRES_log, month, night_time, and select categorical dummies.
     """)
     heatmap_path = "heatmap.png"
-    if os.path.exists(heatmap_path):
-        st.image(Image.open(heatmap_path), caption="Correlation Matrix of Air Quality Variables", width=700)
+    if assets.exists(heatmap_path):
+        st.image(load_image(heatmap_path), caption="Correlation Matrix of Air Quality Variables", width=700)
     else:
         st.warning("\u26a0\ufe0f Correlation heatmap image not found.")
+
+# --- Backtest ---
+if view_option == "Backtest":
+    import plotly.express as px
+
+    from history_store import HistoryStore, accuracy
+
+    st.subheader("🕰️ Backtest on Historical Station Readings")
+    st.markdown("""
+    Scores the deployed model against the hourly readings of the Beijing stations and compares each prediction with the
+    level of the PM2.5 measured at the same hour (Low below 35 μg/m³, Moderate up to 75 μg/m³, High above).
+    Readings are stored by station and month, so only the selected range is read, and each model's predictions are
+    computed once and reused.
+    """)
+    store = HistoryStore(history_path)
+    if not store.partitions:
+        st.info(f"No historical readings found at `{history_path}`. Build the store from the PRSA station files with "
+                f"`python history_store.py ingest PRSA_Data_*.csv --store {history_path}` "
+                f"(AIR_POLLUTION_HISTORY sets another location).")
+    else:
+        index = store.index()
+        first, last = index['start'].min().date(), index['end'].max().date()
+        col1, col2, col3 = st.columns(3)
+        stations = col1.multiselect("Stations", sorted(index['station'].unique()), key="backtest_stations")
+        period = col2.date_input("Period", (first, last), min_value=first, max_value=last, key="backtest_period")
+        hours = col3.radio("Hours", ["All", "Night only", "Day only"], horizontal=True, key="backtest_hours")
+
+        if st.button("▶️ Run Backtest"):
+            start_date, end_date = (tuple(period) + (last,))[:2]  # the end is unset while a range is being picked
+            filters = dict(stations=stations or None, start=start_date, end=end_date + timedelta(days=1),
+                           night={"All": None, "Night only": True, "Day only": False}[hours])
+            try:
+                start = time.perf_counter()
+                key = current_model_key()
+                scored = 0
+                if store.unscored(key, filters['stations'], filters['start'], filters['end']):
+                    model, scaler = load_model_and_scaler()
+                    if model is None or scaler is None:
+                        st.stop()
+                    scored = store.score(model, scaler, key, filters['stations'], filters['start'], filters['end'])
+                confusion, outcomes = store.backtest(key, **filters)
+                elapsed = time.perf_counter() - start
+                stage_seconds.observe(elapsed, stage="backtest")
+                st.session_state['backtest'] = (confusion, outcomes, scored, elapsed)
+            except Exception as e:
+                errors_total.inc(operation="backtest")
+                st.error(f"\u26a0\ufe0f Backtest failed: {e}")
+
+        if 'backtest' in st.session_state:
+            confusion, outcomes, scored, elapsed = st.session_state['backtest']
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Readings", f"{len(outcomes):,}")
+            col2.metric("Accuracy", f"{accuracy(confusion):.1%}")
+            col3.metric("Time", f"{elapsed:.2f}s", help=f"{scored:,} readings newly scored; the rest were cached")
+
+            fig = px.imshow(confusion, text_auto=True, color_continuous_scale="Blues",
+                            labels=dict(x="Predicted level", y="Actual level (from PM2.5)", color="Readings"))
+            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            render_chart(fig, use_container_width=True)
+
+            if len(outcomes):
+                monthly = outcomes.groupby([outcomes['time'].dt.to_period('M').dt.to_timestamp(), 'station'],
+                                           observed=True)['Correct'].mean().rename('Accuracy').reset_index()
+                fig = px.line(monthly, x='time', y='Accuracy', color='station', labels={'time': ''})
+                fig.update_layout(yaxis_tickformat='.0%', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+                render_chart(fig, use_container_width=True)
+
+# --- Citywide Map ---
+if view_option == "Citywide Map":
+    import numpy as np
+    import pandas as pd
+
+    import eda_charts
+    from features import (
+        build_feature_matrix, class_labels, label_predictions, raw_columns, read_readings, station_options, wind_options
+    )
+    from history_store import HistoryStore
+    from spatial import covering_bounds, snapshot_coordinates, station_coordinates
+
+    model, scaler, prediction_cache, _, validator, _ = load_prediction_services()
+
+    st.subheader("🗺️ Citywide Pollution Map")
+    st.markdown("""
+    Scores one reading per station in a single model call and spreads the class probabilities over a grid of Beijing
+    by inverse distance weighting of the nearest stations. The neighbours and weights of every cell are computed once
+    for a set of stations, so editing readings only re-scores the stations and redraws the grid.
+    """)
+
+    store = HistoryStore(history_path)
+    sources = ["Edit readings", "Upload snapshot"] + (["Historical hour"] if store.partitions else [])
+    source = st.radio("Readings", sources, horizontal=True, key="map_source")
+    snapshot = None
+    if source == "Edit readings":
+        defaults = pd.DataFrame({
+            'station': list(station_coordinates),
+            'latitude': [lat for lat, _ in station_coordinates.values()],
+            'longitude': [lon for _, lon in station_coordinates.values()],
+            'PM10': 100.0, 'SO2': 10.0, 'NO2': 20.0, 'CO': 800.0, 'O3': 30.0, 'PRES': 1000.0,
+            'temp_dewp_diff': 20.0, 'inverse_wind': 1.0, 'CO_NO2_ratio': 40.0,
+            'month': datetime.now().month, 'is_night': 0, 'Rain_Flag': 0, 'wd': 'N',
+        })
+        snapshot = st.data_editor(
+            defaults, num_rows="dynamic", hide_index=True, use_container_width=True, key="map_readings",
+            column_config={'wd': st.column_config.SelectboxColumn("wd", options=wind_options, required=True)})
+    elif source == "Upload snapshot":
+        uploaded_file = st.file_uploader("Snapshot file: one reading per station, with latitude/longitude columns "
+                                         "for stations other than the PRSA sites", type=["csv", "parquet"],
+                                         key="map_upload")
+        if uploaded_file is not None:
+            try:
+                snapshot = read_readings(uploaded_file)
+            except Exception as e:
+                errors_total.inc(operation="map")
+                st.error(f"\u26a0\ufe0f Could not read the snapshot: {e}")
+    else:
+        index = store.index()
+        first, last = index['start'].min().date(), index['end'].max().date()
+        col1, col2 = st.columns(2)
+        day = col1.date_input("Day", last, min_value=first, max_value=last, key="map_day")
+        hour = col2.slider("Hour", 0, 23, 12, key="map_hour")
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+        snapshot = store.query(start=start, end=start + timedelta(hours=1), columns=raw_columns)
+        if not len(snapshot):
+            st.info(f"No readings stored for {start:%Y-%m-%d %H:00}.")
+            snapshot = None
+
+    col1, col2, col3, col4 = st.columns(4)
+    rows = col1.slider("Grid rows", 10, 200, 60, step=10, key="map_rows",
+                       help="North-south cells; columns follow so that cells are about square")
+    neighbors = col2.slider("Nearest stations per cell", 1, 16, 8, key="map_neighbors")
+    power = col3.slider("Distance power", 0.5, 4.0, 2.0, step=0.5, key="map_power",
+                        help="Higher values let the nearest station dominate")
+    shown = col4.selectbox("Show", ["Predicted level"] + [f"P({label})" for label in class_labels], key="map_shown")
+
+    if snapshot is not None and len(snapshot):
+        try:
+            snapshot = snapshot.dropna(subset=['station']).reset_index(drop=True)
+            coords = snapshot_coordinates(snapshot)
+            located = ~np.isnan(coords).any(axis=1)
+            if not located.all():
+                st.warning(f"⚠️ {int((~located).sum())} stations have no coordinates and are left off the map: "
+                           + ", ".join(map(str, snapshot.loc[~located, 'station'])))
+                snapshot, coords = snapshot[located].reset_index(drop=True), coords[located]
+        except Exception as e:
+            errors_total.inc(operation="map")
+            st.error(f"\u26a0\ufe0f Could not place the stations: {e}")
+            snapshot = None
+
+    if snapshot is not None and len(snapshot):
+        try:
+            with stage_seconds.time(stage="build_input"):
+                X_snapshot = build_feature_matrix(snapshot, scaler)
+            with stage_seconds.time(stage="validate"):
+                # Stations other than the training ones are expected here, see the caption below
+                validation = validator.check(snapshot, X_snapshot, allow_unknown=('station',))
+            invalid = validation.invalid_rows
+            if invalid.any():
+                record_validation(validation, "map")
+                st.warning(f"⚠️ Inputs outside the training range at: {', '.join(map(str, snapshot.loc[invalid, 'station']))}")
+            start = time.perf_counter()
+            station_proba = prediction_cache.predict_proba(X_snapshot)
+            scored = time.perf_counter()
+            lats, lons, interpolator = get_interpolator(coords, covering_bounds(coords), rows, neighbors, power)
+            grid_proba = interpolator(station_proba)
+            done = time.perf_counter()
+            observe_drift(X_snapshot)
+            stage_seconds.observe(scored - start, stage="map_score")
+            stage_seconds.observe(done - scored, stage="map_interpolate")
+            for level, count in pd.Series(label_predictions(station_proba)).value_counts().items():
+                predictions_total.inc(count, source="map", level=level)
+
+            level = None if shown == "Predicted level" else shown[2:-1]
+            fig = eda_charts.probability_map(lats, lons, grid_proba, snapshot['station'].astype(str).to_numpy(),
+                                             coords, station_proba, level)
+            render_chart(fig, use_container_width=True)
+            st.caption(f"{len(snapshot):,} stations scored in one call ({(scored - start) * 1e3:.1f} ms) · "
+                       f"{grid_proba.shape[0] * grid_proba.shape[1]:,} cells interpolated ({(done - scored) * 1e3:.1f} ms). "
+                       f"The model was trained on {', '.join(station_options)}; other stations score with their "
+                       f"station columns all zero.")
+        except Exception as e:
+            errors_total.inc(operation="map")
+            st.error(f"\u26a0\ufe0f Map prediction failed: {e}")
+
+view_seconds.observe(time.perf_counter() - render_start, view=view_option)
+
+# With the view on screen, load the model in the background so the first prediction does not wait
+# for it; AIR_POLLUTION_PREFETCH_MODEL=0 leaves it to the first view that needs it
+if os.environ.get("AIR_POLLUTION_PREFETCH_MODEL", "1") != "0" and not default_registry.is_loaded:
+    default_registry.warm(background=True)